@@ -3,15 +3,28 @@ import sys
 import random
 import json
 import pymongo
-from pymongo.errors import DuplicateKeyError
+from pymongo.errors import DuplicateKeyError, PyMongoError
+import bson
+from bson.int64 import Int64
+from bson.raw_bson import RawBSONDocument
+import struct
 import time
 import threading
+import queue
+import socket
+import base64
+import hmac
+import secrets
 import os
 import multiprocessing as mp
 import argparse
 import string
 import math
+import asyncio
+import inspect
 import warnings
+from sysbench_workload import positiveInt, nextArrivalTime, buildKeyChooser, chooseKey
+from sysbench_results import histogramRecord, histogramSerialize, histogramMerge, histogramMergeInto, histogramPercentile, histogramPercentilesCsv, percentileCsvHeader, latencyPercentiles, resultsAvailableFormat, resultsOpen, resultsAppend, resultsClose
 
 
 def deleteLog(appConfig):
@@ -35,6 +48,14 @@ def printCsv(thisMessage,appConfig):
         fp.write("{}\n".format(thisMessage))
 
 
+def waitForStart(appConfig):
+    # with --coordinator every agent starts its workers at the same moment, after they have finished initializing
+    if 'startAtTime' in appConfig:
+        sleepTimeSeconds = appConfig['startAtTime'] - time.time()
+        if sleepTimeSeconds > 0:
+            time.sleep(sleepTimeSeconds)
+
+
 def sysbench_string(length):
     # generate full string
     digits = ''.join(str(random.randint(0, 9)) for _ in range(length))
@@ -49,6 +70,42 @@ def sysbench_string(length):
     return result
 
 
+def build_raw_document_pool(appConfig,sysbenchString,textBufferMaxStart):
+    # pre-encode a pool of load documents as BSON, only _id and k are patched in place before each insert
+    poolSize = appConfig['loadDocumentPoolSize']
+    padFieldSize = appConfig['padFieldSize']-1
+    cFieldSize = appConfig['cFieldSize']-1
+    compressibleFieldSize = appConfig['compressibleFieldSize']
+
+    # keep the same BSON types as the dictionary based loader, int32 unless the _id range needs int64
+    if appConfig['numDocumentsPerCollection'] < 2**31:
+        idPlaceholder = 0
+        idStruct = struct.Struct('<i')
+    else:
+        idPlaceholder = Int64(0)
+        idStruct = struct.Struct('<q')
+
+    # document layout is [int32 size][type]_id\0[value][type]k\0[value]...
+    idValueOffset = 4 + 1 + len(b'_id\x00')
+    kValueOffset = idValueOffset + idStruct.size + 1 + len(b'k\x00')
+
+    documentPool = []
+    for poolLoop in range(poolSize):
+        thisInsert = {}
+        thisInsert["_id"] = idPlaceholder
+        thisInsert["k"] = idPlaceholder
+        randomStringStart = round(random.randint(1,textBufferMaxStart)/13)*13
+        thisInsert["c"] = sysbenchString[randomStringStart:randomStringStart+cFieldSize]
+        randomStringStart = round(random.randint(1,textBufferMaxStart)/13)*13
+        thisInsert["pad"] = sysbenchString[randomStringStart:randomStringStart+padFieldSize]
+        if compressibleFieldSize > 0:
+            thisInsert["compressField"] = 'a' * compressibleFieldSize
+        thisInsert["numUpdates"] = 0
+        documentPool.append(bytearray(bson.encode(thisInsert)))
+
+    return documentPool, idStruct, idValueOffset, kValueOffset
+
+
 def reportCollectionInfo(appConfig):
     numCollections = appConfig['numCollections']
     
@@ -231,11 +288,27 @@ def reporter(perfQ,appConfig):
     numProcessesCompleted = 0
     recentTps = []
     recentLatency = []
+
+    # whole run histograms for the final summary
+    runHistogram = {}
+    runOpHistograms = [{} for thisOp in range(8)]
+
+    resultsWriter = None
+    if appConfig['resultsFormat'] != 'none':
+        resultsColumns = [('timestamp','float64'),('elapsedSeconds','float64'),('operations','int64'),('intervalOperations','int64'),('intervalTps','float64'),('intervalLatencyMs','float64'),('exceptions','int64'),('intervalHistogram','binary')]
+        resultsColumns += [("intervalP{:g}Ms".format(thisPercentile).replace('.','_'),'float64') for thisPercentile in latencyPercentiles]
+        if appConfig['modeRun']:
+            resultsColumns += [("op{}LatencyMs".format(thisOp),'float64') for thisOp in range(1,9)]
+            resultsColumns += [("op{}Histogram".format(thisOp),'binary') for thisOp in range(1,9)]
+        resultsMetadata = {thisKey: appConfig[thisKey] for thisKey in appConfig if thisKey not in ['uri','coordinatorToken']}
+        resultsWriter = resultsOpen(appConfig['resultsFileName'],appConfig['resultsFormat'],resultsColumns,resultsMetadata)
     
     if appConfig['modeLoad']:
-        csvHeader = "timestamp,elapsed-time,elapsed-seconds,inserts,overall-ips,this-interval-ips,this-interval-latency-ms,last-{}-intervals-ips,last-{}-intervals-latency-ms,exceptions".format(numIntervalsTps,numIntervalsTps)
+        csvHeader = "timestamp,elapsed-time,elapsed-seconds,inserts,overall-ips,this-interval-ips,this-interval-latency-ms,last-{}-intervals-ips,last-{}-intervals-latency-ms,exceptions,{}".format(numIntervalsTps,numIntervalsTps,percentileCsvHeader('this-interval'))
     else:
-        csvHeader = "timestamp,elapsed-time,elapsed-seconds,transactions,overall-tps,this-interval-tps,this-interval-latency-ms,last-{}-intervals-tps,last-{}-intervals-latency-ms,exceptions".format(numIntervalsTps,numIntervalsTps)
+        csvHeader = "timestamp,elapsed-time,elapsed-seconds,transactions,overall-tps,this-interval-tps,this-interval-latency-ms,last-{}-intervals-tps,last-{}-intervals-latency-ms,exceptions,{}".format(numIntervalsTps,numIntervalsTps,percentileCsvHeader('this-interval'))
+        for thisOp in range(1,9):
+            csvHeader += ",{}".format(percentileCsvHeader("op{}".format(thisOp)))
     printCsv(csvHeader,appConfig)
     
     while (numProcessesCompleted < numProcesses):
@@ -253,6 +326,9 @@ def reporter(perfQ,appConfig):
         op6Ms = 0.0
         op7Ms = 0.0
         op8Ms = 0.0
+
+        intervalHistogram = {}
+        intervalOpHistograms = [{} for thisOp in range(8)]
         
         while not perfQ.empty():
             qMessage = perfQ.get_nowait()
@@ -261,7 +337,10 @@ def reporter(perfQ,appConfig):
                 numLatencyMs += qMessage['latency']
                 numTotalInserts += qMessage['inserts']
                 numTotalExceptions += qMessage['exceptions']
+                histogramMerge(intervalHistogram,qMessage['histogram'])
             elif qMessage['name'] == "batchDetails":
+                for thisOp in range(8):
+                    histogramMerge(intervalOpHistograms[thisOp],qMessage['opHistograms'][thisOp])
                 op1Ms += qMessage['op1Ms']
                 op2Ms += qMessage['op2Ms']
                 op3Ms += qMessage['op3Ms']
@@ -307,6 +386,12 @@ def reporter(perfQ,appConfig):
             intervalOp7LatencyMs = 0.0
             intervalOp8LatencyMs = 0.0
         
+        # this interval - percentiles
+        intervalP99LatencyMs = histogramPercentile(intervalHistogram,99.0)
+        histogramMergeInto(runHistogram,intervalHistogram)
+        for thisOp in range(8):
+            histogramMergeInto(runOpHistograms[thisOp],intervalOpHistograms[thisOp])
+
         # recent intervals - tps
         if len(recentTps) == numIntervalsTps:
             recentTps.pop(0)
@@ -338,22 +423,46 @@ def reporter(perfQ,appConfig):
         logTimeStamp = dt.datetime.now(dt.timezone.utc).isoformat()[:-3] + 'Z'
         
         if appConfig['modeLoad']:
-            printLog("[{}] elapsed {} | total ins {:12,d} at {:10,.2f} p/s | interval {:10,.2f} p/s @ {:8,.2f} ms | last {} {:10,.2f} p/s @ {:8,.2f} ms | {:6,d} exceptions | ETA {}".format(logTimeStamp,thisHMS,numTotalInserts,insertsPerSecond,intervalInsertsPerSecond,intervalLatencyMs,numIntervalsTps,avgRecentTps,avgRecentLatency,numTotalExceptions,remainHMS),appConfig)
-            csvData = "{},{},{:.2f},{},{:.2f},{:.2f},{:.2f},{:.2f},{:.2f},{}".format(logTimeStamp,thisHMS,elapsedSeconds,numTotalInserts,insertsPerSecond,intervalInsertsPerSecond,intervalLatencyMs,avgRecentTps,avgRecentLatency,numTotalExceptions)
+            printLog("[{}] elapsed {} | total ins {:12,d} at {:10,.2f} p/s | interval {:10,.2f} p/s @ {:8,.2f} ms p99 {:8,.2f} ms | last {} {:10,.2f} p/s @ {:8,.2f} ms | {:6,d} exceptions | ETA {}".format(logTimeStamp,thisHMS,numTotalInserts,insertsPerSecond,intervalInsertsPerSecond,intervalLatencyMs,intervalP99LatencyMs,numIntervalsTps,avgRecentTps,avgRecentLatency,numTotalExceptions,remainHMS),appConfig)
+            csvData = "{},{},{:.2f},{},{:.2f},{:.2f},{:.2f},{:.2f},{:.2f},{},{}".format(logTimeStamp,thisHMS,elapsedSeconds,numTotalInserts,insertsPerSecond,intervalInsertsPerSecond,intervalLatencyMs,avgRecentTps,avgRecentLatency,numTotalExceptions,histogramPercentilesCsv(intervalHistogram))
         else:
-            printLog("[{}] elapsed {} | total txn {:12,d} at {:10,.2f} p/s | interval {:10,.2f} p/s @ {:8,.2f} ms | last {} {:10,.2f} p/s @ {:8,.2f} ms | {:6,d} exceptions | ETA {}".format(logTimeStamp,thisHMS,numTotalInserts,insertsPerSecond,intervalInsertsPerSecond,intervalLatencyMs,numIntervalsTps,avgRecentTps,avgRecentLatency,numTotalExceptions,remainHMS),appConfig)
+            printLog("[{}] elapsed {} | total txn {:12,d} at {:10,.2f} p/s | interval {:10,.2f} p/s @ {:8,.2f} ms p99 {:8,.2f} ms | last {} {:10,.2f} p/s @ {:8,.2f} ms | {:6,d} exceptions | ETA {}".format(logTimeStamp,thisHMS,numTotalInserts,insertsPerSecond,intervalInsertsPerSecond,intervalLatencyMs,intervalP99LatencyMs,numIntervalsTps,avgRecentTps,avgRecentLatency,numTotalExceptions,remainHMS),appConfig)
             if appConfig['showDetailedLatencies']:
                 printLog("[1] {:10,.2f} [2] {:10,.2f} [3] {:10,.2f} [4] {:10,.2f} [5] {:10,.2f} [6] {:10,.2f} [7] {:10,.2f} [8] {:10,.2f} ".format(intervalOp1LatencyMs,intervalOp2LatencyMs,intervalOp3LatencyMs,intervalOp4LatencyMs,intervalOp5LatencyMs,intervalOp6LatencyMs,intervalOp7LatencyMs,intervalOp8LatencyMs),appConfig)
-            csvData = "{},{},{:.2f},{},{:.2f},{:.2f},{:.2f},{:.2f},{:.2f},{}".format(logTimeStamp,thisHMS,elapsedSeconds,numTotalInserts,insertsPerSecond,intervalInsertsPerSecond,intervalLatencyMs,avgRecentTps,avgRecentLatency,numTotalExceptions)
+                printLog("p99 [1] {:8,.2f} [2] {:8,.2f} [3] {:8,.2f} [4] {:8,.2f} [5] {:8,.2f} [6] {:8,.2f} [7] {:8,.2f} [8] {:8,.2f} ".format(*[histogramPercentile(thisHistogram,99.0) for thisHistogram in intervalOpHistograms]),appConfig)
+            csvData = "{},{},{:.2f},{},{:.2f},{:.2f},{:.2f},{:.2f},{:.2f},{},{}".format(logTimeStamp,thisHMS,elapsedSeconds,numTotalInserts,insertsPerSecond,intervalInsertsPerSecond,intervalLatencyMs,avgRecentTps,avgRecentLatency,numTotalExceptions,histogramPercentilesCsv(intervalHistogram))
+            for thisHistogram in intervalOpHistograms:
+                csvData += ",{}".format(histogramPercentilesCsv(thisHistogram))
             
         printCsv(csvData,appConfig)
+
+        if resultsWriter is not None:
+            resultsRow = {'timestamp':nowTime,'elapsedSeconds':elapsedSeconds,'operations':numTotalInserts,'intervalOperations':intervalInserts,'intervalTps':intervalInsertsPerSecond,'intervalLatencyMs':intervalLatencyMs,'exceptions':numTotalExceptions,'intervalHistogram':histogramSerialize(intervalHistogram)}
+            for thisPercentile in latencyPercentiles:
+                resultsRow["intervalP{:g}Ms".format(thisPercentile).replace('.','_')] = histogramPercentile(intervalHistogram,thisPercentile)
+            if appConfig['modeRun']:
+                intervalOpLatencyMs = [intervalOp1LatencyMs,intervalOp2LatencyMs,intervalOp3LatencyMs,intervalOp4LatencyMs,intervalOp5LatencyMs,intervalOp6LatencyMs,intervalOp7LatencyMs,intervalOp8LatencyMs]
+                for thisOp in range(8):
+                    resultsRow["op{}LatencyMs".format(thisOp+1)] = intervalOpLatencyMs[thisOp]
+                    resultsRow["op{}Histogram".format(thisOp+1)] = histogramSerialize(intervalOpHistograms[thisOp])
+            resultsAppend(resultsWriter,resultsRow)
+
         nextReportTime = nowTime + numSecondsFeedback
         
         lastTime = nowTime
         lastNumTotalInserts = numTotalInserts
 
+    if resultsWriter is not None:
+        resultsClose(resultsWriter)
 
-def load_worker(threadNum,perfQ,appConfig):
+    # whole run latency percentiles
+    printLog("overall latency (ms) | {}".format(" | ".join("p{:g} {:,.3f}".format(thisPercentile,histogramPercentile(runHistogram,thisPercentile)) for thisPercentile in latencyPercentiles)),appConfig)
+    if appConfig['modeRun']:
+        for thisOp in range(8):
+            printLog("  op{} latency (ms) | {}".format(thisOp+1," | ".join("p{:g} {:,.3f}".format(thisPercentile,histogramPercentile(runOpHistograms[thisOp],thisPercentile)) for thisPercentile in latencyPercentiles)),appConfig)
+
+
+def load_worker_main(threadNum,perfQ,appConfig):
     warnings.filterwarnings("ignore","You appear to be connected to a DocumentDB cluster.")
     
     random.seed()
@@ -371,6 +480,10 @@ def load_worker(threadNum,perfQ,appConfig):
     else:
         compressFieldValue = 'a' * compressibleFieldSize
 
+    loadRawBson = appConfig['loadRawBson']
+    arrivalSchedule = appConfig['arrivalSchedule']
+    openLoop = (arrivalSchedule != 'closed')
+
     perfReportInterval = 1
 
     rateLimitPerThread = rateLimit//numProcesses
@@ -387,6 +500,12 @@ def load_worker(threadNum,perfQ,appConfig):
     sysbenchString = sysbench_string(sysbenchStringBufferSize)
     textBufferMaxStart = sysbenchStringBufferSize-(1*1024*1024)
 
+    if loadRawBson:
+        rawDocumentPool, idStruct, idValueOffset, kValueOffset = build_raw_document_pool(appConfig,sysbenchString,textBufferMaxStart)
+        rawDocumentPoolSize = len(rawDocumentPool)
+
+    waitForStart(appConfig)
+
     startTime = time.time()
     nextPerfReportTime = time.time() + perfReportInterval
     intervalSeconds = 2
@@ -400,12 +519,20 @@ def load_worker(threadNum,perfQ,appConfig):
     numLimiterInserts = 0
     
     batchElapsedMs = 0.0
+    intervalHistogram = {}
+
+    # open-loop batches are scheduled at rate-limit / processes inserts per second
+    arrivalIntervalSeconds = numInsertsPerBatch / (rateLimit / numProcesses)
+    intendedStartTime = startTime
     
     allDone = False
 
     while not allDone:
+        if openLoop:
+            # the batch is built first and then waits for its scheduled start, see below
+            pass
         # check if we need to slow down
-        if time.time() > nextReportTime:
+        elif time.time() > nextReportTime:
             # we are running slower than the rate limiter
             nextReportTime = time.time() + intervalSeconds
             numLimiterInserts = 0
@@ -419,48 +546,80 @@ def load_worker(threadNum,perfQ,appConfig):
 
         insList = []
         
-        for batchLoop in range(numInsertsPerBatch):
-            numTotalInserts += 1
-            numIntervalInserts += 1
-            numLimiterInserts += 1
+        if loadRawBson:
+            for batchLoop in range(numInsertsPerBatch):
+                numTotalInserts += 1
+                numIntervalInserts += 1
+                numLimiterInserts += 1
+
+                # patch _id and k into a pre-encoded document, the driver sends the bytes as-is
+                thisBuffer = rawDocumentPool[numTotalInserts % rawDocumentPoolSize]
+                idStruct.pack_into(thisBuffer,idValueOffset,numTotalInserts)
+                idStruct.pack_into(thisBuffer,kValueOffset,numTotalInserts)
+                insList.append(RawBSONDocument(bytes(thisBuffer)))
+        else:
+            for batchLoop in range(numInsertsPerBatch):
+                numTotalInserts += 1
+                numIntervalInserts += 1
+                numLimiterInserts += 1
             
-            thisInsert = {}
+                thisInsert = {}
             
-            thisInsert["_id"] = numTotalInserts
-            thisInsert["k"] = numTotalInserts
-            # all strings are aligned to 13 so they all start with 12 digits, then dash, then 12 digits, ...
-            randomStringStart = round(random.randint(1,textBufferMaxStart)/13)*13
-            thisInsert["c"] = sysbenchString[randomStringStart:randomStringStart+cFieldSize]
-            randomStringStart = round(random.randint(1,textBufferMaxStart)/13)*13
-            thisInsert["pad"] = sysbenchString[randomStringStart:randomStringStart+padFieldSize]
-            if compressibleFieldSize > 0:
-                thisInsert["compressField"] = compressFieldValue
-            thisInsert["numUpdates"] = 0
+                thisInsert["_id"] = numTotalInserts
+                thisInsert["k"] = numTotalInserts
+                # all strings are aligned to 13 so they all start with 12 digits, then dash, then 12 digits, ...
+                randomStringStart = round(random.randint(1,textBufferMaxStart)/13)*13
+                thisInsert["c"] = sysbenchString[randomStringStart:randomStringStart+cFieldSize]
+                randomStringStart = round(random.randint(1,textBufferMaxStart)/13)*13
+                thisInsert["pad"] = sysbenchString[randomStringStart:randomStringStart+padFieldSize]
+                if compressibleFieldSize > 0:
+                    thisInsert["compressField"] = compressFieldValue
+                thisInsert["numUpdates"] = 0
             
-            insList.append(pymongo.InsertOne(thisInsert))
+                insList.append(pymongo.InsertOne(thisInsert))
         
         batchStartTime = time.time()
-        result = col.bulk_write(insList, ordered=orderedBatches)
-        batchElapsedMs += (time.time() - batchStartTime) * 1000
+        if openLoop:
+            # wait for the scheduled start, if we are behind schedule the lag is included in the latency
+            sleepTimeSeconds = intendedStartTime - time.time()
+            if sleepTimeSeconds > 0:
+                time.sleep(sleepTimeSeconds)
+            # measure from the intended start to avoid coordinated omission
+            batchStartTime = intendedStartTime
+            intendedStartTime = nextArrivalTime(intendedStartTime,arrivalIntervalSeconds,arrivalSchedule)
+        if loadRawBson:
+            result = col.insert_many(insList, ordered=orderedBatches)
+        else:
+            result = col.bulk_write(insList, ordered=orderedBatches)
+        thisBatchMs = (time.time() - batchStartTime) * 1000
+        batchElapsedMs += thisBatchMs
+        histogramRecord(intervalHistogram,thisBatchMs)
         numTotalBatches += 1
         numIntervalBatches += 1
         
         if time.time() > nextPerfReportTime:
             nextPerfReportTime = time.time() + perfReportInterval
-            perfQ.put({"name":"batchCompleted","batches":numIntervalBatches,"latency":batchElapsedMs,"inserts":numIntervalInserts,"exceptions":0})
+            perfQ.put({"name":"batchCompleted","batches":numIntervalBatches,"latency":batchElapsedMs,"inserts":numIntervalInserts,"exceptions":0,"histogram":histogramSerialize(intervalHistogram)})
             numIntervalBatches = 0
             numIntervalInserts = 0
             batchElapsedMs = 0.0
+            intervalHistogram = {}
             
         if (numTotalInserts >= numDocumentsPerCollection):
             allDone = True
         
     client.close()
-    
-    perfQ.put({"name":"processCompleted","processNum":threadNum})
 
 
-def run_worker(threadNum,perfQ,appConfig):
+def load_worker(threadNum,perfQ,appConfig):
+    try:
+        load_worker_main(threadNum,perfQ,appConfig)
+    finally:
+        # the reporter waits for every process, so report completion even if the load failed
+        perfQ.put({"name":"processCompleted","processNum":threadNum})
+
+
+def run_worker_main(threadNum,perfQ,appConfig):
     warnings.filterwarnings("ignore","You appear to be connected to a DocumentDB cluster.")
     
     random.seed()
@@ -494,6 +653,11 @@ def run_worker(threadNum,perfQ,appConfig):
         printLog("Unknown value {} for --index-for-queries, exiting".format(indexForQueries))
         sys.exit(1)
 
+    keyChooser = buildKeyChooser(appConfig['keyDistribution'],numExistingDocuments,appConfig)
+
+    arrivalSchedule = appConfig['arrivalSchedule']
+    openLoop = (arrivalSchedule != 'closed')
+
     perfReportInterval = 1
 
     rateLimitPerThread = rateLimit//numProcesses
@@ -508,12 +672,18 @@ def run_worker(threadNum,perfQ,appConfig):
     sysbenchString = sysbench_string(sysbenchStringBufferSize)
     textBufferMaxStart = sysbenchStringBufferSize-(1*1024*1024)
 
+    waitForStart(appConfig)
+
     startTime = time.time()
     nextPerfReportTime = time.time() + perfReportInterval
     intervalSeconds = 2
     nextReportTime = startTime + intervalSeconds
     maxPerInterval = rateLimitPerThread * intervalSeconds
 
+    # in a sweep step the interval in progress is reported when the warmup ends, so no measured interval holds warmup transactions
+    inWarmup = appConfig['sweep']
+    warmupEndTime = startTime + appConfig['sweepWarmupSeconds']
+
     numTotalOperations = 0
     numTotalTransactions = 0
     numIntervalOperations = 0
@@ -533,11 +703,24 @@ def run_worker(threadNum,perfQ,appConfig):
     op7Ms = 0.0
     op8Ms = 0.0
 
+    # latency histograms for the transaction and for each of the 8 operation types
+    intervalHistogram = {}
+    opHistograms = [{} for thisOp in range(8)]
+
+    # open-loop transactions are scheduled at rate-limit / processes per second
+    arrivalIntervalSeconds = 1.0 / (rateLimit / numProcesses)
+    intendedStartTime = startTime
+
     allDone = False
 
     while not allDone:
+        if openLoop:
+            # wait for the scheduled start, if we are behind schedule the lag is included in the latency
+            sleepTimeSeconds = intendedStartTime - time.time()
+            if sleepTimeSeconds > 0:
+                time.sleep(sleepTimeSeconds)
         # check if we need to slow down
-        if time.time() > nextReportTime:
+        elif time.time() > nextReportTime:
             # we are running slower than the rate limiter
             nextReportTime = time.time() + intervalSeconds
             numLimiterTransactions = 0
@@ -556,19 +739,25 @@ def run_worker(threadNum,perfQ,appConfig):
         col = db[myCollectionName]
 
         batchStartTime = time.time()
+        if openLoop:
+            # measure from the intended start to avoid coordinated omission
+            batchStartTime = intendedStartTime
+            intendedStartTime = nextArrivalTime(intendedStartTime,arrivalIntervalSeconds,arrivalSchedule)
 
         # point queries
         opStartTime = time.time()
         for loop in range(sysbenchPointQueries):
             numTotalOperations += 1
             numIntervalOperations += 1
-            startId = random.randint(1,numExistingDocuments)
+            thisOpStartTime = time.time()
+            startId = chooseKey(keyChooser)
             try:
                 thisDoc = col.find_one(filter={lookupField:startId},projection={"_id":0,"c":1})
                 pass
             except TypeError as e:
                 numTotalExceptions += 1
                 numIntervalExceptions += 1
+            histogramRecord(opHistograms[0],(time.time() - thisOpStartTime) * 1000)
         op1Ms += (time.time() - opStartTime) * 1000
     
         # simple ranges
@@ -576,10 +765,12 @@ def run_worker(threadNum,perfQ,appConfig):
         for loop in range(sysbenchSimpleRangeQueries):
             numTotalOperations += 1
             numIntervalOperations += 1
-            startId = random.randint(1,numExistingDocuments)
+            thisOpStartTime = time.time()
+            startId = chooseKey(keyChooser)
             endId = startId + sysbenchRangeSize
             for thisDoc in col.find(filter={lookupField:{"$gte":startId,"$lte":endId}},projection={"_id":0,"c":1}):
                 pass
+            histogramRecord(opHistograms[1],(time.time() - thisOpStartTime) * 1000)
         op2Ms += (time.time() - opStartTime) * 1000
         
         # summed ranges
@@ -587,10 +778,12 @@ def run_worker(threadNum,perfQ,appConfig):
         for loop in range(sysbenchSumRangeQueries):
             numTotalOperations += 1
             numIntervalOperations += 1
-            startId = random.randint(1,numExistingDocuments)
+            thisOpStartTime = time.time()
+            startId = chooseKey(keyChooser)
             endId = startId + sysbenchRangeSize
             for thisDoc in col.aggregate([{"$match":{lookupField:{"$gte":startId,"$lte":endId}}},{"$project":{"_id":0,"numUpdates":1}},{"$group":{"_id":None,"sum":{"$sum":"$numUpdates"}}}]):
                 pass
+            histogramRecord(opHistograms[2],(time.time() - thisOpStartTime) * 1000)
         op3Ms += (time.time() - opStartTime) * 1000
         
         # ordered ranges
@@ -598,10 +791,12 @@ def run_worker(threadNum,perfQ,appConfig):
         for loop in range(sysbenchOrderedRangeQueries):
             numTotalOperations += 1
             numIntervalOperations += 1
-            startId = random.randint(1,numExistingDocuments)
+            thisOpStartTime = time.time()
+            startId = chooseKey(keyChooser)
             endId = startId + sysbenchRangeSize
             for thisDoc in col.find(filter={lookupField:{"$gte":startId,"$lte":endId}},projection={"_id":0,"c":1},sort=[("c",pymongo.ASCENDING)]):
                 pass
+            histogramRecord(opHistograms[3],(time.time() - thisOpStartTime) * 1000)
         op4Ms += (time.time() - opStartTime) * 1000
         
         # distinct ranges
@@ -609,10 +804,12 @@ def run_worker(threadNum,perfQ,appConfig):
         for loop in range(sysbenchDistinctRangeQueries):
             numTotalOperations += 1
             numIntervalOperations += 1
-            startId = random.randint(1,numExistingDocuments)
+            thisOpStartTime = time.time()
+            startId = chooseKey(keyChooser)
             endId = startId + sysbenchRangeSize
             for thisDoc in col.distinct("c",filter={lookupField:{"$gte":startId,"$lte":endId}}):
                 pass
+            histogramRecord(opHistograms[4],(time.time() - thisOpStartTime) * 1000)
         op5Ms += (time.time() - opStartTime) * 1000
         
         # indexed updates
@@ -620,9 +817,11 @@ def run_worker(threadNum,perfQ,appConfig):
         for loop in range(sysbenchIndexedUpdates):
             numTotalOperations += 1
             numIntervalOperations += 1
-            startId = random.randint(1,numExistingDocuments)
+            thisOpStartTime = time.time()
+            startId = chooseKey(keyChooser)
             newStartId = random.randint(1,numExistingDocuments)
             thisResult = col.update_one({lookupField:startId},{"$set":{"k":newStartId},"$inc":{"numUpdates":1}})
+            histogramRecord(opHistograms[5],(time.time() - thisOpStartTime) * 1000)
         op6Ms += (time.time() - opStartTime) * 1000
         
         # non-indexed updates
@@ -630,9 +829,11 @@ def run_worker(threadNum,perfQ,appConfig):
         for loop in range(sysbenchNonIndexedUpdates):
             numTotalOperations += 1
             numIntervalOperations += 1
-            startId = random.randint(1,numExistingDocuments)
+            thisOpStartTime = time.time()
+            startId = chooseKey(keyChooser)
             randomStringStart = round(random.randint(1,textBufferMaxStart)/13)*13
             thisResult = col.update_one({lookupField:startId},{"$set":{"c":sysbenchString[randomStringStart:randomStringStart+cFieldSize]},"$inc":{"numUpdates":1}})
+            histogramRecord(opHistograms[6],(time.time() - thisOpStartTime) * 1000)
         op7Ms += (time.time() - opStartTime) * 1000
         
         # deletes then inserts
@@ -643,7 +844,8 @@ def run_worker(threadNum,perfQ,appConfig):
             numIntervalOperations += 2
             
             # delete existing document
-            startId = random.randint(1,numExistingDocuments)
+            thisOpStartTime = time.time()
+            startId = chooseKey(keyChooser)
             thisResult = col.delete_one({"_id":startId})
 
             # put it back with new values
@@ -662,20 +864,26 @@ def run_worker(threadNum,perfQ,appConfig):
                 # race condition - two processes on the same document
                 numTotalExceptions += 1
                 numIntervalExceptions += 1
+            histogramRecord(opHistograms[7],(time.time() - thisOpStartTime) * 1000)
         op8Ms += (time.time() - opStartTime) * 1000
 
         numTotalTransactions += 1
         numIntervalTransactions += 1
         
-        batchElapsedMs += (time.time() - batchStartTime) * 1000
+        thisTransactionMs = (time.time() - batchStartTime) * 1000
+        batchElapsedMs += thisTransactionMs
+        histogramRecord(intervalHistogram,thisTransactionMs)
         
-        if time.time() > nextPerfReportTime:
+        if (time.time() > nextPerfReportTime) or (inWarmup and time.time() >= warmupEndTime):
             nextPerfReportTime = time.time() + perfReportInterval
-            perfQ.put({"name":"batchCompleted","batches":numIntervalTransactions,"latency":batchElapsedMs,"inserts":numIntervalTransactions,"exceptions":numIntervalExceptions})
+            perfQ.put({"name":"batchCompleted","batches":numIntervalTransactions,"latency":batchElapsedMs,"inserts":numIntervalTransactions,"exceptions":numIntervalExceptions,"histogram":histogramSerialize(intervalHistogram),"warmup":inWarmup})
+            inWarmup = inWarmup and time.time() < warmupEndTime
             batchElapsedMs = 0.0
             numIntervalTransactions = 0
             numIntervalExceptions = 0
-            perfQ.put({"name":"batchDetails","batches":numIntervalTransactions,"op1Ms":op1Ms,"op2Ms":op2Ms,"op3Ms":op3Ms,"op4Ms":op4Ms,"op5Ms":op5Ms,"op6Ms":op6Ms,"op7Ms":op7Ms,"op8Ms":op8Ms})
+            intervalHistogram = {}
+            perfQ.put({"name":"batchDetails","batches":numIntervalTransactions,"op1Ms":op1Ms,"op2Ms":op2Ms,"op3Ms":op3Ms,"op4Ms":op4Ms,"op5Ms":op5Ms,"op6Ms":op6Ms,"op7Ms":op7Ms,"op8Ms":op8Ms,"opHistograms":[histogramSerialize(thisHistogram) for thisHistogram in opHistograms]})
+            opHistograms = [{} for thisOp in range(8)]
             op1Ms = 0.0
             op2Ms = 0.0
             op3Ms = 0.0
@@ -692,13 +900,617 @@ def run_worker(threadNum,perfQ,appConfig):
             allDone = True
         
     client.close()
-    
-    perfQ.put({"name":"processCompleted","processNum":threadNum})
+
+
+def run_worker(threadNum,perfQ,appConfig):
+    try:
+        run_worker_main(threadNum,perfQ,appConfig)
+    finally:
+        # the reporter and sweep_collect wait for every process, so report completion even if the run failed
+        perfQ.put({"name":"processCompleted","processNum":threadNum})
+
+
+def get_async_client_class():
+    # prefer the native asyncio API in pymongo 4.9+, fall back to Motor
+    try:
+        from pymongo import AsyncMongoClient
+        return AsyncMongoClient
+    except ImportError:
+        pass
+    try:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return AsyncIOMotorClient
+    except ImportError:
+        return None
+
+
+async def await_if_needed(thisResult):
+    # pymongo's async API returns coroutines for aggregate() and close(), Motor does not
+    if inspect.isawaitable(thisResult):
+        return await thisResult
+    return thisResult
+
+
+async def async_run_transaction(col,workerState,appConfig):
+    numExistingDocuments = appConfig['numExistingDocuments']
+    sysbenchRangeSize = appConfig['sysbenchRangeSize']
+    lookupField = workerState['lookupField']
+    keyChooser = workerState['keyChooser']
+    sysbenchString = workerState['sysbenchString']
+    textBufferMaxStart = workerState['textBufferMaxStart']
+    padFieldSize = appConfig['padFieldSize']-1
+    cFieldSize = appConfig['cFieldSize']-1
+    opHistograms = workerState['opHistograms']
+    opMs = workerState['opMs']
+
+    # each operation counts its own driver errors so one failure does not end the session
+    async def point_query():
+        startId = chooseKey(keyChooser)
+        thisDoc = await col.find_one(filter={lookupField:startId},projection={"_id":0,"c":1})
+
+    async def simple_range():
+        startId = chooseKey(keyChooser)
+        endId = startId + sysbenchRangeSize
+        async for thisDoc in col.find(filter={lookupField:{"$gte":startId,"$lte":endId}},projection={"_id":0,"c":1}):
+            pass
+
+    async def summed_range():
+        startId = chooseKey(keyChooser)
+        endId = startId + sysbenchRangeSize
+        thisCursor = await await_if_needed(col.aggregate([{"$match":{lookupField:{"$gte":startId,"$lte":endId}}},{"$project":{"_id":0,"numUpdates":1}},{"$group":{"_id":None,"sum":{"$sum":"$numUpdates"}}}]))
+        async for thisDoc in thisCursor:
+            pass
+
+    async def ordered_range():
+        startId = chooseKey(keyChooser)
+        endId = startId + sysbenchRangeSize
+        async for thisDoc in col.find(filter={lookupField:{"$gte":startId,"$lte":endId}},projection={"_id":0,"c":1},sort=[("c",pymongo.ASCENDING)]):
+            pass
+
+    async def distinct_range():
+        startId = chooseKey(keyChooser)
+        endId = startId + sysbenchRangeSize
+        for thisDoc in await col.distinct("c",filter={lookupField:{"$gte":startId,"$lte":endId}}):
+            pass
+
+    async def indexed_update():
+        startId = chooseKey(keyChooser)
+        newStartId = random.randint(1,numExistingDocuments)
+        thisResult = await col.update_one({lookupField:startId},{"$set":{"k":newStartId},"$inc":{"numUpdates":1}})
+
+    async def non_indexed_update():
+        startId = chooseKey(keyChooser)
+        randomStringStart = round(random.randint(1,textBufferMaxStart)/13)*13
+        thisResult = await col.update_one({lookupField:startId},{"$set":{"c":sysbenchString[randomStringStart:randomStringStart+cFieldSize]},"$inc":{"numUpdates":1}})
+
+    async def delete_then_insert():
+        # delete existing document
+        startId = chooseKey(keyChooser)
+        thisResult = await col.delete_one({"_id":startId})
+
+        # put it back with new values
+        thisInsert = {}
+        thisInsert["_id"] = startId
+        thisInsert["k"] = random.randint(1,numExistingDocuments)
+        randomStringStart = round(random.randint(1,textBufferMaxStart)/13)*13
+        thisInsert["c"] = sysbenchString[randomStringStart:randomStringStart+cFieldSize]
+        randomStringStart = round(random.randint(1,textBufferMaxStart)/13)*13
+        thisInsert["pad"] = sysbenchString[randomStringStart:randomStringStart+padFieldSize]
+        thisInsert["numUpdates"] = 0
+
+        # a DuplicateKeyError is a race condition - two sessions on the same document
+        thisResult = await col.insert_one(thisInsert)
+
+    operations = [
+        (point_query,appConfig['sysbenchPointQueries']),
+        (simple_range,appConfig['sysbenchSimpleRangeQueries']),
+        (summed_range,appConfig['sysbenchSumRangeQueries']),
+        (ordered_range,appConfig['sysbenchOrderedRangeQueries']),
+        (distinct_range,appConfig['sysbenchDistinctRangeQueries']),
+        (indexed_update,appConfig['sysbenchIndexedUpdates']),
+        (non_indexed_update,appConfig['sysbenchNonIndexedUpdates']),
+        (delete_then_insert,appConfig['sysbenchDeletesThenInserts'])
+    ]
+
+    for opNum, (thisOperation, numLoops) in enumerate(operations):
+        opStartTime = time.time()
+        for loop in range(numLoops):
+            thisOpStartTime = time.time()
+            try:
+                await thisOperation()
+            except PyMongoError:
+                workerState['numIntervalExceptions'] += 1
+            histogramRecord(opHistograms[opNum],(time.time() - thisOpStartTime) * 1000)
+        opMs[opNum] += (time.time() - opStartTime) * 1000
+
+
+async def async_run_session(sessionNum,db,workerState,appConfig):
+    runSeconds = appConfig['runSeconds']
+    numCollections = appConfig['numCollections']
+    numOperationsThisWorker = workerState['numOperationsThisWorker']
+    startTime = workerState['startTime']
+
+    # open-loop, each session runs its own schedule at rate-limit / (processes * sessions) per second
+    arrivalSchedule = appConfig['arrivalSchedule']
+    openLoop = (arrivalSchedule != 'closed')
+    arrivalIntervalSeconds = 1.0 / (appConfig['rateLimit'] / (appConfig['numProcesses'] * appConfig['asyncSessions']))
+    # stagger the sessions across one interval, so together they arrive at an even rate instead of in bursts
+    sessionOffsetSeconds = sessionNum * arrivalIntervalSeconds / appConfig['asyncSessions']
+    intendedStartTime = nextArrivalTime(startTime + sessionOffsetSeconds,arrivalIntervalSeconds,arrivalSchedule) if openLoop else startTime
+
+    while not workerState['allDone']:
+        if openLoop:
+            sleepTimeSeconds = intendedStartTime - time.time()
+            if sleepTimeSeconds > 0:
+                await asyncio.sleep(sleepTimeSeconds)
+        # rate limiter is shared by all sessions in this process
+        elif time.time() > workerState['nextLimiterTime']:
+            workerState['nextLimiterTime'] = time.time() + workerState['limiterIntervalSeconds']
+            workerState['numLimiterTransactions'] = 0
+        elif workerState['numLimiterTransactions'] >= workerState['maxPerInterval']:
+            await asyncio.sleep(max(workerState['nextLimiterTime'] - time.time(),0))
+            continue
+
+        # claim the transaction before running it so sessions do not overshoot --num-operations
+        if (numOperationsThisWorker > 0) and (workerState['numClaimedTransactions'] >= numOperationsThisWorker):
+            break
+        workerState['numClaimedTransactions'] += 1
+        workerState['numLimiterTransactions'] += 1
+
+        # pick the collection
+        col = db["{}{}".format(appConfig['collectionName'],random.randint(1,numCollections))]
+
+        batchStartTime = time.time()
+        if openLoop:
+            # measure from the intended start to avoid coordinated omission
+            batchStartTime = intendedStartTime
+            intendedStartTime = nextArrivalTime(intendedStartTime,arrivalIntervalSeconds,arrivalSchedule)
+        await async_run_transaction(col,workerState,appConfig)
+        thisTransactionMs = (time.time() - batchStartTime) * 1000
+
+        workerState['numTotalTransactions'] += 1
+        workerState['numIntervalTransactions'] += 1
+        workerState['batchElapsedMs'] += thisTransactionMs
+        histogramRecord(workerState['intervalHistogram'],thisTransactionMs)
+
+        if ((time.time() - startTime) >= runSeconds) and (runSeconds > 0):
+            workerState['allDone'] = True
+
+
+def async_send_perf(perfQ,workerState):
+    perfQ.put({"name":"batchCompleted","batches":workerState['numIntervalTransactions'],"latency":workerState['batchElapsedMs'],"inserts":workerState['numIntervalTransactions'],"exceptions":workerState['numIntervalExceptions'],"histogram":histogramSerialize(workerState['intervalHistogram']),"warmup":workerState['inWarmup']})
+    workerState['inWarmup'] = workerState['inWarmup'] and time.time() < workerState['warmupEndTime']
+    opMs = workerState['opMs']
+    perfQ.put({"name":"batchDetails","batches":workerState['numIntervalTransactions'],"op1Ms":opMs[0],"op2Ms":opMs[1],"op3Ms":opMs[2],"op4Ms":opMs[3],"op5Ms":opMs[4],"op6Ms":opMs[5],"op7Ms":opMs[6],"op8Ms":opMs[7],"opHistograms":[histogramSerialize(thisHistogram) for thisHistogram in workerState['opHistograms']]})
+    workerState['numIntervalTransactions'] = 0
+    workerState['numIntervalExceptions'] = 0
+    workerState['batchElapsedMs'] = 0.0
+    workerState['intervalHistogram'] = {}
+    workerState['opHistograms'] = [{} for thisOp in range(8)]
+    workerState['opMs'] = [0.0 for thisOp in range(8)]
+
+
+async def async_perf_reporter(perfQ,workerState):
+    perfReportInterval = 1
+    while not workerState['allDone']:
+        sleepTimeSeconds = perfReportInterval
+        if workerState['inWarmup']:
+            # report the interval in progress as soon as the sweep warmup ends
+            sleepTimeSeconds = min(sleepTimeSeconds,max(workerState['warmupEndTime'] - time.time(),0))
+        await asyncio.sleep(sleepTimeSeconds)
+        async_send_perf(perfQ,workerState)
+
+
+async def async_run_main(threadNum,perfQ,appConfig):
+    numProcesses = appConfig['numProcesses']
+    numSessions = appConfig['asyncSessions']
+    rateLimitPerProcess = appConfig['rateLimit']//numProcesses
+
+    indexForQueries = appConfig['indexForQueries']
+    if indexForQueries == 'id':
+        lookupField = '_id'
+    elif indexForQueries == 'k':
+        lookupField = 'k'
+    else:
+        printLog("Unknown value {} for --index-for-queries, exiting".format(indexForQueries),appConfig)
+        sys.exit(1)
+
+    sysbenchStringBufferSize = 4*1024*1024
+
+    workerState = {}
+    workerState['lookupField'] = lookupField
+    workerState['keyChooser'] = buildKeyChooser(appConfig['keyDistribution'],appConfig['numExistingDocuments'],appConfig)
+    workerState['sysbenchString'] = sysbench_string(sysbenchStringBufferSize)
+    workerState['textBufferMaxStart'] = sysbenchStringBufferSize-(1*1024*1024)
+    workerState['numOperationsThisWorker'] = math.ceil(appConfig['numOperations']/numProcesses)
+    waitForStart(appConfig)
+    workerState['startTime'] = time.time()
+    workerState['inWarmup'] = appConfig['sweep']
+    workerState['warmupEndTime'] = workerState['startTime'] + appConfig['sweepWarmupSeconds']
+    workerState['limiterIntervalSeconds'] = 2
+    workerState['nextLimiterTime'] = workerState['startTime'] + workerState['limiterIntervalSeconds']
+    workerState['maxPerInterval'] = rateLimitPerProcess * workerState['limiterIntervalSeconds']
+    workerState['numLimiterTransactions'] = 0
+    workerState['numClaimedTransactions'] = 0
+    workerState['numTotalTransactions'] = 0
+    workerState['numIntervalTransactions'] = 0
+    workerState['numIntervalExceptions'] = 0
+    workerState['batchElapsedMs'] = 0.0
+    workerState['intervalHistogram'] = {}
+    workerState['opHistograms'] = [{} for thisOp in range(8)]
+    workerState['opMs'] = [0.0 for thisOp in range(8)]
+    workerState['allDone'] = False
+
+    # one connection per session so every session can have an operation in flight
+    asyncClientClass = get_async_client_class()
+    client = asyncClientClass(appConfig['uri'],maxPoolSize=numSessions)
+    db = client[appConfig['databaseName']]
+
+    reporterTask = asyncio.ensure_future(async_perf_reporter(perfQ,workerState))
+    try:
+        await asyncio.gather(*[async_run_session(sessionNum,db,workerState,appConfig) for sessionNum in range(numSessions)])
+    finally:
+        workerState['allDone'] = True
+        reporterTask.cancel()
+
+        # final partial interval
+        async_send_perf(perfQ,workerState)
+
+        await await_if_needed(client.close())
+
+
+def async_run_worker(threadNum,perfQ,appConfig):
+    warnings.filterwarnings("ignore","You appear to be connected to a DocumentDB cluster.")
+
+    random.seed()
+
+    try:
+        asyncio.run(async_run_main(threadNum,perfQ,appConfig))
+    finally:
+        # the reporter and sweep_collect wait for every process, so report completion even if the run failed
+        perfQ.put({"name":"processCompleted","processNum":threadNum})
+
+
+def sweep_collect(perfQ,stepConfig):
+    # drain worker messages for one sweep step, workers flag the intervals that started during their warmup
+    numProcesses = stepConfig['numProcesses']
+
+    numProcessesCompleted = 0
+    lastWarmupTime = 0.0
+    measureStartTime = 0.0
+    lastMessageTime = 0.0
+    numTransactions = 0
+    numExceptions = 0
+    stepHistogram = {}
+
+    while (numProcessesCompleted < numProcesses):
+        try:
+            qMessage = perfQ.get(timeout=0.25)
+        except queue.Empty:
+            continue
+
+        nowTime = time.time()
+        if qMessage['name'] == "batchCompleted":
+            if qMessage['warmup']:
+                lastWarmupTime = nowTime
+            else:
+                # the baseline is the end of the warmup, when the last warmup interval came in
+                if measureStartTime == 0.0:
+                    measureStartTime = lastWarmupTime
+                numTransactions += qMessage['inserts']
+                numExceptions += qMessage['exceptions']
+                histogramMerge(stepHistogram,qMessage['histogram'])
+                lastMessageTime = nowTime
+        elif qMessage['name'] == "processCompleted":
+            numProcessesCompleted += 1
+
+    measuredSeconds = lastMessageTime - measureStartTime
+    if measuredSeconds > 0:
+        achievedTps = numTransactions / measuredSeconds
+    else:
+        achievedTps = 0.0
+
+    return achievedTps, stepHistogram, numExceptions
+
+
+def run_sweep(perfQ,appConfig):
+    sloP99Ms = appConfig['sweepSloP99Ms']
+    plateauPct = appConfig['sweepPlateauPct']
+    offeredTps = float(appConfig['sweepStartRate'])
+
+    # offered load is only meaningful with an open-loop schedule
+    stepConfig = dict(appConfig)
+    if stepConfig['arrivalSchedule'] == 'closed':
+        stepConfig['arrivalSchedule'] = 'uniform'
+    stepConfig['runSeconds'] = appConfig['sweepWarmupSeconds'] + appConfig['sweepMeasureSeconds']
+    stepConfig['numOperations'] = 0
+
+    printCsv("step,offered-tps,achieved-tps,p50-ms,p99-ms,exceptions",appConfig)
+
+    sweepResults = []
+    bestTps = 0.0
+    stopReason = "reached --sweep-max-steps"
+
+    for stepNum in range(1,appConfig['sweepMaxSteps']+1):
+        stepConfig['rateLimit'] = offeredTps
+        printLog("sweep step {} | offered {:10,.2f} tps | {} s warmup + {} s measured".format(stepNum,offeredTps,appConfig['sweepWarmupSeconds'],appConfig['sweepMeasureSeconds']),appConfig)
+
+        processList = []
+        for loop in range(stepConfig['numProcesses']):
+            if stepConfig['asyncMode']:
+                p = mp.Process(target=async_run_worker,args=(loop,perfQ,stepConfig))
+            else:
+                p = mp.Process(target=run_worker,args=(loop,perfQ,stepConfig))
+            processList.append(p)
+
+        for process in processList:
+            process.start()
+
+        achievedTps, stepHistogram, numExceptions = sweep_collect(perfQ,stepConfig)
+
+        for process in processList:
+            process.join()
+
+        p50Ms = histogramPercentile(stepHistogram,50.0)
+        p99Ms = histogramPercentile(stepHistogram,99.0)
+        sweepResults.append((stepNum,offeredTps,achievedTps,p50Ms,p99Ms,numExceptions))
+        printLog("sweep step {} | achieved {:10,.2f} tps | p50 {:8,.2f} ms | p99 {:8,.2f} ms | {:6,d} exceptions".format(stepNum,achievedTps,p50Ms,p99Ms,numExceptions),appConfig)
+        printCsv("{},{:.2f},{:.2f},{:.3f},{:.3f},{}".format(stepNum,offeredTps,achievedTps,p50Ms,p99Ms,numExceptions),appConfig)
+
+        if p99Ms > sloP99Ms:
+            stopReason = "p99 {:,.2f} ms exceeded --sweep-slo-p99-ms {:,.2f}".format(p99Ms,sloP99Ms)
+            break
+
+        if (bestTps > 0) and (achievedTps < bestTps * (1 + plateauPct / 100)):
+            stopReason = "throughput plateaued, {:,.2f} tps is within {}% of {:,.2f} tps".format(achievedTps,plateauPct,bestTps)
+            break
+
+        bestTps = max(bestTps,achievedTps)
+        offeredTps = offeredTps * appConfig['sweepRateMultiplier']
+
+    printLog('---------------------------------------------------------------------------------------',appConfig)
+    printLog("sweep stopped | {}".format(stopReason),appConfig)
+    printLog("  step |  offered tps | achieved tps |   p50 ms |   p99 ms | exceptions",appConfig)
+    for stepNum, offeredTps, achievedTps, p50Ms, p99Ms, numExceptions in sweepResults:
+        printLog("  {:4d} | {:12,.2f} | {:12,.2f} | {:8,.2f} | {:8,.2f} | {:10,d}".format(stepNum,offeredTps,achievedTps,p50Ms,p99Ms,numExceptions),appConfig)
+
+    # the knee is the highest throughput step that still met the latency SLO
+    withinSlo = [thisResult for thisResult in sweepResults if thisResult[4] <= sloP99Ms]
+    if withinSlo:
+        kneeResult = max(withinSlo,key=lambda thisResult: thisResult[2])
+        printLog("saturation knee | step {} | offered {:,.2f} tps | achieved {:,.2f} tps | p99 {:,.2f} ms".format(kneeResult[0],kneeResult[1],kneeResult[2],kneeResult[4]),appConfig)
+    else:
+        printLog("saturation knee | no step met the p99 SLO, lower --sweep-start-rate",appConfig)
+    printLog('---------------------------------------------------------------------------------------',appConfig)
+
+
+def agent_send(thisSocket,thisMessage):
+    # newline delimited JSON, histograms and other bytes values are base64 encoded
+    thisLine = json.dumps(thisMessage,default=lambda thisValue: {'__bytes__':base64.b64encode(thisValue).decode('ascii')}) + '\n'
+    thisSocket.sendall(thisLine.encode('utf-8'))
+
+
+def agent_read(thisReader):
+    # returns None when the other side has closed the connection
+    thisLine = thisReader.readline()
+    if not thisLine:
+        return None
+    return json.loads(thisLine,object_hook=lambda thisValue: base64.b64decode(thisValue['__bytes__']) if '__bytes__' in thisValue else thisValue)
+
+
+def worker_target(appConfig):
+    if appConfig['modeLoad']:
+        return load_worker
+    elif appConfig['asyncMode']:
+        return async_run_worker
+    return run_worker
+
+
+def coordinator_reader(agentNum,agentConnection,perfQ,appConfig):
+    # forward an agent's worker messages to the reporter, if the agent goes away its workers are marked completed
+    numProcessesCompleted = 0
+    agentCompleted = False
+    while True:
+        try:
+            qMessage = agent_read(agentConnection['reader'])
+        except (OSError, ValueError) as e:
+            printLog("agent {} | connection error {}".format(agentNum,e),appConfig)
+            qMessage = None
+        if qMessage is None:
+            break
+        if qMessage['name'] == "agentCompleted":
+            agentCompleted = True
+            break
+        if qMessage['name'] == "processCompleted":
+            numProcessesCompleted += 1
+        perfQ.put(qMessage)
+
+    if not agentCompleted:
+        printLog("agent {} | {} disconnected before completing".format(agentNum,agentConnection['hostName']),appConfig)
+    for loop in range(len(agentConnection['processNums']) - numProcessesCompleted):
+        perfQ.put({"name":"processCompleted","processNum":-1})
+    agentConnection['socket'].close()
+
+
+def run_coordinator(perfQ,appConfig):
+    numAgents = appConfig['numAgents']
+    numProcesses = appConfig['numProcesses']
+
+    serverSocket = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+    serverSocket.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+    serverSocket.bind((appConfig['coordinatorHost'],appConfig['coordinatorPort']))
+    serverSocket.listen(numAgents)
+    if not appConfig['coordinatorToken']:
+        # no token supplied, generate one for this run
+        appConfig['coordinatorToken'] = secrets.token_hex(16)
+        printLog("coordinator | start the agents with --coordinator-token {}".format(appConfig['coordinatorToken']),appConfig)
+    printLog("coordinator | waiting for {} agent(s) on {}:{}".format(numAgents,appConfig['coordinatorHost'],appConfig['coordinatorPort']),appConfig)
+
+    agentConnections = []
+    while len(agentConnections) < numAgents:
+        thisSocket, thisAddress = serverSocket.accept()
+        thisSocket.setsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY,1)
+        thisReader = thisSocket.makefile('rb')
+        # nothing is sent to a connection until it has presented the token
+        try:
+            thisSocket.settimeout(10)
+            qMessage = agent_read(thisReader)
+            thisSocket.settimeout(None)
+        except (OSError,ValueError):
+            qMessage = None
+        if not isinstance(qMessage,dict) or qMessage.get('name') != "agentHello" or not hmac.compare_digest(str(qMessage.get('token','')).encode('utf-8'),appConfig['coordinatorToken'].encode('utf-8')):
+            printLog("coordinator | ignoring connection from {}, not an agent or wrong --coordinator-token".format(thisAddress[0]),appConfig)
+            thisReader.close()
+            thisSocket.close()
+            continue
+        agentConnections.append({'socket':thisSocket,'reader':thisReader,'hostName':qMessage['hostName']})
+        printLog("coordinator | agent {} connected from {} ({})".format(len(agentConnections)-1,qMessage['hostName'],thisAddress[0]),appConfig)
+    serverSocket.close()
+
+    # processes (collections when loading) are dealt round-robin so every agent gets an equal share
+    # agents supply their own --uri, credentials in the connection string never leave the coordinator
+    agentConfig = {thisKey: appConfig[thisKey] for thisKey in appConfig if thisKey not in ['logFileName','csvFileName','resultsFileName','uri','coordinatorToken']}
+    for agentNum, agentConnection in enumerate(agentConnections):
+        agentConnection['processNums'] = [thisProcessNum for thisProcessNum in range(numProcesses) if thisProcessNum % numAgents == agentNum]
+        agent_send(agentConnection['socket'],{"name":"agentConfig","agentNum":agentNum,"processNums":agentConnection['processNums'],"appConfig":agentConfig})
+
+    # start barrier, every agent must be connected to the cluster before anyone starts
+    for agentNum, agentConnection in enumerate(agentConnections):
+        qMessage = agent_read(agentConnection['reader'])
+        if qMessage is None or qMessage['name'] != "agentReady":
+            printLog("coordinator | agent {} failed to get ready: {}".format(agentNum,qMessage.get('message','disconnected') if qMessage else 'disconnected'),appConfig)
+            for thisConnection in agentConnections:
+                thisConnection['socket'].close()
+            sys.exit(1)
+
+    printLog("coordinator | all agents ready, starting {} process(es) in {} seconds".format(numProcesses,appConfig['startDelaySeconds']),appConfig)
+    for agentConnection in agentConnections:
+        agent_send(agentConnection['socket'],{"name":"start","startDelaySeconds":appConfig['startDelaySeconds']})
+
+    readerThreads = []
+    for agentNum, agentConnection in enumerate(agentConnections):
+        t = threading.Thread(target=coordinator_reader,args=(agentNum,agentConnection,perfQ,appConfig))
+        t.start()
+        readerThreads.append(t)
+
+    # the reporter counts its interval from the synchronized start
+    time.sleep(appConfig['startDelaySeconds'])
+    reporter(perfQ,appConfig)
+
+    for t in readerThreads:
+        t.join()
+
+
+def run_agent(agentArgs):
+    warnings.filterwarnings("ignore","You appear to be connected to a DocumentDB cluster.")
+
+    logConfig = {'logFileName':"{}.log".format(agentArgs.file_name)}
+    deleteLog(logConfig)
+
+    # keep trying while the coordinator is starting up
+    connectDeadline = time.time() + agentArgs.connect_timeout_seconds
+    while True:
+        try:
+            agentSocket = socket.create_connection((agentArgs.coordinator_host,agentArgs.coordinator_port))
+            break
+        except OSError as e:
+            if time.time() > connectDeadline:
+                printLog("agent | unable to connect to coordinator {}:{}: {}".format(agentArgs.coordinator_host,agentArgs.coordinator_port,e),logConfig)
+                sys.exit(1)
+            time.sleep(1)
+    agentSocket.setsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY,1)
+    agentReader = agentSocket.makefile('rb')
+    agent_send(agentSocket,{"name":"agentHello","hostName":socket.gethostname(),"token":agentArgs.coordinator_token})
+
+    qMessage = agent_read(agentReader)
+    if qMessage is None or qMessage['name'] != "agentConfig":
+        printLog("agent | coordinator closed the connection before sending the configuration, check --coordinator-token",logConfig)
+        sys.exit(1)
+    agentNum = qMessage['agentNum']
+    appConfig = qMessage['appConfig']
+    processNums = qMessage['processNums']
+    appConfig['logFileName'] = logConfig['logFileName']
+    appConfig['uri'] = agentArgs.uri
+    printLog("agent {} | running process(es) {} in {} mode".format(agentNum,",".join(str(thisProcessNum) for thisProcessNum in processNums),"load" if appConfig['modeLoad'] else "run"),appConfig)
+
+    try:
+        client = pymongo.MongoClient(host=appConfig['uri'],appname='pymongosysbench')
+        client.admin.command('ping')
+        client.close()
+    except pymongo.errors.PyMongoError as e:
+        agent_send(agentSocket,{"name":"agentFailed","message":"{}: {}".format(socket.gethostname(),e)})
+        printLog("agent | unable to connect to the cluster: {}".format(e),appConfig)
+        sys.exit(1)
+    agent_send(agentSocket,{"name":"agentReady"})
+
+    qMessage = agent_read(agentReader)
+    if qMessage is None or qMessage['name'] != "start":
+        printLog("agent | coordinator closed the connection before the start",appConfig)
+        sys.exit(1)
+    # the delay rather than an absolute time is sent so agent clocks do not need to agree
+    appConfig['startAtTime'] = time.time() + qMessage['startDelaySeconds']
+
+    mp.set_start_method('spawn')
+    q = mp.Manager().Queue()
+
+    processList = []
+    for thisProcessNum in processNums:
+        p = mp.Process(target=worker_target(appConfig),args=(thisProcessNum,q,appConfig))
+        processList.append(p)
+
+    for process in processList:
+        process.start()
+
+    # stream every worker message to the coordinator as it arrives
+    numProcessesCompleted = 0
+    while numProcessesCompleted < len(processList):
+        try:
+            qMessage = q.get(timeout=0.25)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processList):
+                break
+            continue
+        if qMessage['name'] == "processCompleted":
+            numProcessesCompleted += 1
+        agent_send(agentSocket,qMessage)
+
+    for process in processList:
+        process.join()
+
+    while not q.empty():
+        agent_send(agentSocket,q.get_nowait())
+
+    agent_send(agentSocket,{"name":"agentCompleted"})
+    agentSocket.close()
+    printLog("agent {} | completed".format(agentNum),appConfig)
+
+
+def agent_main():
+    parser = argparse.ArgumentParser(description='Data Generator agent, runs workers for a --coordinator')
+
+    parser.add_argument('--agent',required=True,action='store_true',help='Run as an agent')
+    parser.add_argument('--coordinator-host',required=True,type=str,help='Host name or address of the coordinator')
+    parser.add_argument('--coordinator-port',required=False,type=int,default=27900,help='Port of the coordinator')
+    parser.add_argument('--uri',required=True,type=str,help='URI (connection string) for this agent')
+    parser.add_argument('--coordinator-token',required=False,type=str,default=os.environ.get('SYSBENCH_COORDINATOR_TOKEN'),help='Token printed by the coordinator, default=$SYSBENCH_COORDINATOR_TOKEN')
+    parser.add_argument('--file-name',required=False,type=str,default='agent',help='Starting name of the agent log file')
+    parser.add_argument('--connect-timeout-seconds',required=False,type=int,default=300,help='Seconds to keep retrying the connection to the coordinator')
+
+    agentArgs = parser.parse_args()
+    if not agentArgs.coordinator_token:
+        parser.error("--coordinator-token or SYSBENCH_COORDINATOR_TOKEN is required")
+
+    run_agent(agentArgs)
 
 
 def main():
     warnings.filterwarnings("ignore","You appear to be connected to a DocumentDB cluster.")
 
+    # agents only need to know where the coordinator is, everything else comes from the coordinator
+    if '--agent' in sys.argv[1:]:
+        agent_main()
+        return
+
     parser = argparse.ArgumentParser(description='Data Generator')
 
     parser.add_argument('--uri',required=True,type=str,help='URI (connection string)')
@@ -710,7 +1522,7 @@ def main():
     parser.add_argument('--num-collections',required=False,type=int,default=10,help='Number of collections')
     parser.add_argument('--num-documents-per-collection',required=False,type=int,default=5000000,help='Number of documents per collection')
     parser.add_argument('--load-batch-size',required=False,default=100,type=int,help='Number of documents to insert per batch during load')
-    parser.add_argument('--rate-limit',required=False,type=int,default=9999999,help='Limit throughput (operations per second)')
+    parser.add_argument('--rate-limit',required=False,type=positiveInt,default=9999999,help='Limit throughput (operations per second)')
     parser.add_argument('--pad-field-size',required=False,type=int,default=60,help='Size of pad field (bytes)')
     parser.add_argument('--compressible-field-size',required=False,type=int,default=0,help='Size of compressible field (bytes)')
     parser.add_argument('--ordered-batches',required=False,action='store_true',help='Use ordered bulk-writes')
@@ -732,6 +1544,31 @@ def main():
     parser.add_argument('--sysbench-deletes-then-inserts',required=False,type=int,default=1,help='Number of single document delete then insert operations per sysbench transaction')
     parser.add_argument('--index-for-queries',required=False,type=str,default='id',choices=['id','k'],help='Index to use for queries, id or k')
     parser.add_argument('--show-detailed-latencies',required=False,action='store_true',help='Show individual latencies for each step in the Sysbench transaction')
+    parser.add_argument('--arrival-schedule',required=False,type=str,default='closed',choices=['closed','uniform','poisson'],help='closed = rate limit by sleeping when ahead, uniform/poisson = open-loop arrivals at --rate-limit with latency measured from the scheduled start')
+    parser.add_argument('--results-format',required=False,type=str,default='none',choices=['none','arrow','parquet','npz'],help='Also write per-interval metrics and histograms to a columnar results file (arrow and parquet need pyarrow, npz needs numpy)')
+    parser.add_argument('--sweep',required=False,action='store_true',help='Step the offered load until p99 exceeds --sweep-slo-p99-ms or throughput plateaus')
+    parser.add_argument('--sweep-start-rate',required=False,type=positiveInt,default=100,help='Offered load (transactions per second) for the first sweep step')
+    parser.add_argument('--sweep-rate-multiplier',required=False,type=float,default=1.5,help='Offered load multiplier between sweep steps')
+    parser.add_argument('--sweep-warmup-seconds',required=False,type=int,default=30,help='Seconds to run each sweep step before measuring')
+    parser.add_argument('--sweep-measure-seconds',required=False,type=int,default=60,help='Seconds to measure each sweep step')
+    parser.add_argument('--sweep-slo-p99-ms',required=False,type=float,default=100.0,help='Stop the sweep when p99 transaction latency exceeds this (milliseconds)')
+    parser.add_argument('--sweep-plateau-pct',required=False,type=float,default=5.0,help='Stop the sweep when throughput improves by less than this percentage over the best step')
+    parser.add_argument('--sweep-max-steps',required=False,type=int,default=20,help='Maximum number of sweep steps')
+    parser.add_argument('--async',dest='async_mode',required=False,action='store_true',help='Run the benchmark with an asyncio driver, each process multiplexes --async-sessions concurrent sessions')
+    parser.add_argument('--async-sessions',required=False,type=int,default=100,help='Number of concurrent sessions (coroutines) per process in --async mode')
+    parser.add_argument('--coordinator',required=False,action='store_true',help='Run the workers on --num-agents agents (started with --agent) and report their combined results')
+    parser.add_argument('--num-agents',required=False,type=int,default=1,help='Number of agents to wait for with --coordinator')
+    parser.add_argument('--coordinator-host',required=False,type=str,default='127.0.0.1',help='Address the coordinator listens on for agents, use 0.0.0.0 or a private address for agents on other hosts')
+    parser.add_argument('--coordinator-port',required=False,type=int,default=27900,help='Port the coordinator listens on for agents')
+    parser.add_argument('--coordinator-token',required=False,type=str,default=os.environ.get('SYSBENCH_COORDINATOR_TOKEN'),help='Token agents must present, default=$SYSBENCH_COORDINATOR_TOKEN or a random token that is printed at startup')
+    parser.add_argument('--start-delay-seconds',required=False,type=int,default=10,help='Seconds between the start barrier and the start of the workers, for the agents to initialize')
+    parser.add_argument('--agent',required=False,action='store_true',help='Run as an agent of a --coordinator, see python py-mongo-sysbench.py --agent --help')
+    parser.add_argument('--key-distribution',required=False,type=str,default='uniform',choices=['uniform','zipfian','latest','hotspot'],help='Distribution of the document ids chosen by the Sysbench transaction')
+    parser.add_argument('--zipfian-theta',required=False,type=float,default=0.99,help='Skew for --key-distribution zipfian and latest, higher is more skewed')
+    parser.add_argument('--hotspot-data-fraction',required=False,type=float,default=0.2,help='Fraction of the documents in the hot set for --key-distribution hotspot')
+    parser.add_argument('--hotspot-op-fraction',required=False,type=float,default=0.8,help='Fraction of the operations sent to the hot set for --key-distribution hotspot')
+    parser.add_argument('--load-raw-bson',required=False,action='store_true',help='Load using a pool of pre-encoded BSON documents, only _id and k are set per insert')
+    parser.add_argument('--load-document-pool-size',required=False,type=int,default=10000,help='Number of pre-encoded documents per loader when using --load-raw-bson')
 
     args = parser.parse_args()
 
@@ -780,11 +1617,57 @@ def main():
     appConfig['sysbenchDeletesThenInserts'] = int(args.sysbench_deletes_then_inserts)
     appConfig['indexForQueries'] = args.index_for_queries
     appConfig['showDetailedLatencies'] = args.show_detailed_latencies
+    appConfig['arrivalSchedule'] = args.arrival_schedule
+    appConfig['resultsFormat'] = args.results_format
+    appConfig['sweep'] = args.sweep
+    appConfig['sweepStartRate'] = int(args.sweep_start_rate)
+    appConfig['sweepRateMultiplier'] = float(args.sweep_rate_multiplier)
+    appConfig['sweepWarmupSeconds'] = int(args.sweep_warmup_seconds)
+    appConfig['sweepMeasureSeconds'] = int(args.sweep_measure_seconds)
+    appConfig['sweepSloP99Ms'] = float(args.sweep_slo_p99_ms)
+    appConfig['sweepPlateauPct'] = float(args.sweep_plateau_pct)
+    appConfig['sweepMaxSteps'] = int(args.sweep_max_steps)
+    appConfig['asyncMode'] = args.async_mode
+    appConfig['asyncSessions'] = int(args.async_sessions)
+    appConfig['loadRawBson'] = args.load_raw_bson
+    appConfig['loadDocumentPoolSize'] = int(args.load_document_pool_size)
+    appConfig['keyDistribution'] = args.key_distribution
+    appConfig['coordinator'] = args.coordinator
+    appConfig['numAgents'] = int(args.num_agents)
+    appConfig['coordinatorHost'] = args.coordinator_host
+    appConfig['coordinatorPort'] = int(args.coordinator_port)
+    appConfig['coordinatorToken'] = args.coordinator_token
+    appConfig['startDelaySeconds'] = int(args.start_delay_seconds)
+    appConfig['zipfianTheta'] = float(args.zipfian_theta)
+    appConfig['hotspotDataFraction'] = float(args.hotspot_data_fraction)
+    appConfig['hotspotOpFraction'] = float(args.hotspot_op_fraction)
 
     # parameterized but not user facing
     appConfig['cFieldSize'] = 120
 
-    if (appConfig['runSeconds'] == 0 and appConfig['numOperations'] == 0 and appConfig['modeRun']):
+    if (appConfig['resultsFormat'] != 'none'):
+        resultsFormat = resultsAvailableFormat(appConfig['resultsFormat'])
+        if resultsFormat is None:
+            printLog("--results-format {} requires pyarrow or numpy".format(appConfig['resultsFormat']),appConfig)
+            sys.exit(1)
+        if resultsFormat != appConfig['resultsFormat']:
+            printLog("pyarrow is not installed, writing --results-format npz instead of {}".format(appConfig['resultsFormat']),appConfig)
+        appConfig['resultsFormat'] = resultsFormat
+        appConfig['resultsFileName'] = "{}.{}".format(args.file_name,resultsFormat)
+
+    if (appConfig['sweep'] and not appConfig['modeRun']):
+        printLog("--sweep is only supported with --run",appConfig)
+        sys.exit(1)
+
+    if (appConfig['sweep'] and (appConfig['runSeconds'] > 0 or appConfig['numOperations'] > 0)):
+        printLog("--sweep sets the duration of each step, do not supply --run-seconds or --num-operations",appConfig)
+        sys.exit(1)
+
+    if (appConfig['sweep'] and (appConfig['sweepRateMultiplier'] <= 1.0 or appConfig['sweepMeasureSeconds'] < 1)):
+        printLog("--sweep-rate-multiplier must be greater than 1 and --sweep-measure-seconds at least 1",appConfig)
+        sys.exit(1)
+
+    if (appConfig['runSeconds'] == 0 and appConfig['numOperations'] == 0 and appConfig['modeRun'] and not appConfig['sweep']):
         printLog("Must supply non-zero for one of --run-seconds or --num-operations when executing the benchmark",appConfig)
         sys.exit(1)
 
@@ -800,6 +1683,50 @@ def main():
         printLog("--num-operations must be zero when loading data",appConfig)
         sys.exit(1)
 
+    if (appConfig['arrivalSchedule'] != 'closed' and args.rate_limit == parser.get_default('rate_limit') and not appConfig['sweep']):
+        printLog("--arrival-schedule {} requires --rate-limit".format(appConfig['arrivalSchedule']),appConfig)
+        sys.exit(1)
+
+    if (appConfig['asyncMode'] and appConfig['modeLoad']):
+        printLog("--async is only supported when running the benchmark",appConfig)
+        sys.exit(1)
+
+    if (appConfig['asyncMode'] and get_async_client_class() is None):
+        printLog("--async requires pymongo 4.9 or later (AsyncMongoClient) or the motor package",appConfig)
+        sys.exit(1)
+
+    if (appConfig['asyncSessions'] < 1):
+        printLog("--async-sessions must be at least 1",appConfig)
+        sys.exit(1)
+
+    if (appConfig['coordinator'] and appConfig['sweep']):
+        printLog("--sweep is not supported with --coordinator",appConfig)
+        sys.exit(1)
+
+    if (appConfig['resultsFormat'] != 'none' and appConfig['sweep']):
+        printLog("--results-format is not supported with --sweep, the per-step results are written to the CSV file",appConfig)
+        sys.exit(1)
+
+    if (appConfig['coordinator'] and appConfig['numAgents'] < 1):
+        printLog("--num-agents must be at least 1",appConfig)
+        sys.exit(1)
+
+    if (appConfig['coordinator'] and appConfig['modeLoad'] and appConfig['numCollections'] < appConfig['numAgents']):
+        printLog("--num-collections must be at least --num-agents when loading, each agent loads whole collections",appConfig)
+        sys.exit(1)
+
+    if (appConfig['zipfianTheta'] <= 0.0):
+        printLog("--zipfian-theta must be greater than 0",appConfig)
+        sys.exit(1)
+
+    if (not 0.0 < appConfig['hotspotDataFraction'] < 1.0 or not 0.0 <= appConfig['hotspotOpFraction'] <= 1.0):
+        printLog("--hotspot-data-fraction must be between 0 and 1 (exclusive) and --hotspot-op-fraction between 0 and 1",appConfig)
+        sys.exit(1)
+
+    if (appConfig['loadDocumentPoolSize'] < 1):
+        printLog("--load-document-pool-size must be at least 1",appConfig)
+        sys.exit(1)
+
     if (appConfig['numProcesses'] > 0 and appConfig['modeLoad']):
         printLog("--num-processes must be zero when loading data, it is automatically set to --num-collections",appConfig)
         sys.exit(1)
@@ -812,6 +1739,9 @@ def main():
     else:
         numExistingDocuments = setup_run(appConfig)
         appConfig['numDocumentsPerCollection'] = numExistingDocuments
+        if appConfig['coordinator']:
+            # --processes is per agent
+            appConfig['numProcesses'] = appConfig['numProcesses'] * appConfig['numAgents']
     
     appConfig['numExistingDocuments'] = numExistingDocuments
     
@@ -828,6 +1758,9 @@ def main():
             thisUri = thisUri.replace(thisUsername,'<USERNAME>')
             thisUri = thisUri.replace(thisPassword,'<PASSWORD>')
             printLog("  config | {} | {}".format(thisKey,thisUri),appConfig)
+        elif (thisKey == 'coordinatorToken'):
+            # the log and console can be shared, never show the token agents authenticate with
+            printLog("  config | {} | {}".format(thisKey,'<TOKEN>' if appConfig[thisKey] else None),appConfig)
         else:
             if type(appConfig[thisKey]) == int:
                 printLog("  config | {} | {:,d}".format(thisKey,appConfig[thisKey]),appConfig)
@@ -837,26 +1770,41 @@ def main():
     
     mp.set_start_method('spawn')
     q = mp.Manager().Queue()
-    t = threading.Thread(target=reporter,args=(q,appConfig,))
-    t.start()
-    
-    processList = []
-    for loop in range(appConfig['numProcesses']):
-        #time.sleep(1)
-        if appConfig['modeLoad']:
-            p = mp.Process(target=load_worker,args=(loop,q,appConfig))
-            processList.append(p)
-        else:
-            p = mp.Process(target=run_worker,args=(loop,q,appConfig))
-            processList.append(p)
-        
-    for process in processList:
-        process.start()
-        
-    for process in processList:
-        process.join()
-        
-    t.join()
+
+    if appConfig['sweep']:
+        run_sweep(q,appConfig)
+        reportCollectionInfo(appConfig)
+        reportDatabaseInfo(appConfig)
+        cleanup(appConfig)
+        printLog("Created {} and {} with results".format(appConfig['logFileName'],appConfig['csvFileName']),appConfig)
+        return
+
+    if appConfig['coordinator']:
+        run_coordinator(q,appConfig)
+    else:
+        t = threading.Thread(target=reporter,args=(q,appConfig,))
+        t.start()
+
+        processList = []
+        for loop in range(appConfig['numProcesses']):
+            #time.sleep(1)
+            if appConfig['modeLoad']:
+                p = mp.Process(target=load_worker,args=(loop,q,appConfig))
+                processList.append(p)
+            elif appConfig['asyncMode']:
+                p = mp.Process(target=async_run_worker,args=(loop,q,appConfig))
+                processList.append(p)
+            else:
+                p = mp.Process(target=run_worker,args=(loop,q,appConfig))
+                processList.append(p)
+
+        for process in processList:
+            process.start()
+
+        for process in processList:
+            process.join()
+
+        t.join()
     
     reportCollectionInfo(appConfig)
     reportDatabaseInfo(appConfig)
@@ -864,6 +1812,8 @@ def main():
     cleanup(appConfig)
     
     printLog("Created {} and {} with results".format(appConfig['logFileName'],appConfig['csvFileName']),appConfig)
+    if appConfig['resultsFormat'] != 'none':
+        printLog("Created {} with per-interval metrics and histograms, compare runs with: python sysbench_results.py {}".format(appConfig['resultsFileName'],appConfig['resultsFileName']),appConfig)
 
 
 if __name__ == "__main__":
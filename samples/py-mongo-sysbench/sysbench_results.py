@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import math
+import array
+import zipfile
+
+
+# latency histograms are log-bucketed (HDR style) with ~1% relative precision
+# so they stay small on the wire and can be merged across processes by summing buckets
+histogramGrowthFactor = 1.01
+histogramLogGrowth = math.log(histogramGrowthFactor)
+latencyPercentiles = [50.0,95.0,99.0,99.9]
+
+# number of reporting intervals buffered before a columnar batch is written
+resultsFlushIntervals = 30
+
+
+def histogramRecord(thisHistogram,latencyMs):
+    # bucket 0 holds everything under 1 microsecond
+    latencyUs = latencyMs * 1000
+    if latencyUs < 1.0:
+        thisBucket = 0
+    else:
+        thisBucket = int(math.log(latencyUs) / histogramLogGrowth) + 1
+    thisHistogram[thisBucket] = thisHistogram.get(thisBucket,0) + 1
+
+
+def histogramSerialize(thisHistogram):
+    # flat array of (bucket, count) pairs, only non-empty buckets are sent
+    thisArray = array.array('q')
+    for thisBucket, thisCount in thisHistogram.items():
+        thisArray.append(thisBucket)
+        thisArray.append(thisCount)
+    return thisArray.tobytes()
+
+
+def histogramMerge(thisHistogram,serializedHistogram):
+    thisArray = array.array('q')
+    thisArray.frombytes(serializedHistogram)
+    for i in range(0,len(thisArray),2):
+        thisHistogram[thisArray[i]] = thisHistogram.get(thisArray[i],0) + thisArray[i+1]
+
+
+def histogramMergeInto(thisHistogram,otherHistogram):
+    for thisBucket, thisCount in otherHistogram.items():
+        thisHistogram[thisBucket] = thisHistogram.get(thisBucket,0) + thisCount
+
+
+def histogramPercentile(thisHistogram,percentile):
+    # returns the upper bound of the bucket containing the percentile, in milliseconds
+    totalCount = sum(thisHistogram.values())
+    if totalCount == 0:
+        return 0.0
+    thresholdCount = totalCount * percentile / 100
+    runningCount = 0
+    for thisBucket in sorted(thisHistogram):
+        runningCount += thisHistogram[thisBucket]
+        if runningCount >= thresholdCount:
+            break
+    if thisBucket == 0:
+        return 0.0
+    return (histogramGrowthFactor ** thisBucket) / 1000
+
+
+def histogramPercentilesCsv(thisHistogram):
+    return ",".join("{:.3f}".format(histogramPercentile(thisHistogram,thisPercentile)) for thisPercentile in latencyPercentiles)
+
+
+def percentileCsvHeader(prefix):
+    return ",".join("{}-p{:g}-ms".format(prefix,thisPercentile) for thisPercentile in latencyPercentiles)
+
+
+def resultsAvailableFormat(resultsFormat):
+    # Arrow IPC and Parquet need pyarrow, fall back to NumPy .npz when it is not installed
+    if resultsFormat in ['arrow','parquet']:
+        try:
+            import pyarrow
+            return resultsFormat
+        except ImportError:
+            resultsFormat = 'npz'
+    if resultsFormat == 'npz':
+        try:
+            import numpy
+            return resultsFormat
+        except ImportError:
+            return None
+    return None
+
+
+def resultsOpen(fileName,resultsFormat,resultsColumns,metadata):
+    # resultsColumns is a list of (name, type) with type one of float64, int64, binary
+    resultsWriter = {}
+    resultsWriter['fileName'] = fileName
+    resultsWriter['format'] = resultsFormat
+    resultsWriter['columns'] = resultsColumns
+    resultsWriter['metadata'] = json.dumps(metadata,default=str)
+    resultsWriter['buffer'] = {thisName: [] for thisName, thisType in resultsColumns}
+    resultsWriter['numBufferedRows'] = 0
+
+    if resultsFormat in ['arrow','parquet']:
+        import pyarrow as pa
+        arrowTypes = {'float64':pa.float64(),'int64':pa.int64(),'binary':pa.binary()}
+        resultsWriter['schema'] = pa.schema([(thisName,arrowTypes[thisType]) for thisName, thisType in resultsColumns],metadata={'benchmark':resultsWriter['metadata']})
+        if resultsFormat == 'arrow':
+            resultsWriter['fp'] = pa.OSFile(fileName,'wb')
+            resultsWriter['writer'] = pa.ipc.new_file(resultsWriter['fp'],resultsWriter['schema'])
+        else:
+            import pyarrow.parquet as pq
+            resultsWriter['fp'] = None
+            resultsWriter['writer'] = pq.ParquetWriter(fileName,resultsWriter['schema'])
+    else:
+        # an .npz file is a zip of .npy arrays, each flush adds one array per column named <column>.<chunk number>
+        resultsWriter['fp'] = None
+        resultsWriter['writer'] = zipfile.ZipFile(fileName,'w',zipfile.ZIP_DEFLATED)
+        resultsWriter['numChunks'] = 0
+
+    return resultsWriter
+
+
+def npzWriteArray(npzFile,arrayName,thisArray):
+    import numpy as np
+    with npzFile.open(arrayName + '.npy','w',force_zip64=True) as fp:
+        np.lib.format.write_array(fp,np.asanyarray(thisArray),allow_pickle=False)
+
+
+def resultsFlush(resultsWriter):
+    if resultsWriter['numBufferedRows'] == 0:
+        return
+
+    if resultsWriter['format'] == 'npz':
+        import numpy as np
+        chunkSuffix = ".{}".format(resultsWriter['numChunks'])
+        for thisName, thisType in resultsWriter['columns']:
+            thisValues = resultsWriter['buffer'][thisName]
+            if thisType == 'binary':
+                # variable length values are stored as one byte array plus offsets
+                npzWriteArray(resultsWriter['writer'],thisName + chunkSuffix,np.frombuffer(b''.join(thisValues),dtype=np.uint8))
+                npzWriteArray(resultsWriter['writer'],thisName + '__offsets' + chunkSuffix,np.cumsum([0] + [len(thisValue) for thisValue in thisValues],dtype=np.int64))
+            else:
+                npzWriteArray(resultsWriter['writer'],thisName + chunkSuffix,np.array(thisValues,dtype=thisType))
+        resultsWriter['numChunks'] += 1
+    else:
+        import pyarrow as pa
+        thisBatch = pa.record_batch([resultsWriter['buffer'][thisName] for thisName, thisType in resultsWriter['columns']],schema=resultsWriter['schema'])
+        if resultsWriter['format'] == 'arrow':
+            resultsWriter['writer'].write_batch(thisBatch)
+        else:
+            resultsWriter['writer'].write_table(pa.Table.from_batches([thisBatch]))
+
+    resultsWriter['buffer'] = {thisName: [] for thisName, thisType in resultsWriter['columns']}
+    resultsWriter['numBufferedRows'] = 0
+
+
+def resultsAppend(resultsWriter,resultsRow):
+    for thisName, thisType in resultsWriter['columns']:
+        resultsWriter['buffer'][thisName].append(resultsRow[thisName])
+    resultsWriter['numBufferedRows'] += 1
+
+    if resultsWriter['numBufferedRows'] >= resultsFlushIntervals:
+        resultsFlush(resultsWriter)
+
+
+def resultsClose(resultsWriter):
+    resultsFlush(resultsWriter)
+    if resultsWriter['format'] == 'npz':
+        npzWriteArray(resultsWriter['writer'],'__metadata__',resultsWriter['metadata'])
+    resultsWriter['writer'].close()
+    if resultsWriter['fp'] is not None:
+        resultsWriter['fp'].close()
+
+
+def loadResults(fileName):
+    # returns (columns, metadata) where columns maps column name to a list of values
+    if fileName.endswith('.npz'):
+        import numpy as np
+        npzFile = np.load(fileName)
+        metadata = json.loads(str(npzFile['__metadata__']))
+        resultsColumns = {}
+        # arrays are named <column>.<chunk number>, concatenate the chunks of each column in order
+        for thisArrayName in sorted(npzFile.files,key=lambda thisArrayName: int(thisArrayName.rpartition('.')[2]) if '.' in thisArrayName else -1):
+            thisName, thisDot, thisChunk = thisArrayName.rpartition('.')
+            if thisName == '' or thisName.endswith('__offsets'):
+                continue
+            if (thisName + '__offsets.' + thisChunk) in npzFile.files:
+                thisBytes = npzFile[thisArrayName].tobytes()
+                thisOffsets = npzFile[thisName + '__offsets.' + thisChunk]
+                thisValues = [thisBytes[thisOffsets[i]:thisOffsets[i+1]] for i in range(len(thisOffsets)-1)]
+            else:
+                thisValues = npzFile[thisArrayName].tolist()
+            resultsColumns.setdefault(thisName,[]).extend(thisValues)
+        return resultsColumns, metadata
+
+    import pyarrow as pa
+    if fileName.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        thisTable = pq.read_table(fileName)
+    else:
+        with pa.memory_map(fileName,'r') as fp:
+            thisTable = pa.ipc.open_file(fp).read_all()
+    metadata = json.loads(thisTable.schema.metadata[b'benchmark'])
+    return thisTable.to_pydict(), metadata
+
+
+def compareResults(fileNames):
+    print("{:40s} | {:>9s} | {:>12s} | {:>10s} | {:>10s} | {:>10s} | {:>10s} | {:>10s}".format("run","intervals","avg tps","p50 ms","p95 ms","p99 ms","p99.9 ms","exceptions"))
+    for fileName in fileNames:
+        resultsColumns, metadata = loadResults(fileName)
+        numIntervals = len(resultsColumns['elapsedSeconds'])
+
+        # merge every interval histogram for whole-run percentiles
+        runHistogram = {}
+        for serializedHistogram in resultsColumns['intervalHistogram']:
+            histogramMerge(runHistogram,serializedHistogram)
+
+        if numIntervals > 0 and resultsColumns['elapsedSeconds'][-1] > 0:
+            avgTps = resultsColumns['operations'][-1] / resultsColumns['elapsedSeconds'][-1]
+            numExceptions = resultsColumns['exceptions'][-1]
+        else:
+            avgTps = 0.0
+            numExceptions = 0
+
+        print("{:40s} | {:9,d} | {:12,.2f} | {}{:10,d}".format(fileName[-40:],numIntervals,avgTps,"".join("{:10,.3f} | ".format(histogramPercentile(runHistogram,thisPercentile)) for thisPercentile in latencyPercentiles),numExceptions))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python {} <results file> [<results file> ...]".format(os.path.basename(sys.argv[0])))
+        sys.exit(1)
+    compareResults(sys.argv[1:])
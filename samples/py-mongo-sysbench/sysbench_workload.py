@@ -0,0 +1,163 @@
+import math
+import random
+import argparse
+
+
+# number of individually weighted ranks in the zipfian alias table, the remaining keys share one tail bucket
+keyTableSize = 100000
+
+
+def positiveInt(thisValue):
+    # argparse type for rates and counts that are divided by, zero or less would fail later with ZeroDivisionError
+    try:
+        thisInt = int(thisValue)
+    except ValueError:
+        raise argparse.ArgumentTypeError("{} is not an integer".format(thisValue))
+    if thisInt <= 0:
+        raise argparse.ArgumentTypeError("{} must be greater than zero".format(thisValue))
+    return thisInt
+
+
+def nextArrivalTime(thisArrivalTime,arrivalIntervalSeconds,arrivalSchedule):
+    # open-loop schedule, operations are due at fixed (uniform) or exponentially distributed (poisson) gaps
+    # regardless of how long earlier operations took
+    if arrivalSchedule == 'poisson':
+        return thisArrivalTime + random.expovariate(1.0 / arrivalIntervalSeconds)
+    return thisArrivalTime + arrivalIntervalSeconds
+
+
+def buildAliasTable(weights):
+    # Vose alias method, after this O(n) setup every draw is one random index and one coin flip
+    numBuckets = len(weights)
+    totalWeight = sum(weights)
+    scaledWeights = [thisWeight * numBuckets / totalWeight for thisWeight in weights]
+    aliasProb = [1.0] * numBuckets
+    aliasIndex = list(range(numBuckets))
+    smallBuckets = [i for i in range(numBuckets) if scaledWeights[i] < 1.0]
+    largeBuckets = [i for i in range(numBuckets) if scaledWeights[i] >= 1.0]
+    while smallBuckets and largeBuckets:
+        thisSmall = smallBuckets.pop()
+        thisLarge = largeBuckets.pop()
+        aliasProb[thisSmall] = scaledWeights[thisSmall]
+        aliasIndex[thisSmall] = thisLarge
+        scaledWeights[thisLarge] -= (1.0 - scaledWeights[thisSmall])
+        if scaledWeights[thisLarge] < 1.0:
+            smallBuckets.append(thisLarge)
+        else:
+            largeBuckets.append(thisLarge)
+    return aliasProb, aliasIndex
+
+
+def buildKeyChooser(keyDistribution,numKeys,appConfig):
+    # keys are 1..numKeys
+    # zipfian = rank r is chosen with probability proportional to 1/r^theta, ranks are scattered across the key space
+    # latest  = zipfian where rank 1 is the highest key, so the most recently loaded documents are the hottest
+    # hotspot = the first hotspotDataFraction of the keys receive hotspotOpFraction of the operations
+    keyChooser = {'distribution':keyDistribution,'numKeys':numKeys}
+
+    if keyDistribution == 'hotspot':
+        keyChooser['numHotKeys'] = min(max(int(numKeys * appConfig['hotspotDataFraction']),1),numKeys)
+        hotOpFraction = appConfig['hotspotOpFraction'] if keyChooser['numHotKeys'] < numKeys else 1.0
+        keyChooser['aliasProb'], keyChooser['aliasIndex'] = buildAliasTable([hotOpFraction,1.0-hotOpFraction])
+
+    elif keyDistribution in ['zipfian','latest']:
+        # the hottest ranks get one alias bucket each, the long tail shares a final bucket that is sampled by
+        # inverting the continuous approximation of its CDF, so memory stays bounded for any number of keys
+        theta = appConfig['zipfianTheta']
+        numRankBuckets = min(numKeys,keyTableSize)
+        weights = [1.0 / (thisRank ** theta) for thisRank in range(1,numRankBuckets+1)]
+        if numRankBuckets < numKeys:
+            tailStart = numRankBuckets + 0.5
+            tailEnd = numKeys + 0.5
+            if theta == 1.0:
+                weights.append(math.log(tailEnd / tailStart))
+            else:
+                weights.append((tailEnd ** (1.0-theta) - tailStart ** (1.0-theta)) / (1.0-theta))
+            keyChooser['tailStart'] = tailStart
+            keyChooser['tailEnd'] = tailEnd
+        keyChooser['theta'] = theta
+        keyChooser['numRankBuckets'] = numRankBuckets
+        keyChooser['aliasProb'], keyChooser['aliasIndex'] = buildAliasTable(weights)
+
+        # multiplier for a bijective scatter of ranks over the keys, must be coprime with numKeys
+        scatterMultiplier = 2654435761 % numKeys if numKeys > 1 else 1
+        while math.gcd(scatterMultiplier,numKeys) != 1:
+            scatterMultiplier += 1
+        keyChooser['scatterMultiplier'] = scatterMultiplier
+
+    return keyChooser
+
+
+def chooseKey(keyChooser):
+    numKeys = keyChooser['numKeys']
+    if keyChooser['distribution'] == 'uniform':
+        return random.randint(1,numKeys)
+
+    aliasProb = keyChooser['aliasProb']
+    thisBucket = random.randrange(len(aliasProb))
+    if random.random() >= aliasProb[thisBucket]:
+        thisBucket = keyChooser['aliasIndex'][thisBucket]
+
+    if keyChooser['distribution'] == 'hotspot':
+        if thisBucket == 0:
+            return random.randint(1,keyChooser['numHotKeys'])
+        return random.randint(keyChooser['numHotKeys']+1,numKeys)
+
+    if thisBucket < keyChooser['numRankBuckets']:
+        thisRank = thisBucket + 1
+    else:
+        thisRank = zipfianTailRank(keyChooser,random.random())
+
+    if keyChooser['distribution'] == 'latest':
+        return numKeys - thisRank + 1
+    return ((thisRank - 1) * keyChooser['scatterMultiplier']) % numKeys + 1
+
+
+def zipfianTailRank(keyChooser,thisRandom):
+    tailStart = keyChooser['tailStart']
+    tailEnd = keyChooser['tailEnd']
+    theta = keyChooser['theta']
+    if theta == 1.0:
+        thisPosition = tailStart * ((tailEnd / tailStart) ** thisRandom)
+    else:
+        thisPosition = (tailStart ** (1.0-theta) + thisRandom * (tailEnd ** (1.0-theta) - tailStart ** (1.0-theta))) ** (1.0/(1.0-theta))
+    return min(max(int(round(thisPosition)),keyChooser['numRankBuckets']+1),keyChooser['numKeys'])
+
+
+def chooseKeysVectorized(keyChooser,rng,numDocuments):
+    # NumPy version of chooseKey() for a whole batch
+    import numpy as np
+    numKeys = keyChooser['numKeys']
+    if keyChooser['distribution'] == 'uniform':
+        return rng.integers(1,numKeys,size=numDocuments,endpoint=True)
+
+    if 'aliasProbArray' not in keyChooser:
+        keyChooser['aliasProbArray'] = np.array(keyChooser['aliasProb'])
+        keyChooser['aliasIndexArray'] = np.array(keyChooser['aliasIndex'],dtype=np.int64)
+    theseBuckets = rng.integers(0,len(keyChooser['aliasProb']),size=numDocuments)
+    useAlias = rng.random(numDocuments) >= keyChooser['aliasProbArray'][theseBuckets]
+    theseBuckets = np.where(useAlias,keyChooser['aliasIndexArray'][theseBuckets],theseBuckets)
+
+    if keyChooser['distribution'] == 'hotspot':
+        numHotKeys = keyChooser['numHotKeys']
+        hotKeys = rng.integers(1,numHotKeys,size=numDocuments,endpoint=True)
+        if numHotKeys >= numKeys:
+            return hotKeys
+        return np.where(theseBuckets == 0,hotKeys,rng.integers(numHotKeys+1,numKeys,size=numDocuments,endpoint=True))
+
+    theseRanks = theseBuckets + 1
+    if 'tailStart' in keyChooser:
+        tailStart = keyChooser['tailStart']
+        tailEnd = keyChooser['tailEnd']
+        theta = keyChooser['theta']
+        thisRandom = rng.random(numDocuments)
+        if theta == 1.0:
+            thesePositions = tailStart * ((tailEnd / tailStart) ** thisRandom)
+        else:
+            thesePositions = (tailStart ** (1.0-theta) + thisRandom * (tailEnd ** (1.0-theta) - tailStart ** (1.0-theta))) ** (1.0/(1.0-theta))
+        tailRanks = np.clip(np.rint(thesePositions).astype(np.int64),keyChooser['numRankBuckets']+1,numKeys)
+        theseRanks = np.where(theseBuckets >= keyChooser['numRankBuckets'],tailRanks,theseRanks)
+
+    if keyChooser['distribution'] == 'latest':
+        return numKeys - theseRanks + 1
+    return ((theseRanks - 1) * keyChooser['scatterMultiplier']) % numKeys + 1
@@ -11,6 +11,19 @@ import argparse
 import string
 import math
 import warnings
+# the results, latency histogram, arrival schedule and key distribution code is shared with py-mongo-sysbench,
+# which must be checked out next to this folder
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','py-mongo-sysbench'))
+from sysbench_workload import positiveInt, nextArrivalTime, buildKeyChooser, chooseKey, chooseKeysVectorized
+from sysbench_results import histogramRecord, histogramSerialize, histogramMerge, histogramMergeInto, histogramPercentile, latencyPercentiles, resultsAvailableFormat, resultsOpen, resultsAppend, resultsClose
+
+
+# operation types for --workload, and the name used for their CSV and results columns
+workloadOpTypes = ['insert','point-read','range-scan','group','update']
+workloadOpColumns = {'insert':'insert','point-read':'pointRead','range-scan':'rangeScan','group':'group','update':'update'}
+
+# number of existing _id values each process keeps for point reads and updates
+maxKnownIds = 100000
 
 
 def deleteLog(appConfig):
@@ -34,6 +47,63 @@ def printCsv(thisMessage,appConfig):
         fp.write("{}\n".format(thisMessage))
 
 
+def parseWorkload(workloadString):
+    # "insert=50,point-read=30,update=20" -> {'insert':50,'point-read':30,'update':20}
+    workloadWeights = {}
+    for thisEntry in workloadString.split(','):
+        thisOpType, sep, thisWeight = thisEntry.strip().partition('=')
+        if thisOpType not in workloadOpTypes:
+            raise ValueError("unknown operation type {}, must be one of {}".format(thisOpType,",".join(workloadOpTypes)))
+        if not sep:
+            raise ValueError("missing weight for operation type {}".format(thisOpType))
+        try:
+            workloadWeights[thisOpType] = float(thisWeight)
+        except ValueError:
+            raise ValueError("weight for operation type {} must be a number".format(thisOpType))
+        if workloadWeights[thisOpType] < 0:
+            raise ValueError("weight for operation type {} cannot be negative".format(thisOpType))
+    workloadWeights = {thisOpType: thisWeight for thisOpType, thisWeight in workloadWeights.items() if thisWeight > 0}
+    if len(workloadWeights) == 0:
+        raise ValueError("at least one operation type needs a weight above 0")
+    return workloadWeights
+
+
+def rememberId(knownIds,thisId):
+    # bounded pool of _id values, once full a random slot is replaced so recent inserts keep being read
+    if len(knownIds) < maxKnownIds:
+        knownIds.append(thisId)
+    else:
+        knownIds[random.randrange(maxKnownIds)] = thisId
+
+
+def runWorkloadOp(col,opType,knownIds,customerChooser,appConfig):
+    # a single non-insert operation against the indexes created by setup()
+    if opType == 'point-read':
+        col.find_one({'_id':random.choice(knownIds)})
+    elif opType == 'update':
+        col.update_one({'_id':random.choice(knownIds)},{'$set':{'quantity':random.randint(1,appConfig['maxQuantity'])}})
+    elif opType == 'range-scan':
+        # orderDate is stored as (insert time - secondsDateRange), scan forward from a random point in the range
+        thisCustomerId = chooseKey(customerChooser)
+        rangeStart = dt.datetime.now(dt.timezone.utc)-dt.timedelta(seconds=appConfig['secondsDateRange']+random.randint(0,appConfig['secondsDateRange']))
+        list(col.find({'customerId':thisCustomerId,'orderDate':{'$gte':rangeStart}}).sort('orderDate',pymongo.ASCENDING).limit(appConfig['scanLimit']))
+    elif opType == 'group':
+        thisCustomerId = chooseKey(customerChooser)
+        list(col.aggregate([{'$match':{'customerId':thisCustomerId}},{'$group':{'_id':'$customerId','numOrders':{'$sum':1},'totalQuantity':{'$sum':'$quantity'}}}]))
+
+
+def generateBatchVectorized(rng,numDocuments,customerChooser,productChooser,maxQuantity,numSecondsDateRange,randomString,randomTextBufferMaxStart,randomChars,fixedString):
+    # one NumPy draw per field for the whole batch and one clock read, rather than 4 random calls and a clock read per document
+    # .tolist() converts to Python ints so the documents encode exactly as the per-document generator
+    customerIds = chooseKeysVectorized(customerChooser,rng,numDocuments).tolist()
+    productIds = chooseKeysVectorized(productChooser,rng,numDocuments).tolist()
+    quantities = rng.integers(1,maxQuantity,size=numDocuments,endpoint=True).tolist()
+    textStarts = rng.integers(0,randomTextBufferMaxStart,size=numDocuments).tolist()
+    orderDate = dt.datetime.now(dt.timezone.utc)-dt.timedelta(seconds=numSecondsDateRange)
+
+    return [{"customerId":customerIds[i],"productId":productIds[i],"quantity":quantities[i],"orderDate":orderDate,"textField":randomString[textStarts[i]:textStarts[i]+randomChars]+fixedString} for i in range(numDocuments)]
+
+
 def reportCollectionInfo(appConfig):
     client = pymongo.MongoClient(appConfig['uri'])
     db = client[appConfig['databaseName']]
@@ -162,11 +232,15 @@ def reporter(perfQ,appConfig):
     numExistingDocuments = appConfig['numExistingDocuments']
     numOperations = appConfig['numOperations']
     runSeconds = appConfig['runSeconds']
+    workloadWeights = appConfig['workloadWeights']
+    mixedWorkload = (list(workloadWeights) != ['insert'])
 
     startTime = time.time()
     lastTime = time.time()
     numTotalInserts = 0
     lastNumTotalInserts = 0
+    numTotalOps = 0
+    runOpHistograms = {thisOpType: {} for thisOpType in workloadWeights}
     nextReportTime = startTime + numSecondsFeedback
     intervalLatencyMs = 0
     
@@ -175,7 +249,20 @@ def reporter(perfQ,appConfig):
     recentLatency = []
     
     csvHeader = "timestamp,elapsed-time,elapsed-seconds,inserts,overall-ips,total-documents,this-interval-ips,this-interval-latency-ms,last-{}-intervals-ips,last-{}-intervals-latency-ms".format(numIntervalsTps,numIntervalsTps)
+    if mixedWorkload:
+        for thisOpType in workloadWeights:
+            csvHeader += ",{0}-ops-per-second,{0}-latency-ms,{0}-p99-ms".format(thisOpType)
     printCsv(csvHeader,appConfig)
+
+    resultsWriter = None
+    if appConfig['resultsFormat'] != 'none':
+        resultsColumns = [('timestamp','float64'),('elapsedSeconds','float64'),('operations','int64'),('intervalOperations','int64'),('intervalTps','float64'),('intervalLatencyMs','float64'),('exceptions','int64'),('intervalHistogram','binary')]
+        resultsColumns += [("intervalP{:g}Ms".format(thisPercentile).replace('.','_'),'float64') for thisPercentile in latencyPercentiles]
+        if mixedWorkload:
+            for thisOpType in workloadWeights:
+                resultsColumns += [(workloadOpColumns[thisOpType]+'Ops','int64'),(workloadOpColumns[thisOpType]+'LatencyMs','float64'),(workloadOpColumns[thisOpType]+'Histogram','binary')]
+        resultsMetadata = {thisKey: appConfig[thisKey] for thisKey in appConfig if thisKey != 'uri'}
+        resultsWriter = resultsOpen(appConfig['resultsFileName'],appConfig['resultsFormat'],resultsColumns,resultsMetadata)
     
     while (numThreadsCompleted < numInsertProcesses):
         time.sleep(numSecondsFeedback)
@@ -183,6 +270,10 @@ def reporter(perfQ,appConfig):
         
         numLatencyBatches = 0
         numLatencyMs = 0.0
+        intervalHistogram = {}
+        intervalOpCounts = {thisOpType: 0 for thisOpType in workloadWeights}
+        intervalOpLatencyMs = {thisOpType: 0.0 for thisOpType in workloadWeights}
+        intervalOpHistograms = {thisOpType: {} for thisOpType in workloadWeights}
         
         while not perfQ.empty():
             qMessage = perfQ.get_nowait()
@@ -190,6 +281,12 @@ def reporter(perfQ,appConfig):
                 numLatencyBatches += qMessage['batches']
                 numLatencyMs += qMessage['latency']
                 numTotalInserts += qMessage['inserts']
+                numTotalOps += qMessage['operations']
+                histogramMerge(intervalHistogram,qMessage['histogram'])
+                for thisOpType in qMessage['opCounts']:
+                    intervalOpCounts[thisOpType] += qMessage['opCounts'][thisOpType]
+                    intervalOpLatencyMs[thisOpType] += qMessage['opLatencyMs'][thisOpType]
+                    histogramMerge(intervalOpHistograms[thisOpType],qMessage['opHistograms'][thisOpType])
             elif qMessage['name'] == "processCompleted":
                 numThreadsCompleted += 1
 
@@ -231,7 +328,7 @@ def reporter(perfQ,appConfig):
 
         # estimated time to done
         if numOperations > 0:
-            pctDone = max(numTotalInserts / numOperations,0.001)
+            pctDone = max(numTotalOps / numOperations,0.001)
             remainingSeconds = max(int(elapsedSeconds / pctDone) - elapsedSeconds,0)
         else:
             remainingSeconds = max(runSeconds - elapsedSeconds,0)
@@ -242,12 +339,42 @@ def reporter(perfQ,appConfig):
         logTimeStamp = dt.datetime.now(dt.timezone.utc).isoformat()[:-3] + 'Z'
         printLog("[{}] elapsed {} | total ins {:16,d} at {:12,.2f} p/s | tot docs {:16,d} | interval {:12,.2f} p/s @ {:8,.2f} ms | last {} is {:12,.2f} p/s @ {:8,.2f} ms  | done in {}".format(logTimeStamp,thisHMS,numTotalInserts,insertsPerSecond,numTotalInserts+numExistingDocuments,intervalInsertsPerSecond,intervalLatencyMs,numIntervalsTps,avgRecentTps,avgRecentLatency,remainHMS),appConfig)
         csvData = "{},{},{:.2f},{},{:.2f},{},{:.2f},{:.2f},{:.2f},{:.2f}".format(logTimeStamp,thisHMS,elapsedSeconds,numTotalInserts,insertsPerSecond,numTotalInserts+numExistingDocuments,intervalInsertsPerSecond,intervalLatencyMs,avgRecentTps,avgRecentLatency)
+
+        if mixedWorkload:
+            # per operation type, an insert operation is one batch of --batch-size documents
+            for thisOpType in workloadWeights:
+                histogramMergeInto(runOpHistograms[thisOpType],intervalOpHistograms[thisOpType])
+                thisOpsPerSecond = intervalOpCounts[thisOpType] / intervalElapsedSeconds
+                thisOpLatencyMs = intervalOpLatencyMs[thisOpType] / max(intervalOpCounts[thisOpType],1)
+                thisOpP99Ms = histogramPercentile(intervalOpHistograms[thisOpType],99.0)
+                printLog("    {:10s} | interval {:12,.2f} ops/s @ {:8,.2f} ms | p99 {:8,.2f} ms".format(thisOpType,thisOpsPerSecond,thisOpLatencyMs,thisOpP99Ms),appConfig)
+                csvData += ",{:.2f},{:.2f},{:.3f}".format(thisOpsPerSecond,thisOpLatencyMs,thisOpP99Ms)
+
         printCsv(csvData,appConfig)
+
+        if resultsWriter is not None:
+            resultsRow = {'timestamp':nowTime,'elapsedSeconds':elapsedSeconds,'operations':numTotalInserts,'intervalOperations':intervalInserts,'intervalTps':intervalInsertsPerSecond,'intervalLatencyMs':intervalLatencyMs,'exceptions':0,'intervalHistogram':histogramSerialize(intervalHistogram)}
+            for thisPercentile in latencyPercentiles:
+                resultsRow["intervalP{:g}Ms".format(thisPercentile).replace('.','_')] = histogramPercentile(intervalHistogram,thisPercentile)
+            if mixedWorkload:
+                for thisOpType in workloadWeights:
+                    resultsRow[workloadOpColumns[thisOpType]+'Ops'] = intervalOpCounts[thisOpType]
+                    resultsRow[workloadOpColumns[thisOpType]+'LatencyMs'] = intervalOpLatencyMs[thisOpType] / max(intervalOpCounts[thisOpType],1)
+                    resultsRow[workloadOpColumns[thisOpType]+'Histogram'] = histogramSerialize(intervalOpHistograms[thisOpType])
+            resultsAppend(resultsWriter,resultsRow)
+
         nextReportTime = nowTime + numSecondsFeedback
         
         lastTime = nowTime
         lastNumTotalInserts = numTotalInserts
 
+    if resultsWriter is not None:
+        resultsClose(resultsWriter)
+
+    if mixedWorkload:
+        for thisOpType in workloadWeights:
+            printLog("whole run {:10s} | {:12,d} ops | p50 {:8,.2f} ms | p95 {:8,.2f} ms | p99 {:8,.2f} ms | p99.9 {:8,.2f} ms".format(thisOpType,sum(runOpHistograms[thisOpType].values()),*[histogramPercentile(runOpHistograms[thisOpType],thisPercentile) for thisPercentile in latencyPercentiles]),appConfig)
+
 
 def task_worker(threadNum,perfQ,appConfig):
     warnings.filterwarnings("ignore","You appear to be connected to a DocumentDB cluster.")
@@ -262,10 +389,23 @@ def task_worker(threadNum,perfQ,appConfig):
     orderedBatches = appConfig['orderedBatches']
     numCustomers = appConfig['numCustomers']
     numProducts = appConfig['numProducts']
+    customerChooser = buildKeyChooser(appConfig['keyDistribution'],numCustomers,appConfig)
+    productChooser = buildKeyChooser(appConfig['keyDistribution'],numProducts,appConfig)
     maxQuantity = appConfig['maxQuantity']
     numSecondsDateRange = appConfig['secondsDateRange']
     numOperations = appConfig['numOperations']
     numOperationsThisWorker = math.ceil(numOperations/numInsertProcesses)
+    arrivalSchedule = appConfig['arrivalSchedule']
+    openLoop = (arrivalSchedule != 'closed')
+    vectorizedGeneration = appConfig['vectorizedGeneration']
+    workloadWeights = appConfig['workloadWeights']
+    workloadTypes = list(workloadWeights)
+    workloadTypeWeights = list(workloadWeights.values())
+    trackIds = ('point-read' in workloadWeights) or ('update' in workloadWeights)
+
+    if vectorizedGeneration:
+        import numpy as np
+        rng = np.random.default_rng()
 
     perfReportInterval = 1
 
@@ -279,6 +419,12 @@ def task_worker(threadNum,perfQ,appConfig):
     myCollectionName = appConfig['collectionName']
     col = db[myCollectionName]
 
+    # point reads and updates pick from existing _id values, sampled at startup and extended as documents are inserted
+    knownIds = []
+    if trackIds and numExistingDocuments > 0:
+        for thisDoc in col.aggregate([{'$sample':{'size':min(numExistingDocuments,maxKnownIds)}},{'$project':{'_id':1}}]):
+            knownIds.append(thisDoc['_id'])
+
     start = dt.datetime(1980, 1, 1, 1, 1, 1)
     end = dt.datetime(2023, 9, 7, 1, 1, 1)
     
@@ -300,13 +446,25 @@ def task_worker(threadNum,perfQ,appConfig):
     thisWorkerOps = 0
     thisIntervalOps = 0
     thisBatchInserts = 0
+    thisBatchOps = 0
     batchElapsedMs = 0.0
+    intervalHistogram = {}
+    opCounts = {thisOpType: 0 for thisOpType in workloadTypes}
+    opLatencyMs = {thisOpType: 0.0 for thisOpType in workloadTypes}
+    opHistograms = {thisOpType: {} for thisOpType in workloadTypes}
+
+    # open-loop operations are scheduled at rate-limit / processes per second, an insert batch counts as --batch-size operations
+    arrivalIntervalSeconds = 1 / (rateLimit / numInsertProcesses)
+    intendedStartTime = startTime
     
     allDone = False
 
     while not allDone:
+        if openLoop:
+            # the batch is built first and then waits for its scheduled start, see below
+            pass
         # check if we need to slow down
-        if time.time() > nextReportTime:
+        elif time.time() > nextReportTime:
             # we are running slower than the rate limiter
             nextReportTime = time.time() + intervalSeconds
             thisIntervalOps = 0
@@ -318,37 +476,80 @@ def task_worker(threadNum,perfQ,appConfig):
             nextReportTime = time.time() + intervalSeconds
             thisIntervalOps = 0
 
-        insList = []
-        
-        for batchLoop in range(numInsertsPerBatch):
-            thisInsert = {}
-            
-            thisTimestamp = dt.datetime.now(dt.timezone.utc)
-            thisInsert["customerId"] = random.randint(1,numCustomers)
-            thisInsert["productId"] = random.randint(1,numProducts)
-            thisInsert["quantity"] = random.randint(1,maxQuantity)
-            thisInsert["orderDate"] = thisTimestamp-dt.timedelta(seconds=numSecondsDateRange)
-
-            randomStringStart = random.randint(1,randomTextBufferMaxStart)-1
-            thisInsert["textField"] = randomString[randomStringStart:randomStringStart+randomChars]+fixedString
-            
-            insList.append(pymongo.InsertOne(thisInsert))
-            
-            thisBatchInserts += 1
-            thisIntervalOps += 1
-            thisWorkerOps += 1
+        thisOpType = random.choices(workloadTypes,weights=workloadTypeWeights)[0]
+        if thisOpType in ['point-read','update'] and len(knownIds) == 0:
+            # nothing to read yet, only possible when the workload also inserts into an empty collection
+            thisOpType = 'insert'
+
+        if thisOpType != 'insert':
+            thisOpCount = 1
+        elif vectorizedGeneration:
+            insDocs = generateBatchVectorized(rng,numInsertsPerBatch,customerChooser,productChooser,maxQuantity,numSecondsDateRange,randomString,randomTextBufferMaxStart,randomChars,fixedString)
+            thisOpCount = numInsertsPerBatch
+        else:
+            insDocs = []
+
+            for batchLoop in range(numInsertsPerBatch):
+                thisInsert = {}
+
+                thisTimestamp = dt.datetime.now(dt.timezone.utc)
+                thisInsert["customerId"] = chooseKey(customerChooser)
+                thisInsert["productId"] = chooseKey(productChooser)
+                thisInsert["quantity"] = random.randint(1,maxQuantity)
+                thisInsert["orderDate"] = thisTimestamp-dt.timedelta(seconds=numSecondsDateRange)
+
+                randomStringStart = random.randint(1,randomTextBufferMaxStart)-1
+                thisInsert["textField"] = randomString[randomStringStart:randomStringStart+randomChars]+fixedString
+
+                insDocs.append(thisInsert)
+
+            thisOpCount = numInsertsPerBatch
+
+        if thisOpType == 'insert':
+            insList = [pymongo.InsertOne(thisInsert) for thisInsert in insDocs]
+            thisBatchInserts += thisOpCount
+
+        thisBatchOps += thisOpCount
+        thisIntervalOps += thisOpCount
+        thisWorkerOps += thisOpCount
         
         batchStartTime = time.time()
-        result = col.bulk_write(insList, ordered=orderedBatches)
-        batchElapsedMs += (time.time() - batchStartTime) * 1000
+        if openLoop:
+            # wait for the scheduled start, if we are behind schedule the lag is included in the latency
+            sleepTimeSeconds = intendedStartTime - time.time()
+            if sleepTimeSeconds > 0:
+                time.sleep(sleepTimeSeconds)
+            # measure from the intended start to avoid coordinated omission
+            batchStartTime = intendedStartTime
+            intendedStartTime = nextArrivalTime(intendedStartTime,arrivalIntervalSeconds*thisOpCount,arrivalSchedule)
+        if thisOpType == 'insert':
+            result = col.bulk_write(insList, ordered=orderedBatches)
+            if trackIds:
+                # the driver adds the generated _id to each inserted document
+                for thisInsert in insDocs:
+                    rememberId(knownIds,thisInsert['_id'])
+        else:
+            runWorkloadOp(col,thisOpType,knownIds,customerChooser,appConfig)
+        thisBatchMs = (time.time() - batchStartTime) * 1000
+        batchElapsedMs += thisBatchMs
+        histogramRecord(intervalHistogram,thisBatchMs)
+        opCounts[thisOpType] += 1
+        opLatencyMs[thisOpType] += thisBatchMs
+        histogramRecord(opHistograms[thisOpType],thisBatchMs)
         numBatchesCompleted += 1
         
         if time.time() > nextPerfReportTime:
             nextPerfReportTime = time.time() + perfReportInterval
-            perfQ.put({"name":"batchCompleted","batches":numBatchesCompleted,"latency":batchElapsedMs,"inserts":thisBatchInserts})
+            perfQ.put({"name":"batchCompleted","batches":numBatchesCompleted,"latency":batchElapsedMs,"inserts":thisBatchInserts,"operations":thisBatchOps,"histogram":histogramSerialize(intervalHistogram),
+                       "opCounts":opCounts,"opLatencyMs":opLatencyMs,"opHistograms":{thisOpType: histogramSerialize(opHistograms[thisOpType]) for thisOpType in workloadTypes}})
             numBatchesCompleted = 0
             batchElapsedMs = 0.0
             thisBatchInserts = 0
+            thisBatchOps = 0
+            intervalHistogram = {}
+            opCounts = {thisOpType: 0 for thisOpType in workloadTypes}
+            opLatencyMs = {thisOpType: 0.0 for thisOpType in workloadTypes}
+            opHistograms = {thisOpType: {} for thisOpType in workloadTypes}
             
         if ((time.time() - startTime) >= runSeconds) and (runSeconds > 0):
             allDone = True
@@ -373,7 +574,7 @@ def main():
     parser.add_argument('--run-seconds',required=False,type=int,default=0,help='Total number of seconds to run for')
     parser.add_argument('--num-operations',required=False,type=int,default=0,help='Total number of operations to run for')
     parser.add_argument('--batch-size',required=True,type=int,help='Number of documents to insert per batch')
-    parser.add_argument('--rate-limit',required=False,type=int,default=9999999,help='Limit throughput (operations per second)')
+    parser.add_argument('--rate-limit',required=False,type=positiveInt,default=9999999,help='Limit throughput (operations per second)')
     parser.add_argument('--text-size',required=False,type=int,default=1024,help='Size of text field (bytes)')
     parser.add_argument('--text-compressible',required=False,type=int,default=25,help='Compressibility of text field (percentage)')
     parser.add_argument('--ordered-batches',required=False,action='store_true',help='Use ordered bulk-writes')
@@ -388,6 +589,15 @@ def main():
     parser.add_argument('--file-name',required=False,type=str,default='benchmark',help='Starting name of the created CSV and log files')
     parser.add_argument('--change-stream',required=False,action='store_true',help='Enable change streams')
     parser.add_argument('--num-intervals-average',required=False,type=int,default=10,help='Number of intervals for averaging')
+    parser.add_argument('--results-format',required=False,type=str,default='none',choices=['none','arrow','parquet','npz'],help='Also write per-interval metrics and histograms to a columnar results file (arrow and parquet need pyarrow, npz needs numpy)')
+    parser.add_argument('--workload',required=False,type=str,default='insert=100',help='Weighted operation mix, for example insert=50,point-read=20,range-scan=10,group=5,update=15 (types are {})'.format(','.join(workloadOpTypes)))
+    parser.add_argument('--scan-limit',required=False,type=int,default=100,help='Maximum documents returned by each range-scan operation')
+    parser.add_argument('--key-distribution',required=False,type=str,default='uniform',choices=['uniform','zipfian','latest','hotspot'],help='Distribution of the customerId and productId values')
+    parser.add_argument('--zipfian-theta',required=False,type=float,default=0.99,help='Skew for --key-distribution zipfian and latest, higher is more skewed')
+    parser.add_argument('--hotspot-data-fraction',required=False,type=float,default=0.2,help='Fraction of the ids in the hot set for --key-distribution hotspot')
+    parser.add_argument('--hotspot-op-fraction',required=False,type=float,default=0.8,help='Fraction of the documents and operations using the hot set for --key-distribution hotspot')
+    parser.add_argument('--vectorized-generation',required=False,action='store_true',help='Generate each batch of documents with NumPy rather than per-document random calls (needs numpy)')
+    parser.add_argument('--arrival-schedule',required=False,type=str,default='closed',choices=['closed','uniform','poisson'],help='closed = rate limit by sleeping when ahead, uniform/poisson = open-loop arrivals at --rate-limit with latency measured from the scheduled start')
 
     args = parser.parse_args()
     
@@ -427,6 +637,21 @@ def main():
     appConfig['csvFileName'] = "{}.csv".format(args.file_name)
     appConfig['changeStream'] = args.change_stream
     appConfig['numIntervalsAverage'] = int(args.num_intervals_average)
+    appConfig['arrivalSchedule'] = args.arrival_schedule
+    appConfig['resultsFormat'] = args.results_format
+    appConfig['vectorizedGeneration'] = args.vectorized_generation
+    appConfig['workload'] = args.workload
+    appConfig['scanLimit'] = int(args.scan_limit)
+    appConfig['keyDistribution'] = args.key_distribution
+    appConfig['zipfianTheta'] = float(args.zipfian_theta)
+    appConfig['hotspotDataFraction'] = float(args.hotspot_data_fraction)
+    appConfig['hotspotOpFraction'] = float(args.hotspot_op_fraction)
+
+    try:
+        appConfig['workloadWeights'] = parseWorkload(args.workload)
+    except ValueError as e:
+        printLog("Invalid --workload {}: {}".format(args.workload,e),appConfig)
+        sys.exit(1)
 
     if (appConfig['runSeconds'] == 0 and appConfig['numOperations'] == 0):
         printLog("Must supply non-zero for one of --run-seconds or --num-operations",appConfig)
@@ -435,6 +660,35 @@ def main():
     if (appConfig['runSeconds'] > 0 and appConfig['numOperations'] > 0):
         printLog("Cannot supply non-zero for both --run-seconds and --num-operations",appConfig)
         sys.exit(1)
+
+    if (appConfig['resultsFormat'] != 'none'):
+        resultsFormat = resultsAvailableFormat(appConfig['resultsFormat'])
+        if resultsFormat is None:
+            printLog("--results-format {} requires pyarrow or numpy".format(appConfig['resultsFormat']),appConfig)
+            sys.exit(1)
+        if resultsFormat != appConfig['resultsFormat']:
+            printLog("pyarrow is not installed, writing --results-format npz instead of {}".format(appConfig['resultsFormat']),appConfig)
+        appConfig['resultsFormat'] = resultsFormat
+        appConfig['resultsFileName'] = "{}.{}".format(args.file_name,resultsFormat)
+
+    if (appConfig['zipfianTheta'] <= 0.0):
+        printLog("--zipfian-theta must be greater than 0",appConfig)
+        sys.exit(1)
+
+    if (not 0.0 < appConfig['hotspotDataFraction'] < 1.0 or not 0.0 <= appConfig['hotspotOpFraction'] <= 1.0):
+        printLog("--hotspot-data-fraction must be between 0 and 1 (exclusive) and --hotspot-op-fraction between 0 and 1",appConfig)
+        sys.exit(1)
+
+    if appConfig['vectorizedGeneration']:
+        try:
+            import numpy
+        except ImportError:
+            printLog("--vectorized-generation requires numpy, install it with: pip install numpy",appConfig)
+            sys.exit(1)
+
+    if (appConfig['arrivalSchedule'] != 'closed' and args.rate_limit == parser.get_default('rate_limit')):
+        printLog("--arrival-schedule {} requires --rate-limit".format(appConfig['arrivalSchedule']),appConfig)
+        sys.exit(1)
     
     numExistingDocuments = 0
 
@@ -442,6 +696,11 @@ def main():
     numExistingDocuments = setup(appConfig)
     
     appConfig['numExistingDocuments'] = numExistingDocuments
+
+    if (numExistingDocuments == 0 and 'insert' not in appConfig['workloadWeights'] and
+            ('point-read' in appConfig['workloadWeights'] or 'update' in appConfig['workloadWeights'])):
+        printLog("--workload point-read and update operations need existing documents, load the collection first or add insert to the workload",appConfig)
+        sys.exit(1)
     
     deleteLog(appConfig)
     deleteCsv(appConfig)
@@ -487,6 +746,8 @@ def main():
     cleanup(appConfig)
     
     printLog("Created {} and {} with results".format(appConfig['logFileName'],appConfig['csvFileName']),appConfig)
+    if appConfig['resultsFormat'] != 'none':
+        printLog("Created {} with per-interval metrics and histograms, compare runs with: python ../py-mongo-sysbench/sysbench_results.py {}".format(appConfig['resultsFileName'],appConfig['resultsFileName']),appConfig)
 
 
 if __name__ == "__main__":
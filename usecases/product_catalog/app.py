@@ -1,11 +1,19 @@
+import io
 import os
 import sys
+import csv
+import json
+import time
 import logging
+import threading
 
 import pymongo
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, DuplicateKeyError, ServerSelectionTimeoutError
-from flask import Flask, render_template, request, jsonify
+from bson import ObjectId
+from pymongo import DeleteMany, InsertOne, MongoClient, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, ServerSelectionTimeoutError
+from flask import Flask, Response, request, jsonify, stream_template, stream_with_context, url_for
+
+from response_cache import create_cache, make_key
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,6 +23,42 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# Products per page on the web interface
+INDEX_PAGE_SIZE = int(os.environ.get("INDEX_PAGE_SIZE", 50))
+# Seconds before the cached category list is re-read from the category index
+CATEGORY_CACHE_TTL_SECONDS = float(os.environ.get("CATEGORY_CACHE_TTL_SECONDS", 300))
+# Milliseconds to collect concurrent stock changes on a SKU before applying them as one update, 0 to disable
+STOCK_COALESCE_MS = float(os.environ.get("STOCK_COALESCE_MS", 0))
+# Most SKUs accepted by one batch stock update
+STOCK_BATCH_MAX = int(os.environ.get("STOCK_BATCH_MAX", 1000))
+# Ids of the most recent batch stock changes kept on each product, see apply_stock_changes
+STOCK_OPS_KEPT = int(os.environ.get("STOCK_OPS_KEPT", 16))
+# Seconds between rebuilds of category_stats from the products collection, 0 to disable
+CATEGORY_STATS_RECONCILE_SECONDS = float(os.environ.get("CATEGORY_STATS_RECONCILE_SECONDS", 3600))
+# Products written per bulk write during an import
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", 500))
+# Most row errors listed in an import response, the rest are only counted
+IMPORT_MAX_REPORTED_ERRORS = int(os.environ.get("IMPORT_MAX_REPORTED_ERRORS", 1000))
+# Products read per cursor batch during an export
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+# Where GET /api/products responses are cached: memory, redis or none
+RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 1000))
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", 60))
+RESPONSE_CACHE_REDIS_URL = os.environ.get("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+# Invalidate the response cache from a change stream, for writes made by other processes
+RESPONSE_CACHE_CHANGE_STREAM = os.environ.get("RESPONSE_CACHE_CHANGE_STREAM", "false").lower() == "true"
+
+# Products with this many items or fewer count as low stock
+LOW_STOCK_THRESHOLD = 10
+
+# Columns of CSV imports and exports, description holds the custom fields as JSON
+CSV_FIELDS = ["sku", "name", "category", "price", "stock", "description"]
+
+response_cache = create_cache(
+    RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_REDIS_URL
+)
+
 
 def _sanitize_error(e: Exception) -> str:
     """Return a generic message for unexpected errors to avoid leaking internals."""
@@ -72,7 +116,6 @@ def get_client():
             except (ConnectionFailure, ServerSelectionTimeoutError) as e:
                 if attempt < max_retries - 1:
                     logger.warning(f"Connection attempt {attempt + 1} failed, retrying in {retry_delay}s...")
-                    import time
                     time.sleep(retry_delay)
                     retry_delay *= 2
                 else:
@@ -91,28 +134,233 @@ def get_collection():
         logger.error("Failed to connect to DocumentDB: %s", e)
         raise
 
+def get_stats_collection():
+    """Get category_stats collection."""
+    try:
+        client = get_client()
+        db = client["product_catalog"]
+        return db["category_stats"]
+    except (ConnectionFailure, ServerSelectionTimeoutError) as e:
+        logger.error("Failed to connect to DocumentDB: %s", e)
+        raise
+
 def ensure_indexes(collection: pymongo.collection.Collection) -> None:
     """Create indexes for product catalog queries."""
     collection.create_index("sku", unique=True, name="idx_sku_unique")
-    collection.create_index("category", name="idx_category")
+    collection.create_index([("category", 1), ("sku", 1)], name="idx_category_sku")
     collection.create_index("name", name="idx_name")
     collection.create_index([("name", "text")], name="idx_text_search")
     logger.info("Indexes ensured on collection '%s'.", collection.name)
 
+# category_stats holds one document per category, {_id: category, count,
+# total_value, low_stock_count}, kept up to date with $inc deltas on every
+# product write and rebuilt periodically by reconcile_category_stats.
+STATS_PROJECTION = {"_id": 0, "category": 1, "price": 1, "stock": 1}
+# Products as shown and exported, without the bookkeeping of batch stock changes
+PRODUCT_PROJECTION = {"_id": 0, "stock_ops": 0}
+
+def category_stats_deltas(before: dict, after: dict, deltas: dict = None) -> dict:
+    """Add the category_stats deltas of a product changing from before to after to deltas.
+
+    before is None for a new product and after is None for a deleted one.
+    """
+    if deltas is None:
+        deltas = {}
+    for product, sign in ((before, -1), (after, 1)):
+        if product is None:
+            continue
+        delta = deltas.setdefault(product["category"], {"count": 0, "total_value": 0.0, "low_stock_count": 0})
+        delta["count"] += sign
+        delta["total_value"] += sign * product["price"] * product["stock"]
+        delta["low_stock_count"] += sign * (product["stock"] <= LOW_STOCK_THRESHOLD)
+    return deltas
+
+def update_category_stats(deltas: dict) -> None:
+    """Apply category_stats deltas in one bulk write."""
+    operations = [
+        UpdateOne({"_id": category}, {"$inc": delta}, upsert=True)
+        for category, delta in deltas.items() if any(delta.values())
+    ]
+    if not operations:
+        return
+    try:
+        get_stats_collection().bulk_write(operations, ordered=False)
+    except Exception as e:
+        # The product write already succeeded and the next reconciliation fixes the stats
+        logger.error("Error updating category stats: %s", e)
+
+def reconcile_category_stats(collection: pymongo.collection.Collection) -> int:
+    """Rebuild category_stats from the products collection, returning the number of categories."""
+    pipeline = [
+        {
+            "$group": {
+                "_id": "$category",
+                "count": {"$sum": 1},
+                "total_value": {"$sum": {"$multiply": ["$price", "$stock"]}},
+                "low_stock_count": {
+                    "$sum": {"$cond": [{"$lte": ["$stock", LOW_STOCK_THRESHOLD]}, 1, 0]}
+                }
+            }
+        }
+    ]
+    results = list(collection.aggregate(pipeline))
+
+    operations = [ReplaceOne({"_id": result["_id"]}, result, upsert=True) for result in results]
+    operations.append(DeleteMany({"_id": {"$nin": [result["_id"] for result in results]}}))
+    get_stats_collection().bulk_write(operations, ordered=False)
+    return len(results)
+
+def start_stats_reconciler(collection: pymongo.collection.Collection, interval: float) -> None:
+    """Rebuild category_stats every interval seconds on a background thread."""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                num_categories = reconcile_category_stats(collection)
+                logger.info("Reconciled category stats for %d categories", num_categories)
+            except Exception as e:
+                logger.error("Error reconciling category stats: %s", e)
+
+    threading.Thread(target=run, name="category-stats-reconciler", daemon=True).start()
+
+# Cached product lists carry a "sku:<sku>" tag for every product they read and
+# a "category:<category>" tag for their category filter, or "category:*"
+# without one. Pages are keyset paginated, so a change to a product's stock,
+# price or description only affects the pages listing it, while a new name
+# or category can also add it to pages of its category.
+def invalidate_products(skus=(), categories=()) -> None:
+    """Drop cached product lists that contain the SKUs, or that the categories can gain a product on."""
+    tags = ["sku:" + str(sku) for sku in skus]
+    if categories:
+        tags += ["category:" + str(category) for category in categories] + ["category:*"]
+    if tags:
+        response_cache.invalidate(tags)
+
+def invalidate_change(change: dict) -> None:
+    """Invalidate the response cache for one change stream event."""
+    product = change.get("fullDocument")
+    operation = change["operationType"]
+
+    if operation == "update" and product is not None:
+        fields = change.get("updateDescription", {}).get("updatedFields", {})
+        removed = change.get("updateDescription", {}).get("removedFields", [])
+        if all(field.split(".")[0] in ("stock", "price", "description") for field in list(fields) + removed):
+            invalidate_products(skus=[product["sku"]])
+        else:
+            invalidate_products(skus=[product["sku"]], categories=[product.get("category", "")])
+    elif operation in ("insert", "replace") and product is not None:
+        invalidate_products(skus=[product["sku"]], categories=[product.get("category", "")])
+    else:
+        # Deletes only carry the _id, so the affected SKU is unknown
+        response_cache.clear()
+
+def start_change_stream_listener(collection: pymongo.collection.Collection) -> None:
+    """Invalidate the response cache from the products change stream on a background thread."""
+    def run():
+        while True:
+            try:
+                with collection.watch(full_document="updateLookup") as stream:
+                    logger.info("Watching product changes for cache invalidation")
+                    for change in stream:
+                        invalidate_change(change)
+            except Exception as e:
+                logger.error("Product change stream failed, retrying in 5s: %s", e)
+            # Changes may have been missed while the stream was down
+            response_cache.clear()
+            time.sleep(5)
+
+    threading.Thread(target=run, name="response-cache-invalidator", daemon=True).start()
+
+_categories = {"values": None, "expires_at": 0.0}
+_categories_lock = threading.Lock()
+
+def get_categories() -> list:
+    """Return the sorted category names, re-reading them from category_stats when the cache expires."""
+    with _categories_lock:
+        if _categories["values"] is not None and _categories["expires_at"] > time.monotonic():
+            return _categories["values"]
+
+    # Products written before their fields were validated can have non-string categories
+    categories = sorted(
+        (stats["_id"] for stats in get_stats_collection().find({"count": {"$gt": 0}}, {"_id": 1})
+         if stats["_id"] is not None),
+        key=str
+    )
+    with _categories_lock:
+        _categories["values"] = categories
+        _categories["expires_at"] = time.monotonic() + CATEGORY_CACHE_TTL_SECONDS
+    return categories
+
+def remember_category(category: str) -> None:
+    """Add a category to the cached list as soon as a product is written with it."""
+    with _categories_lock:
+        if _categories["values"] is not None and category not in _categories["values"]:
+            _categories["values"] = sorted(_categories["values"] + [category], key=str)
+
+class ProductPage:
+    """One page of products read lazily from a cursor, so the template can stream rows as they arrive."""
+
+    def __init__(self, cursor: pymongo.cursor.Cursor, limit: int):
+        self.cursor = cursor
+        self.limit = limit
+        self.has_more = False
+        self.last = None
+
+    def __iter__(self):
+        try:
+            for count, product in enumerate(self.cursor):
+                # the cursor reads one extra product to learn whether there is a next page
+                if count == self.limit:
+                    self.has_more = True
+                    break
+                product['in_stock'] = product.get('stock', 0) > 0
+                self.last = product
+                yield product
+        finally:
+            self.cursor.close()
+
+    def next_url(self, category: str):
+        """Link to the page after this one, only valid once the page has been iterated."""
+        if not self.has_more:
+            return None
+        return url_for('index', category=category or None,
+                       after_category=self.last['category'], after_sku=self.last['sku'])
+
+def index_page_query(category: str, after_category: str, after_sku: str) -> dict:
+    """Build the keyset query for a page of products ordered by (category, sku)."""
+    if category:
+        query = {"category": category}
+        if after_sku is not None:
+            query["sku"] = {"$gt": after_sku}
+        return query
+
+    if after_category is None or after_sku is None:
+        return {}
+    return {"$or": [
+        {"category": {"$gt": after_category}},
+        {"category": after_category, "sku": {"$gt": after_sku}},
+    ]}
+
 @app.route('/')
 def index():
-    """Display all products."""
+    """Display one page of products, streamed as the rows are read."""
     collection = get_collection()
-    
-    pipeline = [
-        {"$addFields": {"in_stock": {"$gt": ["$stock", 0]}}},
-        {"$project": {"_id": 0}},
-        {"$sort": {"category": 1}}
-    ]
-    
-    products = list(collection.aggregate(pipeline))
-    categories = collection.distinct("category")
-    return render_template('index.html', products=products, categories=categories)
+    category = request.args.get('category')
+    after_category = request.args.get('after_category')
+    after_sku = request.args.get('after_sku')
+
+    cursor = collection.find(
+        index_page_query(category, after_category, after_sku),
+        PRODUCT_PROJECTION
+    ).sort([('category', 1), ('sku', 1)]).limit(INDEX_PAGE_SIZE + 1).batch_size(INDEX_PAGE_SIZE + 1)
+
+    return stream_template(
+        'index.html',
+        products=ProductPage(cursor, INDEX_PAGE_SIZE),
+        categories=get_categories(),
+        category=category,
+        is_first_page=after_sku is None
+    )
 
 @app.route('/api/products', methods=['GET'])
 def get_products():
@@ -124,6 +372,14 @@ def get_products():
     cursor = request.args.get('cursor')
     limit = min(limit, 1000)
     
+    # Text search ignores case and extra spaces, so the cache key does too
+    search = " ".join(search.lower().split()) if search else None
+    key = make_key(category=category or None, search=search, limit=limit, cursor=cursor or None)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return jsonify(cached)
+    token = response_cache.token()
+    
     query = {}
     if category:
         query['category'] = category
@@ -136,30 +392,84 @@ def get_products():
     try:
         products = list(collection.find(
             query,
-            {'_id': 0}
+            PRODUCT_PROJECTION
         ).sort('name', 1).limit(limit + 1))
         
         for product in products:
             product['in_stock'] = product.get('stock', 0) > 0
         
+        # The extra product that tells whether there is a next page is tagged too
+        tags = ["category:" + category if category else "category:*"]
+        tags += ["sku:" + str(product['sku']) for product in products]
+        
         has_more = len(products) > limit
         if has_more:
             products = products[:limit]
         
         next_cursor = products[-1]['name'] if products and has_more else None
         
-        return jsonify({
+        result = {
             "products": products,
             "pagination": {
                 "limit": limit,
                 "next_cursor": next_cursor,
                 "has_more": has_more
             }
-        })
+        }
+        response_cache.set(key, result, tags, token)
+        return jsonify(result)
     except Exception as e:
         logger.error("Error in get_products: %s", e)
         return jsonify({"success": False, "message": _sanitize_error(e)}), 500
 
+@app.route('/api/cache/metrics', methods=['GET'])
+def get_cache_metrics():
+    """API endpoint to get response cache hit and miss counts."""
+    return jsonify(response_cache.metrics())
+
+def require_string(data: dict, field: str) -> str:
+    """Return a text field of a request, which must be a string so it sorts and matches like the others."""
+    value = data[field]
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be a string")
+    return value
+
+def require_number(data: dict, field: str, convert):
+    """Return a numeric field of a request converted with float or int.
+
+    A null, list or object value is a ValueError like an unparsable string,
+    so one bad row is reported instead of failing the request.
+    """
+    try:
+        return convert(data[field])
+    except TypeError:
+        raise ValueError(f"{field} must be a number")
+
+def parse_product(data: dict) -> dict:
+    """Validate the fields of a new product and return the document to insert."""
+    sku = require_string(data, 'sku')
+    name = require_string(data, 'name')
+    category = require_string(data, 'category')
+    price = require_number(data, 'price', float)
+    stock = require_number(data, 'stock', int)
+    
+    if price < 0:
+        raise ValueError("Price cannot be negative")
+    if stock < 0:
+        raise ValueError("Stock cannot be negative")
+    
+    product = {
+        "sku": sku,
+        "name": name,
+        "category": category,
+        "price": price,
+        "stock": stock,
+    }
+    
+    if 'description' in data and data['description']:
+        product['description'] = data['description']
+    return product
+
 @app.route('/api/products', methods=['POST'])
 def add_product():
     """API endpoint to add a new product."""
@@ -167,36 +477,214 @@ def add_product():
     collection = get_collection()
     
     try:
-        price = float(data['price'])
-        stock = int(data['stock'])
-        
-        if price < 0:
-            return jsonify({"success": False, "message": "Price cannot be negative"}), 400
-        if stock < 0:
-            return jsonify({"success": False, "message": "Stock cannot be negative"}), 400
-        
-        product = {
-            "sku": data['sku'],
-            "name": data['name'],
-            "category": data['category'],
-            "price": price,
-            "stock": stock,
-        }
-        
-        if 'description' in data and data['description']:
-            product['description'] = data['description']
-        
+        product = parse_product(data)
         collection.insert_one(product)
+        update_category_stats(category_stats_deltas(None, product))
+        invalidate_products(categories=[product['category']])
+        remember_category(product['category'])
         logger.info("Added product: %s (SKU: %s)", product['name'], product['sku'])
         return jsonify({"success": True, "message": "Product added successfully"})
     except DuplicateKeyError:
         return jsonify({"success": False, "message": "Product with this SKU already exists"}), 400
-    except (ValueError, KeyError) as e:
+    except (ValueError, KeyError, TypeError) as e:
         return jsonify({"success": False, "message": f"Invalid input: {_sanitize_error(e)}"}), 400
     except Exception as e:
         logger.error("Error adding product: %s", e)
         return jsonify({"success": False, "message": _sanitize_error(e)}), 500
 
+def read_ndjson_rows(stream):
+    """Yield (line number, row) for each line of an NDJSON stream, with the error as the row of an invalid line."""
+    for line_num, line in enumerate(io.TextIOWrapper(stream, encoding="utf-8"), 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError("Expected a JSON object")
+        except ValueError as e:
+            row = e
+        yield line_num, row
+
+def read_csv_rows(stream):
+    """Yield (line number, row) for each row of a CSV stream, with the error as the row of an invalid line."""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8", newline=""))
+    for row in reader:
+        try:
+            description = row.pop("description", None)
+            if description:
+                row["description"] = json.loads(description)
+        except ValueError as e:
+            row = e
+        yield reader.line_num, row
+
+def _record_import_error(summary: dict, line_num: int, sku, message: str) -> None:
+    summary["failed"] += 1
+    if len(summary["errors"]) < IMPORT_MAX_REPORTED_ERRORS:
+        summary["errors"].append({"line": line_num, "sku": sku, "message": message})
+
+def _write_import_batch(collection: pymongo.collection.Collection, batch: list, upsert: bool, summary: dict) -> None:
+    """Write one batch of (line number, product) pairs with an unordered bulk write."""
+    before = {}
+    if upsert:
+        # The previous values of updated products are needed for the category stats
+        skus = [product["sku"] for line_num, product in batch]
+        before = dict(
+            (product["sku"], product)
+            for product in collection.find({"sku": {"$in": skus}}, dict(STATS_PROJECTION, sku=1))
+        )
+        operations = [UpdateOne({"sku": product["sku"]}, {"$set": product}, upsert=True) for line_num, product in batch]
+    else:
+        operations = [InsertOne(product) for line_num, product in batch]
+
+    failed = {}
+    try:
+        collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details["writeErrors"]:
+            if error["code"] == 11000:
+                failed[error["index"]] = "Product with this SKU already exists"
+            else:
+                logger.error("Error importing product: %s", error.get("errmsg"))
+                failed[error["index"]] = "An internal error occurred. Check the server logs for details."
+
+    deltas = {}
+    updated_skus = []
+    written_categories = set()
+    for index, (line_num, product) in enumerate(batch):
+        if index in failed:
+            _record_import_error(summary, line_num, product["sku"], failed[index])
+            continue
+        previous = before.get(product["sku"])
+        summary["updated" if previous else "inserted"] += 1
+        if previous:
+            updated_skus.append(product["sku"])
+        written_categories.add(product["category"])
+        category_stats_deltas(previous, product, deltas)
+        remember_category(product["category"])
+    update_category_stats(deltas)
+    invalidate_products(skus=updated_skus, categories=written_categories)
+
+def import_products(collection: pymongo.collection.Collection, rows, upsert: bool = False) -> dict:
+    """Write products from (line number, row) pairs in batches of IMPORT_BATCH_SIZE.
+
+    Rows are validated like POST /api/products. With upsert, products whose SKU
+    already exists are updated instead of reported as duplicates. Returns a
+    summary with the counts and the errors of the rows that failed.
+    """
+    summary = {"received": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": []}
+    batch = []
+    batch_skus = set()
+
+    for line_num, row in rows:
+        summary["received"] += 1
+        try:
+            if isinstance(row, Exception):
+                raise row
+            product = parse_product(row)
+        except (ValueError, KeyError, TypeError) as e:
+            sku = row.get("sku") if isinstance(row, dict) else None
+            _record_import_error(summary, line_num, sku, f"Invalid input: {_sanitize_error(e)}")
+            continue
+
+        # A SKU repeated within a batch starts a new one, so rows are applied in order
+        if len(batch) >= IMPORT_BATCH_SIZE or product["sku"] in batch_skus:
+            _write_import_batch(collection, batch, upsert, summary)
+            batch = []
+            batch_skus = set()
+        batch.append((line_num, product))
+        batch_skus.add(product["sku"])
+
+    if batch:
+        _write_import_batch(collection, batch, upsert, summary)
+    summary["errors"].sort(key=lambda error: error["line"])
+    summary["errors_truncated"] = summary["failed"] > len(summary["errors"])
+    return summary
+
+@app.route('/api/products/bulk', methods=['POST'])
+def bulk_import_products():
+    """API endpoint to import products from an NDJSON or CSV request body."""
+    collection = get_collection()
+    data_format = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    mode = request.args.get('mode', 'insert')
+
+    if data_format not in ('ndjson', 'csv'):
+        return jsonify({"success": False, "message": "Format must be ndjson or csv"}), 400
+    if mode not in ('insert', 'upsert'):
+        return jsonify({"success": False, "message": "Mode must be insert or upsert"}), 400
+    
+    try:
+        # The body is read a line at a time as the batches are written
+        rows = read_csv_rows(request.stream) if data_format == 'csv' else read_ndjson_rows(request.stream)
+        summary = import_products(collection, rows, upsert=mode == 'upsert')
+        
+        imported = summary["inserted"] + summary["updated"]
+        logger.info("Imported %d of %d products", imported, summary["received"])
+        return jsonify(dict(
+            summary,
+            success=summary["failed"] == 0,
+            message=f"Imported {imported} of {summary['received']} products"
+        ))
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Invalid input: {_sanitize_error(e)}"}), 400
+    except Exception as e:
+        logger.error("Error importing products: %s", e)
+        return jsonify({"success": False, "message": _sanitize_error(e)}), 500
+
+def product_to_ndjson(product: dict) -> str:
+    return json.dumps(product) + "\n"
+
+def _csv_line(values: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+def product_to_csv(product: dict) -> str:
+    row = [product.get(field, "") for field in CSV_FIELDS[:-1]]
+    row.append(json.dumps(product["description"]) if product.get("description") else "")
+    return _csv_line(row)
+
+def export_chunks(cursor: pymongo.cursor.Cursor, to_line, header: str = ""):
+    """Yield the exported products one cursor batch at a time."""
+    lines = [header] if header else []
+    try:
+        for product in cursor:
+            lines.append(to_line(product))
+            if len(lines) >= EXPORT_BATCH_SIZE:
+                yield "".join(lines)
+                lines = []
+        if lines:
+            yield "".join(lines)
+    finally:
+        cursor.close()
+
+@app.route('/api/products/export', methods=['GET'])
+def export_products():
+    """API endpoint to stream products as NDJSON or CSV."""
+    collection = get_collection()
+    data_format = request.args.get('format', 'ndjson')
+    category = request.args.get('category')
+
+    if data_format not in ('ndjson', 'csv'):
+        return jsonify({"success": False, "message": "Format must be ndjson or csv"}), 400
+
+    query = {}
+    if category:
+        query['category'] = category
+
+    cursor = collection.find(query, PRODUCT_PROJECTION).sort('sku', 1).batch_size(EXPORT_BATCH_SIZE)
+    if data_format == 'csv':
+        chunks = export_chunks(cursor, product_to_csv, _csv_line(CSV_FIELDS))
+        mimetype = 'text/csv'
+    else:
+        chunks = export_chunks(cursor, product_to_ndjson)
+        mimetype = 'application/x-ndjson'
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=products.{data_format}"}
+    )
+
 @app.route('/api/products/<sku>', methods=['PUT'])
 def update_product(sku):
     """API endpoint to update a product."""
@@ -204,8 +692,10 @@ def update_product(sku):
     collection = get_collection()
     
     try:
-        price = float(data['price'])
-        stock = int(data['stock'])
+        name = require_string(data, 'name')
+        category = require_string(data, 'category')
+        price = require_number(data, 'price', float)
+        stock = require_number(data, 'stock', int)
         
         if price < 0:
             return jsonify({"success": False, "message": "Price cannot be negative"}), 400
@@ -213,8 +703,8 @@ def update_product(sku):
             return jsonify({"success": False, "message": "Stock cannot be negative"}), 400
         
         update_fields = {
-            "name": data['name'],
-            "category": data['category'],
+            "name": name,
+            "category": category,
             "price": price,
             "stock": stock,
         }
@@ -222,22 +712,167 @@ def update_product(sku):
         if 'description' in data:
             update_fields['description'] = data['description']
         
-        result = collection.update_one(
+        before = collection.find_one_and_update(
             {"sku": sku},
-            {"$set": update_fields}
+            {"$set": update_fields},
+            projection=STATS_PROJECTION,
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.matched_count == 0:
+        if before is None:
             return jsonify({"success": False, "message": "Product not found"}), 404
         
+        after = dict(before, category=update_fields['category'], price=price, stock=stock)
+        update_category_stats(category_stats_deltas(before, after))
+        invalidate_products(skus=[sku], categories=[update_fields['category']])
+        remember_category(update_fields['category'])
         logger.info("Updated product: %s", sku)
         return jsonify({"success": True, "message": "Product updated successfully"})
-    except (ValueError, KeyError) as e:
+    except (ValueError, KeyError, TypeError) as e:
         return jsonify({"success": False, "message": f"Invalid input: {_sanitize_error(e)}"}), 400
     except Exception as e:
         logger.error("Error updating product: %s", e)
         return jsonify({"success": False, "message": _sanitize_error(e)}), 500
 
+def apply_stock_change(collection: pymongo.collection.Collection, sku: str, change: int) -> tuple:
+    """Apply a stock change in one conditional update that can never take stock below zero.
+
+    Returns (status, stock) where status is "updated", "not_found" or "insufficient",
+    and stock is the current stock of a product whose change was rejected.
+    """
+    after = collection.find_one_and_update(
+        {"sku": sku, "stock": {"$gte": -change}},
+        {"$inc": {"stock": change}},
+        projection=STATS_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if after is not None:
+        update_category_stats(category_stats_deltas(dict(after, stock=after["stock"] - change), after))
+        invalidate_products(skus=[sku])
+        return "updated", None
+
+    # Only a rejected change pays for a second read, to tell the caller why
+    product = collection.find_one({"sku": sku}, {"stock": 1})
+    if product is None:
+        return "not_found", None
+    return "insufficient", product["stock"]
+
+def apply_stock_changes(collection: pymongo.collection.Collection, changes: dict) -> dict:
+    """Apply stock changes to many SKUs with one unordered bulk write.
+
+    changes maps each SKU to its change. Returns a dict mapping each SKU to
+    (status, stock) as returned by apply_stock_change.
+    """
+    # One read tells the missing SKUs, the rejected changes and the stats of the
+    # updated products. It has to come before the write: afterwards a stock below
+    # the change could be a rejected change or an applied one.
+    current = dict(
+        (product["sku"], product)
+        for product in collection.find({"sku": {"$in": list(changes)}}, dict(STATS_PROJECTION, sku=1))
+    )
+
+    results = {}
+    skus = []
+    for sku, change in changes.items():
+        product = current.get(sku)
+        if product is None:
+            results[sku] = ("not_found", None)
+        elif product["stock"] < -change:
+            results[sku] = ("insufficient", product["stock"])
+        else:
+            skus.append(sku)
+    if not skus:
+        return results
+
+    # The updates keep their stock condition, so a concurrent change since the
+    # read can still reject one. Each update also records the batch's op id, so
+    # the products it changed can be told apart from the rejected ones.
+    op_id = ObjectId()
+    result = collection.bulk_write([
+        UpdateOne(
+            {"sku": sku, "stock": {"$gte": -changes[sku]}},
+            {"$inc": {"stock": changes[sku]}, "$push": {"stock_ops": {"$each": [op_id], "$slice": -STOCK_OPS_KEPT}}}
+        )
+        for sku in skus
+    ], ordered=False)
+
+    if result.matched_count != len(skus):
+        changed = dict(
+            (product["sku"], product)
+            for product in collection.find({"sku": {"$in": skus}}, {"sku": 1, "stock": 1, "stock_ops": 1})
+        )
+        rejected = [sku for sku in skus if op_id not in changed.get(sku, {}).get("stock_ops", [])]
+        logger.info("Batch stock update: %d SKUs changed concurrently since they were read", len(rejected))
+        for sku in rejected:
+            product = changed.get(sku)
+            results[sku] = ("insufficient", product["stock"]) if product else ("not_found", None)
+        skus = [sku for sku in skus if sku not in results]
+
+    deltas = {}
+    for sku in skus:
+        product = current[sku]
+        results[sku] = ("updated", None)
+        category_stats_deltas(product, dict(product, stock=product["stock"] + changes[sku]), deltas)
+    update_category_stats(deltas)
+    invalidate_products(skus=skus)
+    return results
+
+class StockCoalescer:
+    """Merges concurrent stock changes on the same SKU into one conditional update.
+
+    The first change for a SKU waits window_ms for others to arrive and then
+    applies their sum. If the sum is rejected, the changes are applied one at a
+    time so that each caller still gets its own answer.
+    """
+
+    def __init__(self, window_ms: float):
+        self.window = window_ms / 1000
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def apply(self, collection: pymongo.collection.Collection, sku: str, change: int) -> tuple:
+        """Apply a stock change, returning (status, stock) like apply_stock_change."""
+        entry = {"change": change, "done": threading.Event(), "result": None, "error": None}
+        with self.lock:
+            group = self.pending.get(sku)
+            is_leader = group is None
+            if is_leader:
+                group = self.pending[sku] = []
+            group.append(entry)
+
+        if is_leader:
+            time.sleep(self.window)
+            with self.lock:
+                del self.pending[sku]
+            try:
+                self._flush(collection, sku, group)
+            except Exception as e:
+                for other in group:
+                    other["error"] = e
+            finally:
+                for other in group:
+                    other["done"].set()
+        else:
+            entry["done"].wait()
+
+        if entry["error"] is not None:
+            raise entry["error"]
+        return entry["result"]
+
+    def _flush(self, collection: pymongo.collection.Collection, sku: str, group: list) -> None:
+        if len(group) > 1:
+            status, stock = apply_stock_change(collection, sku, sum(entry["change"] for entry in group))
+            if status != "insufficient":
+                for entry in group:
+                    entry["result"] = (status, stock)
+                logger.debug("Coalesced %d stock changes for SKU %s", len(group), sku)
+                return
+
+        for entry in group:
+            entry["result"] = apply_stock_change(collection, sku, entry["change"])
+
+stock_coalescer = StockCoalescer(STOCK_COALESCE_MS)
+
 @app.route('/api/products/<sku>/stock', methods=['PUT'])
 def update_stock(sku):
     """API endpoint to update product stock."""
@@ -245,29 +880,62 @@ def update_stock(sku):
     collection = get_collection()
     
     try:
-        quantity_change = int(data['change'])
+        quantity_change = require_number(data, 'change', int)
         
-        product = collection.find_one({"sku": sku}, {"stock": 1})
-        if product is None:
+        if STOCK_COALESCE_MS > 0:
+            status, stock = stock_coalescer.apply(collection, sku, quantity_change)
+        else:
+            status, stock = apply_stock_change(collection, sku, quantity_change)
+
+        if status == "not_found":
             return jsonify({"success": False, "message": "Product not found"}), 404
-        
-        new_stock = product["stock"] + quantity_change
-        if new_stock < 0:
-            return jsonify({"success": False, "message": f"Insufficient stock. Current: {product['stock']}, Requested change: {quantity_change}"}), 400
-        
-        result = collection.update_one(
-            {"sku": sku},
-            {"$inc": {"stock": quantity_change}}
-        )
+        if status == "insufficient":
+            return jsonify({"success": False, "message": f"Insufficient stock. Current: {stock}, Requested change: {quantity_change}"}), 400
         
         logger.info("Updated stock for SKU %s by %d", sku, quantity_change)
         return jsonify({"success": True, "message": "Stock updated successfully"})
-    except (ValueError, KeyError) as e:
+    except (ValueError, KeyError, TypeError) as e:
         return jsonify({"success": False, "message": f"Invalid input: {_sanitize_error(e)}"}), 400
     except Exception as e:
         logger.error("Error updating stock: %s", e)
         return jsonify({"success": False, "message": _sanitize_error(e)}), 500
 
+@app.route('/api/products/stock/batch', methods=['POST'])
+def update_stock_batch():
+    """API endpoint to apply stock changes to many products at once."""
+    data = request.json
+    collection = get_collection()
+
+    try:
+        # Changes to the same SKU within a batch are merged into one
+        changes = {}
+        for item in data['changes']:
+            sku = str(item['sku'])
+            changes[sku] = changes.get(sku, 0) + require_number(item, 'change', int)
+
+        if not changes:
+            return jsonify({"success": False, "message": "No stock changes given"}), 400
+        if len(changes) > STOCK_BATCH_MAX:
+            return jsonify({"success": False, "message": f"At most {STOCK_BATCH_MAX} SKUs per batch"}), 400
+
+        results = apply_stock_changes(collection, changes)
+
+        updated = sum(1 for status, stock in results.values() if status == "updated")
+        logger.info("Batch stock update: %d of %d SKUs updated", updated, len(results))
+        return jsonify({
+            "success": updated == len(results),
+            "message": f"Updated stock for {updated} of {len(results)} products",
+            "results": [
+                {"sku": sku, "change": change, "status": results[sku][0], "stock": results[sku][1]}
+                for sku, change in changes.items()
+            ]
+        })
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"success": False, "message": f"Invalid input: {_sanitize_error(e)}"}), 400
+    except Exception as e:
+        logger.error("Error updating stock batch: %s", e)
+        return jsonify({"success": False, "message": _sanitize_error(e)}), 500
+
 @app.route('/api/products/<sku>/description', methods=['PUT'])
 def update_description(sku):
     """API endpoint to update product custom description fields."""
@@ -284,6 +952,7 @@ def update_description(sku):
         if result.matched_count == 0:
             return jsonify({"success": False, "message": "Product not found"}), 404
         
+        invalidate_products(skus=[sku])
         logger.info("Updated description for SKU %s", sku)
         return jsonify({"success": True, "message": "Description updated successfully"})
     except Exception as e:
@@ -296,10 +965,12 @@ def delete_product(sku):
     collection = get_collection()
     
     try:
-        result = collection.delete_one({"sku": sku})
-        if result.deleted_count == 0:
+        before = collection.find_one_and_delete({"sku": sku}, projection=STATS_PROJECTION)
+        if before is None:
             return jsonify({"success": False, "message": "Product not found"}), 404
         
+        update_category_stats(category_stats_deltas(before, None))
+        invalidate_products(skus=[sku])
         logger.info("Deleted product with SKU: %s", sku)
         return jsonify({"success": True, "message": "Product deleted successfully"})
     except Exception as e:
@@ -308,41 +979,27 @@ def delete_product(sku):
 
 @app.route('/api/analytics', methods=['GET'])
 def get_analytics():
-    """API endpoint to get aggregation analytics."""
-    collection = get_collection()
+    """API endpoint to get analytics from the pre-aggregated category stats."""
+    stats_collection = get_stats_collection()
     
     try:
-        pipeline = [
-            {
-                "$group": {
-                    "_id": "$category",
-                    "count": {"$sum": 1},
-                    "total_value": {"$sum": {"$multiply": ["$price", "$stock"]}},
-                    "low_stock_count": {
-                        "$sum": {"$cond": [{"$lte": ["$stock", 10]}, 1, 0]}
-                    }
-                }
-            },
+        results = [
             {
-                "$project": {
-                    "_id": 0,
-                    "category": "$_id",
-                    "count": 1,
-                    "total_value": 1
-                }
-            },
-            {"$sort": {"total_value": -1}}
+                "category": stats["_id"],
+                "count": stats["count"],
+                "total_value": round(stats["total_value"], 2),
+                "low_stock_count": stats["low_stock_count"]
+            }
+            for stats in stats_collection.find({"count": {"$gt": 0}}).sort("total_value", -1)
         ]
         
-        results = list(collection.aggregate(pipeline))
-        
         total_value = sum(r['total_value'] for r in results)
         total_products = sum(r['count'] for r in results)
-        low_stock_count = collection.count_documents({"stock": {"$lte": 10}})
+        low_stock_count = sum(r['low_stock_count'] for r in results)
         
         return jsonify({
             "by_category": results,
-            "total_value": total_value,
+            "total_value": round(total_value, 2),
             "total_products": total_products,
             "low_stock_count": low_stock_count
         })
@@ -358,21 +1015,18 @@ if __name__ == "__main__":
         
         # Seed database with sample products if empty
         if collection.count_documents({}) == 0:
-            import csv
             logger.info("Seeding database with sample products...")
-            with open('seed_data.csv', 'r') as f:
-                reader = csv.DictReader(f)
-                products = []
-                for row in reader:
-                    products.append({
-                        "sku": row['sku'],
-                        "name": row['name'],
-                        "category": row['category'],
-                        "price": float(row['price']),
-                        "stock": int(row['stock']),
-                    })
-                collection.insert_many(products)
-                logger.info("Inserted %d sample products", len(products))
+            with open('seed_data.csv', 'rb') as f:
+                summary = import_products(collection, read_csv_rows(f))
+                logger.info("Inserted %d sample products", summary["inserted"])
+        
+        # Rebuild category stats once on startup, then periodically
+        num_categories = reconcile_category_stats(collection)
+        logger.info("Reconciled category stats for %d categories", num_categories)
+        if CATEGORY_STATS_RECONCILE_SECONDS > 0:
+            start_stats_reconciler(collection, CATEGORY_STATS_RECONCILE_SECONDS)
+        if RESPONSE_CACHE_CHANGE_STREAM:
+            start_change_stream_listener(collection)
     except (ConnectionFailure, ServerSelectionTimeoutError) as e:
         logger.error("Cannot start application - DocumentDB connection failed: %s", e)
         logger.error("Please check your connection settings and ensure DocumentDB is accessible")
@@ -0,0 +1,278 @@
+"""Response cache for the product catalog API.
+
+Cached responses are tagged with what they depend on, for example
+"sku:LAPTOP-001" for every product they list and "category:Electronics" for
+the category filter they were read with. Writes invalidate the tags they
+affect, so only the responses that can have changed are dropped.
+
+A write can land while a response is being read from the database. To keep
+that response from being cached with stale data, callers take a token from
+token() before reading and pass it to set(). The response is not stored if
+any of its tags was invalidated after the token was taken.
+"""
+
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(**params) -> str:
+    """Build a cache key from already normalized query parameters."""
+    return json.dumps(sorted(params.items()), separators=(",", ":"))
+
+
+class MemoryCache:
+    """In-process LRU cache with a TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.tag_keys = {}
+        self.tag_invalidated = {}
+        self.cleared_at = 0
+        self.sequence = 0
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "sets": 0, "stale_sets": 0, "invalidations": 0, "evictions": 0}
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry["expires_at"] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.counters["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry["value"]
+
+    def token(self) -> int:
+        with self.lock:
+            return self.sequence
+
+    def set(self, key: str, value, tags: list, token: int) -> None:
+        with self.lock:
+            if self.cleared_at > token or any(self.tag_invalidated.get(tag, 0) > token for tag in tags):
+                self.counters["stale_sets"] += 1
+                return
+
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = {"value": value, "tags": tags, "expires_at": time.monotonic() + self.ttl_seconds}
+            for tag in tags:
+                self.tag_keys.setdefault(tag, set()).add(key)
+            self.counters["sets"] += 1
+
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+                self.counters["evictions"] += 1
+
+    def invalidate(self, tags: list) -> None:
+        with self.lock:
+            self.sequence += 1
+            for tag in tags:
+                self.tag_invalidated[tag] = self.sequence
+                for key in list(self.tag_keys.get(tag, ())):
+                    self._remove(key)
+                    self.counters["invalidations"] += 1
+            # Invalidations only matter to reads that are still running, so
+            # forget them all at once when they pile up and treat it as a clear
+            if len(self.tag_invalidated) > self.max_entries * 10:
+                self.tag_invalidated.clear()
+                self.cleared_at = self.sequence
+
+    def clear(self) -> None:
+        with self.lock:
+            self.sequence += 1
+            self.counters["invalidations"] += len(self.entries)
+            self.entries.clear()
+            self.tag_keys.clear()
+            self.tag_invalidated.clear()
+            self.cleared_at = self.sequence
+
+    def _remove(self, key: str) -> None:
+        entry = self.entries.pop(key)
+        for tag in entry["tags"]:
+            keys = self.tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tag_keys[tag]
+
+    def metrics(self) -> dict:
+        with self.lock:
+            metrics = dict(self.counters, backend="memory", entries=len(self.entries))
+        lookups = metrics["hits"] + metrics["misses"]
+        metrics["hit_ratio"] = round(metrics["hits"] / lookups, 4) if lookups else 0.0
+        return metrics
+
+
+class RedisCache:
+    """Cache shared by every app process through Redis.
+
+    Needs the redis package and a server that runs Lua scripts. Each response is
+    a key with a TTL, each tag a set of the response keys that carry it, and
+    pc:seq counts invalidations. When Redis cannot be reached, reads are misses
+    and responses are not stored.
+    """
+
+    PREFIX = "pc:"
+
+    # Stores a response only if neither its tags nor the whole cache were
+    # invalidated after its token was read, in one step so that no
+    # invalidation can run between the check and the write.
+    # KEYS: response key, cleared key, then a tag key and tagseq key per tag
+    # ARGV: token, response, TTL, cache key
+    SET_SCRIPT = """
+local token = tonumber(ARGV[1])
+for i = 2, #KEYS, 2 do
+    local sequence = redis.call('GET', KEYS[i])
+    if sequence and tonumber(sequence) > token then
+        return 0
+    end
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+for i = 3, #KEYS, 2 do
+    redis.call('SADD', KEYS[i], ARGV[4])
+    redis.call('EXPIRE', KEYS[i], ARGV[3])
+end
+return 1
+"""
+
+    def __init__(self, url: str, ttl_seconds: float):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis needs the redis package: pip install redis")
+
+        self.redis = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self.redis_error = redis.RedisError
+        self.ttl = max(int(ttl_seconds), 1)
+        self.set_script = self.redis.register_script(self.SET_SCRIPT)
+        self.counters = {"hits": 0, "misses": 0, "sets": 0, "stale_sets": 0, "invalidations": 0, "errors": 0}
+        self.lock = threading.Lock()
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self.lock:
+            self.counters[counter] += amount
+
+    def get(self, key: str):
+        try:
+            value = self.redis.get(self.PREFIX + "resp:" + key)
+        except self.redis_error as e:
+            logger.warning("Response cache read failed: %s", e)
+            self._count("errors")
+            value = None
+        if value is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return json.loads(value)
+
+    def token(self) -> int:
+        try:
+            return int(self.redis.get(self.PREFIX + "seq") or 0)
+        except self.redis_error:
+            # Nothing can be stored without a token, see set()
+            return None
+
+    def set(self, key: str, value, tags: list, token: int) -> None:
+        if token is None:
+            return
+        try:
+            self._set(key, value, tags, token)
+        except self.redis_error as e:
+            logger.warning("Response cache write failed: %s", e)
+            self._count("errors")
+
+    def _set(self, key: str, value, tags: list, token: int) -> None:
+        keys = [self.PREFIX + "resp:" + key, self.PREFIX + "cleared"]
+        for tag in tags:
+            keys += [self.PREFIX + "tag:" + tag, self.PREFIX + "tagseq:" + tag]
+        if not self.set_script(keys=keys, args=[token, json.dumps(value), self.ttl, key]):
+            self._count("stale_sets")
+            return
+        self._count("sets")
+
+    def invalidate(self, tags: list) -> None:
+        try:
+            self._invalidate(tags)
+        except self.redis_error as e:
+            # Entries of these tags stay cached until their TTL runs out
+            logger.error("Response cache invalidation failed: %s", e)
+            self._count("errors")
+
+    def _invalidate(self, tags: list) -> None:
+        sequence = self.redis.incr(self.PREFIX + "seq")
+        pipeline = self.redis.pipeline(transaction=False)
+        # tagseq goes first, a response stored after it is refused by SET_SCRIPT
+        # and one stored before it is in the tag set read next
+        for tag in tags:
+            pipeline.set(self.PREFIX + "tagseq:" + tag, sequence, ex=self.ttl)
+            pipeline.smembers(self.PREFIX + "tag:" + tag)
+            pipeline.delete(self.PREFIX + "tag:" + tag)
+        results = pipeline.execute()
+
+        keys = set()
+        for members in results[1::3]:
+            keys.update(member.decode() for member in members)
+        if keys:
+            self.redis.delete(*[self.PREFIX + "resp:" + key for key in keys])
+        self._count("invalidations", len(keys))
+
+    def clear(self) -> None:
+        try:
+            sequence = self.redis.incr(self.PREFIX + "seq")
+            self.redis.set(self.PREFIX + "cleared", sequence, ex=self.ttl)
+            for pattern in ("resp:*", "tag:*"):
+                keys = list(self.redis.scan_iter(self.PREFIX + pattern))
+                if keys:
+                    self.redis.delete(*keys)
+        except self.redis_error as e:
+            logger.error("Response cache clear failed: %s", e)
+            self._count("errors")
+
+    def metrics(self) -> dict:
+        with self.lock:
+            metrics = dict(self.counters, backend="redis")
+        lookups = metrics["hits"] + metrics["misses"]
+        metrics["hit_ratio"] = round(metrics["hits"] / lookups, 4) if lookups else 0.0
+        return metrics
+
+
+class NullCache:
+    """Cache that stores nothing, for RESPONSE_CACHE_BACKEND=none."""
+
+    def get(self, key: str):
+        return None
+
+    def token(self) -> int:
+        return 0
+
+    def set(self, key: str, value, tags: list, token: int) -> None:
+        pass
+
+    def invalidate(self, tags: list) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def metrics(self) -> dict:
+        return {"backend": "none"}
+
+
+def create_cache(backend: str, max_entries: int, ttl_seconds: float, redis_url: str):
+    """Create the cache backend named by RESPONSE_CACHE_BACKEND."""
+    if backend == "memory":
+        return MemoryCache(max_entries, ttl_seconds)
+    if backend == "redis":
+        return RedisCache(redis_url, ttl_seconds)
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"Unknown response cache backend: {backend}")
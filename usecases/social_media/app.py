@@ -7,13 +7,26 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv('SESSION_SECRET', 'dev-secret-key-change-in-production')
 
-from routes import auth, users, posts, search
+from routes import auth, users, posts, search, metrics
+from models import user_cache
 
 app.register_blueprint(auth.bp)
 app.register_blueprint(users.bp)
 app.register_blueprint(posts.bp)
 app.register_blueprint(search.bp)
 
+# /metrics shows internals such as the password hashing queue, only serve it when asked to
+if os.getenv('METRICS_ENABLED', 'false').strip().lower() in ('1', 'true', 'yes', 'on'):
+    app.register_blueprint(metrics.bp)
+
+@app.before_request
+def begin_user_cache():
+    user_cache.begin_request()
+
+@app.teardown_request
+def end_user_cache(e):
+    user_cache.end_request()
+
 @app.errorhandler(404)
 def not_found(e):
     return 'Page not found', 404
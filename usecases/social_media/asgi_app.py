@@ -0,0 +1,41 @@
+import os
+from quart import Quart
+from dotenv import load_dotenv
+
+load_dotenv()
+
+app = Quart(__name__)
+app.secret_key = os.getenv('SESSION_SECRET', 'dev-secret-key-change-in-production')
+
+from routes_async import auth, users, posts, search, metrics
+from models import user_cache
+
+app.register_blueprint(auth.bp)
+app.register_blueprint(users.bp)
+app.register_blueprint(posts.bp)
+app.register_blueprint(search.bp)
+
+# /metrics shows internals such as the password hashing queue, only serve it when asked to
+if os.getenv('METRICS_ENABLED', 'false').strip().lower() in ('1', 'true', 'yes', 'on'):
+    app.register_blueprint(metrics.bp)
+
+@app.before_request
+async def begin_user_cache():
+    user_cache.begin_request()
+
+@app.teardown_request
+async def end_user_cache(e):
+    user_cache.end_request()
+
+@app.errorhandler(404)
+async def not_found(e):
+    return 'Page not found', 404
+
+@app.errorhandler(500)
+async def server_error(e):
+    return 'Internal server error', 500
+
+if __name__ == '__main__':
+    port = int(os.getenv('ASGI_PORT', 5001))
+    debug = os.getenv('FLASK_DEBUG', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+    app.run(host='0.0.0.0', port=port, debug=debug)
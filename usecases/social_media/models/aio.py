@@ -0,0 +1,179 @@
+"""Async (Motor) read paths for the ASGI variant of the app.
+
+Independent queries within a page are issued concurrently with
+asyncio.gather. Writes are not duplicated here, the async routes run the
+synchronous models in a worker thread instead.
+"""
+
+import os
+import asyncio
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from models import post as post_model
+from models import timeline as timeline_model
+from models import user as user_model
+from models import user_cache
+from models.projections import USER_CARD, USER_PROJECTIONS
+
+_client = None
+_db = None
+
+def get_async_db():
+    """Get the Motor database, creating the client if necessary."""
+    global _client, _db
+
+    if _db is not None:
+        return _db
+
+    docdb_uri = os.getenv('DOCDB_URI')
+    if not docdb_uri:
+        raise ValueError('DOCDB_URI environment variable not set')
+
+    _client = AsyncIOMotorClient(docdb_uri)
+    _db = _client.social
+
+    return _db
+
+async def find_user_by_username(username, projection='profile'):
+    """Find a user by username, projection names an entry of USER_PROJECTIONS."""
+    db = get_async_db()
+    user = await db.users.find_one({'username': username}, USER_PROJECTIONS[projection])
+    user_cache.remember(user)
+    return user
+
+async def get_user_cards(user_ids):
+    """Get user cards by id from the process cache, fetching the rest with one query."""
+    db = get_async_db()
+
+    cards, missing_ids = user_cache.lookup_cards(user_ids)
+
+    if missing_ids:
+        async for user in db.users.find({'_id': {'$in': missing_ids}}, USER_CARD):
+            user_cache.remember(user)
+            # older documents can lack display_name or bio, like the sync cards they are left out
+            cards[user['_id']] = {field: user[field] for field in USER_CARD if field in user}
+
+    return cards
+
+async def is_following(follower_id, followee_id):
+    """Check if a user is following another user."""
+    db = get_async_db()
+
+    if isinstance(follower_id, str):
+        follower_id = ObjectId(follower_id)
+    if isinstance(followee_id, str):
+        followee_id = ObjectId(followee_id)
+
+    edge = await db.follows.find_one(
+        {'follower_id': follower_id, 'followee_id': followee_id},
+        {'_id': 1}
+    )
+    return edge is not None
+
+async def get_following_ids(user_id):
+    """Get the ids of the users a user is following."""
+    db = get_async_db()
+
+    edges = db.follows.find({'follower_id': user_id}, {'_id': 0, 'followee_id': 1})
+    return [edge['followee_id'] async for edge in edges]
+
+async def get_timeline_entries(owner_id, limit=50, before=None):
+    """Get the newest post references from a materialized timeline."""
+    db = get_async_db()
+
+    buckets = db.timelines.find(
+        timeline_model.timeline_query(owner_id, before),
+        {'entries': 1}
+    ).sort('_id', -1)
+
+    entries = []
+    async for bucket in buckets:
+        if timeline_model.collect_entries(entries, bucket, limit, before):
+            break
+
+    return timeline_model.newest_entries(entries, limit)
+
+async def get_user_posts(user_id, limit=50, cursor=None):
+    """Get a page of posts by a specific user, returns (posts, next_cursor)."""
+    db = get_async_db()
+
+    if isinstance(user_id, str):
+        user_id = ObjectId(user_id)
+
+    query = {'author_id': user_id}
+    if cursor:
+        query.update(post_model.before_cursor_query(post_model.decode_cursor(cursor)))
+
+    posts, author = await asyncio.gather(
+        db.posts.find(query).sort([('created_at', -1), ('_id', -1)]).to_list(limit + 1),
+        get_user_cards([user_id])
+    )
+
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = post_model.encode_cursor(posts[-1]['created_at'], posts[-1]['_id'])
+
+    for post in posts:
+        post['author'] = author.get(user_id)
+
+    return posts, next_cursor
+
+async def get_timeline_posts(user_id, limit=50, cursor=None):
+    """Get a page of timeline posts, returns (posts, next_cursor).
+
+    Same result as models.post.get_timeline_posts, with the user check,
+    followed celebrities and timeline read issued together and the post
+    fetch and author lookup issued together.
+    """
+    db = get_async_db()
+
+    if isinstance(user_id, str):
+        user_id = ObjectId(user_id)
+
+    before = post_model.decode_cursor(cursor) if cursor else None
+
+    user, followed, entries = await asyncio.gather(
+        get_user_cards([user_id]),
+        db.timeline_celebrities.find_one({'_id': user_id}),
+        get_timeline_entries(user_id, limit + 1, before)
+    )
+    if not user:
+        return [], None
+
+    if followed:
+        celebrity_ids = followed['celebrity_ids']
+    else:
+        celebrity_ids = await asyncio.to_thread(user_model.refresh_followed_celebrity_ids, user_id)
+
+    if not entries and not before:
+        has_timeline = await db.timelines.find_one({'owner_id': user_id}, {'_id': 1})
+        if not has_timeline:
+            following_ids = await get_following_ids(user_id)
+            author_ids = [following_id for following_id in following_ids if following_id not in celebrity_ids]
+            await asyncio.to_thread(timeline_model.rebuild_timeline, user_id, author_ids + [user_id])
+            entries = await get_timeline_entries(user_id, limit + 1)
+
+    if celebrity_ids:
+        celebrity_posts = await db.posts.find(
+            post_model.celebrity_posts_query(celebrity_ids, before),
+            {'_id': 1, 'author_id': 1, 'created_at': 1}
+        ).sort([('created_at', -1), ('_id', -1)]).to_list(limit + 1)
+        entries += [{'post_id': post['_id'], 'author_id': post['author_id'], 'created_at': post['created_at']} for post in celebrity_posts]
+
+    page_entries, next_cursor = post_model.merge_timeline_entries(entries, limit)
+    post_ids = [entry['post_id'] for entry in page_entries]
+
+    found_posts, authors = await asyncio.gather(
+        db.posts.find({'_id': {'$in': post_ids}}).to_list(None),
+        get_user_cards(entry['author_id'] for entry in page_entries)
+    )
+
+    # deleted posts are dropped here rather than pulled from every timeline
+    posts_dict = {post['_id']: post for post in found_posts}
+    posts = [posts_dict[post_id] for post_id in post_ids if post_id in posts_dict]
+
+    for post in posts:
+        post['author'] = authors.get(post['author_id'])
+
+    return posts, next_cursor
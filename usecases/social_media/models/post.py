@@ -1,6 +1,36 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
+from bson.errors import InvalidId
 from models.db import get_db
+from models import timeline as timeline_model
+from models import user as user_model
+from models import user_cache
+
+_EPOCH = datetime(1970, 1, 1)
+
+def encode_cursor(created_at, post_id):
+    """Encode a (created_at, _id) position as an opaque page cursor."""
+    milliseconds = (created_at - _EPOCH) // timedelta(milliseconds=1)
+    return f'{milliseconds}_{post_id}'
+
+def decode_cursor(cursor):
+    """Decode a page cursor into (created_at, _id), raising ValueError if malformed."""
+    try:
+        milliseconds, post_id = cursor.split('_', 1)
+        return _EPOCH + timedelta(milliseconds=int(milliseconds)), ObjectId(post_id)
+    except (ValueError, InvalidId, OverflowError):
+        raise ValueError('Invalid page cursor')
+
+def before_cursor_query(before):
+    """Match posts older than the (created_at, _id) position, newest first order."""
+    created_at, post_id = before
+    return {
+        'created_at': {'$lte': created_at},
+        '$or': [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': post_id}}
+        ]
+    }
 
 def create_post(author_id, content):
     """Create a new post."""
@@ -16,6 +46,19 @@ def create_post(author_id, content):
     }
 
     result = db.posts.insert_one(post_doc)
+
+    author = db.users.find_one({'_id': author_id}, {'follower_count': 1, 'celebrity': 1}) or {}
+
+    # Celebrity status is sticky, posts made while merged at read time would
+    # otherwise disappear from follower timelines if the author dropped back.
+    celebrity = author.get('celebrity', False)
+    if not celebrity and timeline_model.is_celebrity(author.get('follower_count', 0)):
+        user_model.mark_celebrity(author_id)
+        celebrity = True
+
+    follower_ids = [] if celebrity else user_model.get_follower_ids(author_id)
+    timeline_model.fan_out_post(result.inserted_id, author_id, post_doc['created_at'], follower_ids)
+
     return result.inserted_id
 
 def delete_post(post_id, author_id):
@@ -34,47 +77,107 @@ def delete_post(post_id, author_id):
 
     return result.deleted_count > 0
 
-def get_user_posts(user_id, limit=50):
-    """Get posts by a specific user."""
+def celebrity_posts_query(celebrity_ids, before):
+    """Match posts by followed celebrities, merged into timelines at read time."""
+    query = {'author_id': {'$in': celebrity_ids}}
+    if before:
+        query.update(before_cursor_query(before))
+    return query
+
+def merge_timeline_entries(entries, limit):
+    """Order timeline and celebrity entries newest first and cut them to a page.
+
+    Returns (page_entries, next_cursor).
+    """
+    # an author may have been fanned out on write before becoming a celebrity
+    page_entries = []
+    seen_post_ids = set()
+    for entry in sorted(entries, key=lambda entry: (entry['created_at'], entry['post_id']), reverse=True):
+        if entry['post_id'] not in seen_post_ids:
+            seen_post_ids.add(entry['post_id'])
+            page_entries.append(entry)
+
+    next_cursor = None
+    if len(page_entries) > limit:
+        page_entries = page_entries[:limit]
+        next_cursor = encode_cursor(page_entries[-1]['created_at'], page_entries[-1]['post_id'])
+
+    return page_entries, next_cursor
+
+def get_user_posts(user_id, limit=50, cursor=None):
+    """Get a page of posts by a specific user.
+
+    Returns (posts, next_cursor), next_cursor is None on the last page.
+    """
     db = get_db()
 
     if isinstance(user_id, str):
         user_id = ObjectId(user_id)
 
-    posts = list(db.posts.find(
-        {'author_id': user_id}
-    ).sort('created_at', -1).limit(limit))
+    query = {'author_id': user_id}
+    if cursor:
+        query.update(before_cursor_query(decode_cursor(cursor)))
+
+    posts = list(db.posts.find(query).sort([('created_at', -1), ('_id', -1)]).limit(limit + 1))
 
-    author = db.users.find_one({'_id': user_id})
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = encode_cursor(posts[-1]['created_at'], posts[-1]['_id'])
+
+    author = user_cache.get_user_card(user_id)
 
     for post in posts:
         post['author'] = author
 
-    return posts
+    return posts, next_cursor
+
+def get_timeline_posts(user_id, limit=50, cursor=None):
+    """Get a page of posts from users that the current user is following.
 
-def get_timeline_posts(user_id, limit=50):
-    """Get posts from users that the current user is following."""
+    Posts are read from the user's materialized timeline, plus a read-time
+    merge of recent posts from the followed celebrity accounts recorded for
+    the timeline. Returns (posts, next_cursor), next_cursor is None on the
+    last page.
+    """
     db = get_db()
 
     if isinstance(user_id, str):
         user_id = ObjectId(user_id)
 
-    user = db.users.find_one({'_id': user_id})
-    if not user:
-        return []
+    before = decode_cursor(cursor) if cursor else None
+
+    if not user_cache.get_user_card(user_id):
+        return [], None
+
+    celebrity_ids = timeline_model.get_celebrity_ids(user_id)
+    if celebrity_ids is None:
+        celebrity_ids = user_model.refresh_followed_celebrity_ids(user_id)
+
+    entries = timeline_model.get_timeline_entries(user_id, limit + 1, before)
+    if not entries and not before and not timeline_model.has_timeline(user_id):
+        following_ids = user_model.get_following_ids(user_id)
+        author_ids = [following_id for following_id in following_ids if following_id not in celebrity_ids]
+        timeline_model.rebuild_timeline(user_id, author_ids + [user_id])
+        entries = timeline_model.get_timeline_entries(user_id, limit + 1)
+
+    if celebrity_ids:
+        celebrity_posts = db.posts.find(
+            celebrity_posts_query(celebrity_ids, before),
+            {'_id': 1, 'author_id': 1, 'created_at': 1}
+        ).sort([('created_at', -1), ('_id', -1)]).limit(limit + 1)
+        entries += [{'post_id': post['_id'], 'author_id': post['author_id'], 'created_at': post['created_at']} for post in celebrity_posts]
 
-    following_ids = user.get('following', [])
-    following_ids.append(user_id)
+    page_entries, next_cursor = merge_timeline_entries(entries, limit)
+    post_ids = [entry['post_id'] for entry in page_entries]
 
-    posts = list(db.posts.find(
-        {'author_id': {'$in': following_ids}}
-    ).sort('created_at', -1).limit(limit))
+    # deleted posts are dropped here rather than pulled from every timeline
+    posts_dict = {post['_id']: post for post in db.posts.find({'_id': {'$in': post_ids}})}
+    posts = [posts_dict[post_id] for post_id in post_ids if post_id in posts_dict]
 
-    author_ids = list(set(post['author_id'] for post in posts))
-    authors = list(db.users.find({'_id': {'$in': author_ids}}))
-    authors_dict = {author['_id']: author for author in authors}
+    authors = user_cache.get_user_cards(post['author_id'] for post in posts)
 
     for post in posts:
-        post['author'] = authors_dict.get(post['author_id'])
+        post['author'] = authors.get(post['author_id'])
 
-    return posts
+    return posts, next_cursor
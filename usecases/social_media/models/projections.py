@@ -0,0 +1,18 @@
+# Named projections for user documents. Every user read picks the smallest
+# one that covers its use, so display paths never decode password hashes,
+# email addresses or follow data.
+
+# shown next to a post or in a list of users
+USER_CARD = {'_id': 1, 'username': 1, 'display_name': 1}
+
+# shown on the profile and search pages
+USER_PROFILE = dict(USER_CARD, bio=1, follower_count=1, following_count=1, created_at=1)
+
+# needed to check credentials and start a session
+USER_AUTH = {'_id': 1, 'username': 1, 'password_hash': 1}
+
+USER_PROJECTIONS = {
+    'card': USER_CARD,
+    'profile': USER_PROFILE,
+    'auth': USER_AUTH
+}
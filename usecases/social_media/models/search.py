@@ -0,0 +1,217 @@
+import os
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from models.db import get_db
+from models.projections import USER_PROFILE
+
+# Users carry a search_tokens array with every prefix ("p:ali") and every
+# padded bigram ("g:^a", "g:al", ...) of the words in their username and
+# display name. Typeahead is an exact match on prefix tokens, served by the
+# (search_tokens, follower_count) index, and bigram overlap is the fallback
+# for misspelled queries.
+SEARCH_MAX_PREFIX_LENGTH = int(os.getenv('SEARCH_MAX_PREFIX_LENGTH', 20))
+SEARCH_RESULT_LIMIT = int(os.getenv('SEARCH_RESULT_LIMIT', 10))
+SEARCH_FUZZY_CANDIDATES = int(os.getenv('SEARCH_FUZZY_CANDIDATES', 200))
+SEARCH_FUZZY_MIN_SCORE = float(os.getenv('SEARCH_FUZZY_MIN_SCORE', 0.5))
+
+# Prefix results are cached in a trie of recent queries.
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', 10000))
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv('SEARCH_CACHE_TTL_SECONDS', 30))
+
+def _normalize(text):
+    """Lowercase and strip accents."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+def _words(text):
+    return re.findall(r'[a-z0-9]+', _normalize(text))
+
+def _user_words(username, display_name):
+    words = _words(username) + _words(display_name)
+    # "al_ice" is also found by searching for "alice"
+    joined_username = ''.join(_words(username))
+    if joined_username and joined_username not in words:
+        words.append(joined_username)
+    return words
+
+def _bigrams(word):
+    padded = f'^{word}$'
+    return [padded[index:index + 2] for index in range(len(padded) - 1)]
+
+def search_tokens(username, display_name):
+    """Build the search_tokens array stored on a user document."""
+    tokens = set()
+    for word in _user_words(username, display_name):
+        for length in range(1, min(len(word), SEARCH_MAX_PREFIX_LENGTH) + 1):
+            tokens.add('p:' + word[:length])
+        for bigram in _bigrams(word):
+            tokens.add('g:' + bigram)
+    return sorted(tokens)
+
+def _matches_prefixes(user, query_words):
+    """Check a cached result against a longer query without the database."""
+    words = _user_words(user['username'], user.get('display_name'))
+    return all(any(word.startswith(query_word) for word in words) for query_word in query_words)
+
+class _TrieNode:
+    __slots__ = ('children', 'entry')
+
+    def __init__(self):
+        self.children = {}
+        self.entry = None
+
+class PrefixCache:
+    """Trie of recent prefix queries and their results.
+
+    A query that returned fewer than the result limit holds every match, so
+    any longer query that extends it is answered by filtering those results
+    instead of querying the database.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.root = _TrieNode()
+        self.recent = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, limit, query_words):
+        now = time.monotonic()
+        with self.lock:
+            node = self.root
+            complete_results = None
+            for depth, char in enumerate(key, 1):
+                node = node.children.get(char)
+                if node is None:
+                    break
+                entry = node.entry
+                if entry is None or entry['expires_at'] <= now:
+                    continue
+                if depth == len(key) and entry['limit'] >= limit:
+                    self.recent.move_to_end(key)
+                    self.hits += 1
+                    return entry['results'][:limit]
+                if entry['complete']:
+                    complete_results = entry['results']
+
+            if complete_results is not None:
+                self.hits += 1
+                return [user for user in complete_results if _matches_prefixes(user, query_words)][:limit]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, limit, results):
+        now = time.monotonic()
+        with self.lock:
+            node = self.root
+            for char in key:
+                node = node.children.setdefault(char, _TrieNode())
+            node.entry = {
+                'limit': limit,
+                'results': results,
+                'complete': len(results) < limit,
+                'expires_at': now + self.ttl_seconds
+            }
+            self.recent[key] = node
+            self.recent.move_to_end(key)
+
+            while len(self.recent) > self.max_entries:
+                oldest_key, oldest_node = self.recent.popitem(last=False)
+                oldest_node.entry = None
+                self._prune(oldest_key)
+
+    def _prune(self, key):
+        """Remove trie nodes left without entries or children on the path to key."""
+        path = [self.root]
+        for char in key:
+            node = path[-1].children.get(char)
+            if node is None:
+                return
+            path.append(node)
+
+        for depth in range(len(key), 0, -1):
+            node = path[depth]
+            if node.entry is not None or node.children:
+                return
+            del path[depth - 1].children[key[depth - 1]]
+
+    def clear(self):
+        with self.lock:
+            self.root = _TrieNode()
+            self.recent.clear()
+
+    def metrics(self):
+        with self.lock:
+            return {'entries': len(self.recent), 'hits': self.hits, 'misses': self.misses}
+
+prefix_cache = PrefixCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_SECONDS)
+
+def _prefix_search(query_words, limit):
+    db = get_db()
+
+    tokens = ['p:' + word[:SEARCH_MAX_PREFIX_LENGTH] for word in query_words]
+    # the longest token is the most selective one to drive the index scan
+    tokens.sort(key=len, reverse=True)
+    query = {'search_tokens': tokens[0]} if len(tokens) == 1 else {'search_tokens': {'$all': tokens}}
+
+    results = list(db.users.find(query, USER_PROFILE).sort('follower_count', -1).limit(limit))
+
+    # prefixes longer than the token limit only narrow the results further
+    return [user for user in results if _matches_prefixes(user, query_words)]
+
+def _fuzzy_search(query_words, limit, exclude_ids):
+    db = get_db()
+
+    query_bigrams = set(bigram for word in query_words for bigram in _bigrams(word))
+    candidates = db.users.find(
+        {'search_tokens': {'$in': ['g:' + bigram for bigram in query_bigrams]}},
+        dict(USER_PROFILE, search_tokens=1)
+    ).limit(SEARCH_FUZZY_CANDIDATES)
+
+    scored = []
+    for user in candidates:
+        if user['_id'] in exclude_ids:
+            continue
+        user_bigrams = set(token[2:] for token in user.pop('search_tokens') if token.startswith('g:'))
+        score = len(query_bigrams & user_bigrams) / len(query_bigrams)
+        if score >= SEARCH_FUZZY_MIN_SCORE:
+            scored.append((score, user.get('follower_count', 0), user))
+
+    scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    return [user for score, follower_count, user in scored[:limit]]
+
+def search_users(query, limit=None):
+    """Search users by username and display name prefixes, then by similarity."""
+    if not query or not isinstance(query, str):
+        return []
+
+    limit = limit or SEARCH_RESULT_LIMIT
+    query_words = _words(query)
+    if not query_words:
+        return []
+
+    key = ' '.join(query_words)
+    results = prefix_cache.get(key, limit, query_words)
+    if results is None:
+        results = _prefix_search(query_words, limit)
+        prefix_cache.put(key, limit, results)
+
+    # an exact handle always comes first, even if it is not the most followed match
+    handle = query.strip()
+    exact = [user for user in results if user['username'] == handle]
+    if not exact and len(query_words) == 1 and len(results) == limit:
+        exact_user = get_db().users.find_one({'username': handle}, USER_PROFILE)
+        exact = [exact_user] if exact_user else []
+    if exact:
+        results = exact + [user for user in results if user['_id'] != exact[0]['_id']]
+
+    if len(results) < limit:
+        results = results + _fuzzy_search(query_words, limit - len(results), set(user['_id'] for user in results))
+
+    return results[:limit]
@@ -0,0 +1,223 @@
+import os
+from bson import ObjectId
+from pymongo import UpdateOne, DeleteMany
+from models.db import get_db
+
+# Each timeline bucket holds up to TIMELINE_BUCKET_SIZE post references and
+# a user keeps at most TIMELINE_MAX_BUCKETS buckets, older ones are trimmed.
+TIMELINE_BUCKET_SIZE = int(os.getenv('TIMELINE_BUCKET_SIZE', 100))
+TIMELINE_MAX_BUCKETS = int(os.getenv('TIMELINE_MAX_BUCKETS', 8))
+
+# Authors with at least this many followers are not fanned out on write,
+# their posts are merged into follower timelines at read time instead.
+CELEBRITY_FOLLOWER_THRESHOLD = int(os.getenv('TIMELINE_CELEBRITY_THRESHOLD', 10000))
+
+# Number of recent posts copied into a timeline when following someone.
+TIMELINE_BACKFILL_POSTS = int(os.getenv('TIMELINE_BACKFILL_POSTS', 20))
+
+def _entry(post_id, author_id, created_at):
+    return {'post_id': post_id, 'author_id': author_id, 'created_at': created_at}
+
+def _push_entry(owner_id, entry):
+    """Append to the owner's open bucket, starting a new bucket when it is full."""
+    return UpdateOne(
+        {'owner_id': owner_id, 'count': {'$lt': TIMELINE_BUCKET_SIZE}},
+        {'$push': {'entries': entry}, '$inc': {'count': 1}},
+        upsert=True
+    )
+
+def _trim_timelines(owner_ids):
+    """Delete buckets beyond TIMELINE_MAX_BUCKETS for owners that started a new bucket.
+
+    The bucket ids of all owners are read with one aggregation and the
+    excess buckets are deleted with one bulk write.
+    """
+    if not owner_ids:
+        return
+
+    db = get_db()
+
+    owners = db.timelines.aggregate([
+        {'$match': {'owner_id': {'$in': list(owner_ids)}}},
+        {'$group': {'_id': '$owner_id', 'bucket_ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': TIMELINE_MAX_BUCKETS}}}
+    ])
+
+    requests = []
+    for owner in owners:
+        oldest_kept = sorted(owner['bucket_ids'], reverse=True)[TIMELINE_MAX_BUCKETS - 1]
+        requests.append(DeleteMany({'owner_id': owner['_id'], '_id': {'$lt': oldest_kept}}))
+
+    if requests:
+        db.timelines.bulk_write(requests, ordered=False)
+
+def _write_entries(requests, owner_ids):
+    """Run timeline pushes as one unordered bulk write and trim new buckets."""
+    if not requests:
+        return
+
+    db = get_db()
+    result = db.timelines.bulk_write(requests, ordered=False)
+
+    new_bucket_owners = set(owner_ids[index] for index in result.upserted_ids)
+    _trim_timelines(new_bucket_owners)
+
+def is_celebrity(follower_count):
+    """Return True if an author with this many followers is merged at read time."""
+    return follower_count >= CELEBRITY_FOLLOWER_THRESHOLD
+
+def fan_out_post(post_id, author_id, created_at, follower_ids):
+    """Push a new post reference into the author's and each follower's materialized timeline.
+
+    Owners without a timeline are skipped. A bucket created here would make
+    has_timeline true and their timeline would never be rebuilt, so it is
+    built from the posts on their first read instead, this post included.
+    """
+    db = get_db()
+    entry = _entry(post_id, author_id, created_at)
+    owner_ids = [author_id] + [follower_id for follower_id in follower_ids if follower_id != author_id]
+    owner_ids = db.timelines.distinct('owner_id', {'owner_id': {'$in': owner_ids}})
+
+    _write_entries([_push_entry(owner_id, entry) for owner_id in owner_ids], owner_ids)
+
+def backfill_timeline(owner_id, author_id):
+    """Copy an author's recent posts into a timeline, used when following them."""
+    db = get_db()
+
+    posts = db.posts.find(
+        {'author_id': author_id},
+        {'_id': 1, 'author_id': 1, 'created_at': 1}
+    ).sort('created_at', -1).limit(TIMELINE_BACKFILL_POSTS)
+
+    requests = [_push_entry(owner_id, _entry(post['_id'], post['author_id'], post['created_at'])) for post in posts]
+    _write_entries(requests, [owner_id] * len(requests))
+
+def remove_author(owner_id, author_id):
+    """Remove an author's posts from a timeline, used when unfollowing them.
+
+    Bucket counts are not decremented, a bucket keeps the slots of removed
+    entries until it is trimmed.
+    """
+    db = get_db()
+
+    db.timelines.update_many(
+        {'owner_id': owner_id},
+        {'$pull': {'entries': {'author_id': author_id}}}
+    )
+
+def get_celebrity_ids(owner_id):
+    """Get the followed celebrities merged into a timeline, None if not recorded yet."""
+    db = get_db()
+    followed = db.timeline_celebrities.find_one({'_id': owner_id})
+    return followed['celebrity_ids'] if followed else None
+
+def set_celebrity_ids(owner_id, celebrity_ids):
+    """Record the full list of followed celebrities merged into a timeline."""
+    db = get_db()
+    db.timeline_celebrities.update_one(
+        {'_id': owner_id},
+        {'$set': {'celebrity_ids': celebrity_ids}},
+        upsert=True
+    )
+
+def add_celebrity(owner_ids, celebrity_id):
+    """Add a celebrity to the given timelines.
+
+    Timelines without a recorded list are skipped, their whole list is
+    computed on the next read.
+    """
+    db = get_db()
+    db.timeline_celebrities.update_many(
+        {'_id': {'$in': owner_ids}},
+        {'$addToSet': {'celebrity_ids': celebrity_id}}
+    )
+
+def remove_celebrity(owner_id, celebrity_id):
+    """Remove a celebrity from a timeline, used when unfollowing them."""
+    db = get_db()
+    db.timeline_celebrities.update_one({'_id': owner_id}, {'$pull': {'celebrity_ids': celebrity_id}})
+
+def has_timeline(owner_id):
+    """Return True if the owner has a materialized timeline."""
+    db = get_db()
+    return db.timelines.find_one({'owner_id': owner_id}, {'_id': 1}) is not None
+
+def rebuild_timeline(owner_id, author_ids):
+    """Materialize a timeline from the posts of the given authors.
+
+    Used for users whose timeline predates fan-out on write. Celebrity
+    authors should be left out, they are merged at read time.
+    """
+    db = get_db()
+
+    db.timelines.delete_many({'owner_id': owner_id})
+
+    posts = list(db.posts.find(
+        {'author_id': {'$in': author_ids}},
+        {'_id': 1, 'author_id': 1, 'created_at': 1}
+    ).sort('created_at', -1).limit(TIMELINE_BUCKET_SIZE * TIMELINE_MAX_BUCKETS))
+
+    # oldest first so each bucket covers a contiguous time range
+    posts.reverse()
+
+    buckets = []
+    for start in range(0, len(posts), TIMELINE_BUCKET_SIZE):
+        entries = [_entry(post['_id'], post['author_id'], post['created_at']) for post in posts[start:start + TIMELINE_BUCKET_SIZE]]
+        buckets.append({'_id': ObjectId(), 'owner_id': owner_id, 'entries': entries, 'count': len(entries)})
+
+    if not buckets:
+        # an empty bucket marks the timeline as materialized
+        buckets.append({'_id': ObjectId(), 'owner_id': owner_id, 'entries': [], 'count': 0})
+
+    db.timelines.insert_many(buckets)
+
+def timeline_query(owner_id, before=None):
+    """Match the owner's buckets that can hold entries older than before.
+
+    Buckets whose entries are all newer than the position are skipped, so
+    later pages do not read the buckets of earlier pages again.
+    """
+    query = {'owner_id': owner_id}
+    if before:
+        query['entries.created_at'] = {'$lte': before[0]}
+    return query
+
+def collect_entries(entries, bucket, limit, before):
+    """Add a bucket's entries older than before, returns True once the page is complete.
+
+    A follow backfill can put older posts in a newer bucket, so one more
+    bucket is read after the page is filled before it is cut.
+    """
+    filled = len(entries) >= limit
+
+    for entry in bucket['entries']:
+        if before is None or (entry['created_at'], entry['post_id']) < before:
+            entries.append(entry)
+
+    return filled
+
+def newest_entries(entries, limit):
+    """Sort collected entries newest first and cut them to a page."""
+    entries.sort(key=lambda entry: (entry['created_at'], entry['post_id']), reverse=True)
+    return entries[:limit]
+
+def get_timeline_entries(owner_id, limit=50, before=None):
+    """Get the newest post references from a materialized timeline.
+
+    before is an optional (created_at, post_id) position, only entries older
+    than it are returned. Buckets holding such entries are read newest first
+    until the page is filled, see timeline_query and collect_entries.
+    """
+    db = get_db()
+
+    buckets = db.timelines.find(
+        timeline_query(owner_id, before),
+        {'entries': 1}
+    ).sort('_id', -1)
+
+    entries = []
+    for bucket in buckets:
+        if collect_entries(entries, bucket, limit, before):
+            break
+
+    return newest_entries(entries, limit)
@@ -1,53 +1,85 @@
 from datetime import datetime
 from bson import ObjectId
-from werkzeug.security import generate_password_hash, check_password_hash
+from pymongo.errors import DuplicateKeyError
 from models.db import get_db
+from models import timeline as timeline_model
+from models import user_cache
+from models import search as search_model
+from models.projections import USER_CARD, USER_AUTH, USER_PROJECTIONS
+from utils import passwords
 import re
 
 def create_user(username, email, password, display_name=None, bio=None):
     """Create a new user account."""
     db = get_db()
 
-    if db.users.find_one({'username': username}):
+    if db.users.find_one({'username': username}, {'_id': 1}):
         raise ValueError('Username already exists')
 
-    if db.users.find_one({'email': email}):
+    if db.users.find_one({'email': email}, {'_id': 1}):
         raise ValueError('Email already exists')
 
     user_doc = {
         'username': username,
         'email': email,
-        'password_hash': generate_password_hash(password),
+        'password_hash': passwords.hash_password(password),
         'display_name': display_name or username,
         'bio': bio or '',
-        'followers': [],
-        'following': [],
+        'follower_count': 0,
+        'following_count': 0,
+        'search_tokens': search_model.search_tokens(username, display_name or username),
         'created_at': datetime.utcnow()
     }
 
     result = db.users.insert_one(user_doc)
+    timeline_model.set_celebrity_ids(result.inserted_id, [])
+    search_model.prefix_cache.clear()
     return result.inserted_id
 
-def find_user_by_username(username):
-    """Find a user by username."""
+def find_user_by_username(username, projection='profile'):
+    """Find a user by username, projection names an entry of USER_PROJECTIONS."""
     db = get_db()
-    return db.users.find_one({'username': username})
+    user = db.users.find_one({'username': username}, USER_PROJECTIONS[projection])
+    user_cache.remember(user)
+    return user
 
-def find_user_by_email(email):
-    """Find a user by email."""
+def find_user_by_email(email, projection='profile'):
+    """Find a user by email, projection names an entry of USER_PROJECTIONS."""
     db = get_db()
-    return db.users.find_one({'email': email})
+    user = db.users.find_one({'email': email}, USER_PROJECTIONS[projection])
+    user_cache.remember(user)
+    return user
 
-def get_user_by_id(user_id):
-    """Get a user by ID."""
+def find_user_for_login(username_or_email):
+    """Find a user by username or email with only the fields needed to log in."""
+    user = find_user_by_username(username_or_email, projection='auth')
+    if not user:
+        user = find_user_by_email(username_or_email, projection='auth')
+    return user
+
+def get_user_by_id(user_id, projection='profile'):
+    """Get a user by ID, projection names an entry of USER_PROJECTIONS."""
     db = get_db()
     if isinstance(user_id, str):
         user_id = ObjectId(user_id)
-    return db.users.find_one({'_id': user_id})
+    user = db.users.find_one({'_id': user_id}, USER_PROJECTIONS[projection])
+    user_cache.remember(user)
+    return user
 
 def verify_password(user, password):
-    """Verify a user's password."""
-    return check_password_hash(user['password_hash'], password)
+    """Verify a user's password, rehashing it if the hash settings have changed."""
+    if not passwords.check_password(user['password_hash'], password):
+        return False
+
+    if passwords.needs_rehash(user['password_hash']):
+        db = get_db()
+        # matching the old hash avoids overwriting a concurrent password change
+        db.users.update_one(
+            {'_id': user['_id'], 'password_hash': user['password_hash']},
+            {'$set': {'password_hash': passwords.hash_password(password)}}
+        )
+
+    return True
 
 def follow_user(follower_id, followee_id):
     """Follow a user."""
@@ -61,15 +93,28 @@ def follow_user(follower_id, followee_id):
     if follower_id == followee_id:
         raise ValueError('Cannot follow yourself')
 
-    db.users.update_one(
-        {'_id': follower_id},
-        {'$addToSet': {'following': followee_id}}
-    )
-
-    db.users.update_one(
-        {'_id': followee_id},
-        {'$addToSet': {'followers': follower_id}}
-    )
+    # the unique (follower_id, followee_id) index makes a repeated follow a no-op
+    try:
+        db.follows.insert_one({
+            'follower_id': follower_id,
+            'followee_id': followee_id,
+            'created_at': datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        return
+
+    db.users.update_one({'_id': follower_id}, {'$inc': {'following_count': 1}})
+    db.users.update_one({'_id': followee_id}, {'$inc': {'follower_count': 1}})
+
+    # celebrity posts are merged at read time, and a timeline that has not been
+    # materialized yet is built with all followed authors on first read. The
+    # flag is read after the edge is inserted, so a followee that becomes a
+    # celebrity concurrently is recorded here or by mark_celebrity.
+    followee = db.users.find_one({'_id': followee_id}, {'celebrity': 1})
+    if followee and followee.get('celebrity'):
+        timeline_model.add_celebrity([follower_id], followee_id)
+    elif followee and timeline_model.has_timeline(follower_id):
+        timeline_model.backfill_timeline(follower_id, followee_id)
 
 def unfollow_user(follower_id, followee_id):
     """Unfollow a user."""
@@ -80,58 +125,80 @@ def unfollow_user(follower_id, followee_id):
     if isinstance(followee_id, str):
         followee_id = ObjectId(followee_id)
 
-    db.users.update_one(
-        {'_id': follower_id},
-        {'$pull': {'following': followee_id}}
-    )
+    result = db.follows.delete_one({
+        'follower_id': follower_id,
+        'followee_id': followee_id
+    })
+    if result.deleted_count == 0:
+        return
 
-    db.users.update_one(
-        {'_id': followee_id},
-        {'$pull': {'followers': follower_id}}
-    )
+    db.users.update_one({'_id': follower_id}, {'$inc': {'following_count': -1}})
+    db.users.update_one({'_id': followee_id}, {'$inc': {'follower_count': -1}})
 
-def get_followers(user_id):
-    """Get list of followers for a user."""
+    timeline_model.remove_author(follower_id, followee_id)
+    timeline_model.remove_celebrity(follower_id, followee_id)
+
+def mark_celebrity(user_id):
+    """Mark a user as a celebrity, their posts are merged at read time from now on."""
     db = get_db()
 
-    if isinstance(user_id, str):
-        user_id = ObjectId(user_id)
+    result = db.users.update_one({'_id': user_id, 'celebrity': {'$ne': True}}, {'$set': {'celebrity': True}})
+    if result.modified_count == 0:
+        return
 
-    user = db.users.find_one({'_id': user_id})
-    if not user:
-        return []
+    # the followers are read after the flag is set, see follow_user
+    follower_ids = get_follower_ids(user_id)
+    if follower_ids:
+        timeline_model.add_celebrity(follower_ids, user_id)
 
-    follower_ids = user.get('followers', [])
-    return list(db.users.find({'_id': {'$in': follower_ids}}))
+def refresh_followed_celebrity_ids(user_id):
+    """Compute and record the ids of the celebrities a user follows."""
+    db = get_db()
 
-def get_following(user_id):
-    """Get list of users that a user is following."""
+    following_ids = get_following_ids(user_id)
+    celebrity_ids = []
+    if following_ids:
+        celebrity_ids = [celebrity['_id'] for celebrity in db.users.find(
+            {'_id': {'$in': following_ids}, 'celebrity': True},
+            {'_id': 1}
+        )]
+
+    timeline_model.set_celebrity_ids(user_id, celebrity_ids)
+    return celebrity_ids
+
+def get_follower_ids(user_id):
+    """Get the ids of the users following a user."""
     db = get_db()
 
     if isinstance(user_id, str):
         user_id = ObjectId(user_id)
 
-    user = db.users.find_one({'_id': user_id})
-    if not user:
-        return []
-
-    following_ids = user.get('following', [])
-    return list(db.users.find({'_id': {'$in': following_ids}}))
+    edges = db.follows.find({'followee_id': user_id}, {'_id': 0, 'follower_id': 1})
+    return [edge['follower_id'] for edge in edges]
 
-def search_users(query):
-    """Search for users by username (exact match only)."""
+def get_following_ids(user_id):
+    """Get the ids of the users a user is following."""
     db = get_db()
 
-    if not query or not isinstance(query, str):
-        return []
+    if isinstance(user_id, str):
+        user_id = ObjectId(user_id)
+
+    edges = db.follows.find({'follower_id': user_id}, {'_id': 0, 'followee_id': 1})
+    return [edge['followee_id'] for edge in edges]
+
+def get_followers(user_id):
+    """Get list of followers for a user."""
+    db = get_db()
 
-    sanitized_query = query.strip()
+    follower_ids = get_follower_ids(user_id)
+    return list(db.users.find({'_id': {'$in': follower_ids}}, USER_CARD))
 
-    if not sanitized_query:
-        return []
+def get_following(user_id):
+    """Get list of users that a user is following."""
+    db = get_db()
 
-    user = db.users.find_one({'username': sanitized_query})
-    return [user] if user else []
+    following_ids = get_following_ids(user_id)
+    return list(db.users.find({'_id': {'$in': following_ids}}, USER_CARD))
 
 def is_following(follower_id, followee_id):
     """Check if a user is following another user."""
@@ -142,11 +209,11 @@ def is_following(follower_id, followee_id):
     if isinstance(followee_id, str):
         followee_id = ObjectId(followee_id)
 
-    user = db.users.find_one({'_id': follower_id})
-    if not user:
-        return False
-
-    return followee_id in user.get('following', [])
+    edge = db.follows.find_one(
+        {'follower_id': follower_id, 'followee_id': followee_id},
+        {'_id': 1}
+    )
+    return edge is not None
 
 def validate_password(password):
     """Validate password meets requirements."""
@@ -166,16 +233,17 @@ def change_password(user_id, current_password, new_password):
     if isinstance(user_id, str):
         user_id = ObjectId(user_id)
 
-    user = db.users.find_one({'_id': user_id})
+    user = db.users.find_one({'_id': user_id}, USER_AUTH)
     if not user:
         raise ValueError('User not found')
 
-    if not check_password_hash(user['password_hash'], current_password):
+    if not passwords.check_password(user['password_hash'], current_password):
         raise ValueError('Current password is incorrect')
 
     validate_password(new_password)
 
     db.users.update_one(
         {'_id': user_id},
-        {'$set': {'password_hash': generate_password_hash(new_password)}}
+        {'$set': {'password_hash': passwords.hash_password(new_password)}}
     )
+    user_cache.invalidate(user_id)
@@ -0,0 +1,126 @@
+import os
+import time
+import threading
+import contextvars
+from collections import OrderedDict
+from models.db import get_db
+from models.projections import USER_CARD
+
+# Process-wide cache of user cards (the fields shown next to a post). Entries
+# expire after USER_CACHE_TTL_SECONDS so changes made by other processes are
+# picked up, changes made by this process invalidate their entry directly.
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS', 60))
+
+CARD_FIELDS = tuple(USER_CARD)
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+# Per-request map of user cards, started and ended by the Flask and Quart
+# apps around each request. A ContextVar is visible to the Quart request task
+# and to the worker threads it runs synchronous models in.
+_request_cards = contextvars.ContextVar('user_cards', default=None)
+
+def _card(user):
+    return {field: user[field] for field in CARD_FIELDS if field in user}
+
+def begin_request():
+    """Start an empty per-request map of user cards."""
+    _request_cards.set({})
+
+def end_request():
+    """Drop the per-request map when the request is torn down."""
+    _request_cards.set(None)
+
+def _identity_map():
+    """Get the per-request map of user cards, None outside a request."""
+    return _request_cards.get()
+
+def _cache_get(user_id, now):
+    with _lock:
+        cached = _cache.get(user_id)
+        if cached is None:
+            return None
+        expires_at, card = cached
+        if expires_at <= now:
+            del _cache[user_id]
+            return None
+        _cache.move_to_end(user_id)
+        return card
+
+def _cache_put(card, now):
+    with _lock:
+        _cache[card['_id']] = (now + USER_CACHE_TTL_SECONDS, card)
+        _cache.move_to_end(card['_id'])
+        while len(_cache) > USER_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def remember(user):
+    """Record a user document fetched elsewhere so later lookups skip the database."""
+    # documents read with a narrower projection, such as auth, are not cards
+    if not user or any(field not in user for field in CARD_FIELDS):
+        return
+
+    card = _card(user)
+    identity_map = _identity_map()
+    if identity_map is not None:
+        identity_map[card['_id']] = card
+    _cache_put(card, time.monotonic())
+
+def lookup_cards(user_ids):
+    """Look user cards up in the current request and the process cache.
+
+    Returns (cards, missing_ids) where cards is a dict of id to card.
+    """
+    now = time.monotonic()
+    identity_map = _identity_map()
+    cards = {}
+    missing_ids = []
+
+    for user_id in set(user_ids):
+        card = identity_map.get(user_id) if identity_map is not None else None
+        if card is None:
+            card = _cache_get(user_id, now)
+            if card is not None and identity_map is not None:
+                identity_map[user_id] = card
+        if card is None:
+            missing_ids.append(user_id)
+        else:
+            cards[user_id] = card
+
+    return cards, missing_ids
+
+def get_user_cards(user_ids):
+    """Get user cards by id, returns a dict of id to card.
+
+    Ids are looked up in the current request, then the process cache, and
+    the rest are fetched with a single query.
+    """
+    cards, missing_ids = lookup_cards(user_ids)
+
+    if missing_ids:
+        db = get_db()
+        for user in db.users.find({'_id': {'$in': missing_ids}}, USER_CARD):
+            remember(user)
+            cards[user['_id']] = _card(user)
+
+    return cards
+
+def get_user_card(user_id):
+    """Get a single user card by id, None if the user does not exist."""
+    return get_user_cards([user_id]).get(user_id)
+
+def invalidate(user_id):
+    """Drop a user's card after their profile or credentials change."""
+    with _lock:
+        _cache.pop(user_id, None)
+
+    identity_map = _identity_map()
+    if identity_map is not None:
+        identity_map.pop(user_id, None)
+
+def clear():
+    """Empty the process cache."""
+    with _lock:
+        _cache.clear()
@@ -9,17 +9,18 @@ def login():
         username_or_email = request.form.get('username')
         password = request.form.get('password')
 
-        user = user_model.find_user_by_username(username_or_email)
-        if not user:
-            user = user_model.find_user_by_email(username_or_email)
+        user = user_model.find_user_for_login(username_or_email)
 
-        if user and user_model.verify_password(user, password):
-            session['user_id'] = str(user['_id'])
-            session['username'] = user['username']
-            flash('Successfully logged in!', 'success')
-            return redirect(url_for('posts.timeline'))
-        else:
-            flash('Invalid username or password', 'error')
+        try:
+            if user and user_model.verify_password(user, password):
+                session['user_id'] = str(user['_id'])
+                session['username'] = user['username']
+                flash('Successfully logged in!', 'success')
+                return redirect(url_for('posts.timeline'))
+            else:
+                flash('Invalid username or password', 'error')
+        except ValueError as e:
+            flash(str(e), 'error')
 
     return render_template('login.html')
 
@@ -0,0 +1,12 @@
+from flask import Blueprint, jsonify
+from models import search as search_model
+from utils import passwords
+
+bp = Blueprint('metrics', __name__)
+
+@bp.route('/metrics')
+def metrics():
+    return jsonify({
+        'password_hashing': passwords.get_metrics(),
+        'search_prefix_cache': search_model.prefix_cache.metrics()
+    })
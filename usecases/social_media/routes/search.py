@@ -1,5 +1,5 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from models import user as user_model
+from flask import Blueprint, render_template, request, jsonify
+from models import search as search_model
 from utils.decorators import login_required
 
 bp = Blueprint('search', __name__)
@@ -11,6 +11,16 @@ def search():
     results = []
 
     if query:
-        results = user_model.search_users(query)
+        results = search_model.search_users(query)
 
     return render_template('search.html', query=query, results=results)
+
+@bp.route('/search/suggest')
+@login_required
+def suggest():
+    """Typeahead suggestions as JSON."""
+    results = search_model.search_users(request.args.get('q', ''))
+    return jsonify([
+        {'username': user['username'], 'display_name': user.get('display_name')}
+        for user in results
+    ])
@@ -13,7 +13,12 @@ def profile(username):
         flash('User not found', 'error')
         return redirect(url_for('posts.timeline'))
 
-    posts = post_model.get_user_posts(user['_id'])
+    try:
+        posts, next_cursor = post_model.get_user_posts(user['_id'], cursor=request.args.get('before'))
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('users.profile', username=username))
+
     current_user_id = session.get('user_id')
     is_own_profile = str(user['_id']) == current_user_id
     is_following = user_model.is_following(current_user_id, user['_id']) if not is_own_profile else False
@@ -21,15 +26,16 @@ def profile(username):
     return render_template('profile.html',
                           user=user,
                           posts=posts,
+                          next_cursor=next_cursor,
                           is_own_profile=is_own_profile,
                           is_following=is_following,
-                          follower_count=len(user.get('followers', [])),
-                          following_count=len(user.get('following', [])))
+                          follower_count=user.get('follower_count', 0),
+                          following_count=user.get('following_count', 0))
 
 @bp.route('/follow/<username>', methods=['POST'])
 @login_required
 def follow(username):
-    user = user_model.find_user_by_username(username)
+    user = user_model.find_user_by_username(username, projection='card')
     if not user:
         flash('User not found', 'error')
         return redirect(url_for('posts.timeline'))
@@ -45,7 +51,7 @@ def follow(username):
 @bp.route('/unfollow/<username>', methods=['POST'])
 @login_required
 def unfollow(username):
-    user = user_model.find_user_by_username(username)
+    user = user_model.find_user_by_username(username, projection='card')
     if not user:
         flash('User not found', 'error')
         return redirect(url_for('posts.timeline'))
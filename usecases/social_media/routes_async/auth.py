@@ -0,0 +1,86 @@
+from quart import Blueprint, render_template, request, redirect, url_for, session, flash
+from quart.utils import run_sync
+from models import user as user_model
+
+bp = Blueprint('auth', __name__)
+
+@bp.route('/login', methods=['GET', 'POST'])
+async def login():
+    if request.method == 'POST':
+        form = await request.form
+        username_or_email = form.get('username')
+        password = form.get('password')
+
+        user = await run_sync(user_model.find_user_for_login)(username_or_email)
+
+        # password hashing is CPU bound, keep it off the event loop
+        try:
+            if user and await run_sync(user_model.verify_password)(user, password):
+                session['user_id'] = str(user['_id'])
+                session['username'] = user['username']
+                await flash('Successfully logged in!', 'success')
+                return redirect(url_for('posts.timeline'))
+            else:
+                await flash('Invalid username or password', 'error')
+        except ValueError as e:
+            await flash(str(e), 'error')
+
+    return await render_template('login.html')
+
+@bp.route('/register', methods=['GET', 'POST'])
+async def register():
+    if request.method == 'POST':
+        form = await request.form
+        username = form.get('username')
+        email = form.get('email')
+        password = form.get('password')
+        display_name = form.get('display_name')
+        bio = form.get('bio')
+
+        try:
+            user_id = await run_sync(user_model.create_user)(
+                username=username,
+                email=email,
+                password=password,
+                display_name=display_name,
+                bio=bio
+            )
+            session['user_id'] = str(user_id)
+            session['username'] = username
+            await flash('Account created successfully!', 'success')
+            return redirect(url_for('posts.timeline'))
+        except ValueError as e:
+            await flash(str(e), 'error')
+
+    return await render_template('register.html')
+
+@bp.route('/logout')
+async def logout():
+    session.clear()
+    await flash('Successfully logged out', 'success')
+    return redirect(url_for('auth.login'))
+
+@bp.route('/change-password', methods=['GET', 'POST'])
+async def change_password():
+    if 'user_id' not in session:
+        await flash('Please log in to change your password', 'error')
+        return redirect(url_for('auth.login'))
+
+    if request.method == 'POST':
+        form = await request.form
+        current_password = form.get('current_password')
+        new_password = form.get('new_password')
+        confirm_password = form.get('confirm_password')
+
+        if new_password != confirm_password:
+            await flash('New passwords do not match', 'error')
+            return await render_template('change_password.html')
+
+        try:
+            await run_sync(user_model.change_password)(session['user_id'], current_password, new_password)
+            await flash('Password changed successfully!', 'success')
+            return redirect(url_for('posts.timeline'))
+        except ValueError as e:
+            await flash(str(e), 'error')
+
+    return await render_template('change_password.html')
@@ -0,0 +1,53 @@
+from quart import Blueprint, render_template, request, redirect, url_for, session, flash
+from quart.utils import run_sync
+from models import aio
+from models import post as post_model
+from utils.async_decorators import login_required
+from utils.redirects import is_safe_local_redirect_target
+
+bp = Blueprint('posts', __name__)
+
+@bp.route('/')
+@bp.route('/timeline')
+@login_required
+async def timeline():
+    user_id = session.get('user_id')
+
+    try:
+        posts, next_cursor = await aio.get_timeline_posts(user_id, cursor=request.args.get('before'))
+    except ValueError as e:
+        await flash(str(e), 'error')
+        return redirect(url_for('posts.timeline'))
+
+    return await render_template('timeline.html', posts=posts, next_cursor=next_cursor)
+
+@bp.route('/post', methods=['POST'])
+@login_required
+async def create_post():
+    form = await request.form
+    content = form.get('content')
+
+    if not content or not content.strip():
+        await flash('Post content cannot be empty', 'error')
+        return redirect(url_for('posts.timeline'))
+
+    user_id = session.get('user_id')
+    await run_sync(post_model.create_post)(user_id, content)
+    await flash('Post created!', 'success')
+    return redirect(url_for('posts.timeline'))
+
+@bp.route('/delete/<post_id>', methods=['POST'])
+@login_required
+async def delete_post(post_id):
+    user_id = session.get('user_id')
+    deleted = await run_sync(post_model.delete_post)(post_id, user_id)
+
+    if deleted:
+        await flash('Post deleted', 'success')
+    else:
+        await flash('Could not delete post', 'error')
+
+    referrer = request.referrer
+    if is_safe_local_redirect_target(referrer):
+        return redirect(referrer)
+    return redirect(url_for('posts.timeline'))
@@ -0,0 +1,27 @@
+from quart import Blueprint, render_template, request, jsonify
+from quart.utils import run_sync
+from models import search as search_model
+from utils.async_decorators import login_required
+
+bp = Blueprint('search', __name__)
+
+@bp.route('/search')
+@login_required
+async def search():
+    query = request.args.get('q', '')
+    results = []
+
+    if query:
+        results = await run_sync(search_model.search_users)(query)
+
+    return await render_template('search.html', query=query, results=results)
+
+@bp.route('/search/suggest')
+@login_required
+async def suggest():
+    """Typeahead suggestions as JSON."""
+    results = await run_sync(search_model.search_users)(request.args.get('q', ''))
+    return jsonify([
+        {'username': user['username'], 'display_name': user.get('display_name')}
+        for user in results
+    ])
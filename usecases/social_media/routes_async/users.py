@@ -0,0 +1,71 @@
+import asyncio
+from quart import Blueprint, render_template, request, redirect, url_for, session, flash
+from quart.utils import run_sync
+from models import aio
+from models import user as user_model
+from utils.async_decorators import login_required
+
+bp = Blueprint('users', __name__)
+
+@bp.route('/profile/<username>')
+@login_required
+async def profile(username):
+    user = await aio.find_user_by_username(username)
+    if not user:
+        await flash('User not found', 'error')
+        return redirect(url_for('posts.timeline'))
+
+    current_user_id = session.get('user_id')
+    is_own_profile = str(user['_id']) == current_user_id
+
+    # the posts page and the follow check only depend on the profile user
+    async def check_following():
+        if is_own_profile:
+            return False
+        return await aio.is_following(current_user_id, user['_id'])
+
+    try:
+        (posts, next_cursor), is_following = await asyncio.gather(
+            aio.get_user_posts(user['_id'], cursor=request.args.get('before')),
+            check_following()
+        )
+    except ValueError as e:
+        await flash(str(e), 'error')
+        return redirect(url_for('users.profile', username=username))
+
+    return await render_template('profile.html',
+                                 user=user,
+                                 posts=posts,
+                                 next_cursor=next_cursor,
+                                 is_own_profile=is_own_profile,
+                                 is_following=is_following,
+                                 follower_count=user.get('follower_count', 0),
+                                 following_count=user.get('following_count', 0))
+
+@bp.route('/follow/<username>', methods=['POST'])
+@login_required
+async def follow(username):
+    user = await aio.find_user_by_username(username, projection='card')
+    if not user:
+        await flash('User not found', 'error')
+        return redirect(url_for('posts.timeline'))
+
+    try:
+        await run_sync(user_model.follow_user)(session['user_id'], user['_id'])
+        await flash(f'Now following {username}', 'success')
+    except ValueError as e:
+        await flash(str(e), 'error')
+
+    return redirect(url_for('users.profile', username=username))
+
+@bp.route('/unfollow/<username>', methods=['POST'])
+@login_required
+async def unfollow(username):
+    user = await aio.find_user_by_username(username, projection='card')
+    if not user:
+        await flash('User not found', 'error')
+        return redirect(url_for('posts.timeline'))
+
+    await run_sync(user_model.unfollow_user)(session['user_id'], user['_id'])
+    await flash(f'Unfollowed {username}', 'success')
+    return redirect(url_for('users.profile', username=username))
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""Benchmark the social_media routes in-process (Flask test client) or over HTTP.
+
+Generates a dataset with bulk_seed (unless --skip-seed), logs clients in as
+sampled users and runs a weighted mix of timeline, profile, follow,
+unfollow, create_post and search requests. Reports per-route throughput,
+latency percentiles and, in-process, database round-trips per request.
+With several --url targets, for example the Flask app and the ASGI variant,
+each is loaded in turn and compared to the first.
+
+    python scripts/benchmark.py --users 10000 --posts 100000
+    python scripts/benchmark.py --skip-seed --url http://localhost:5000
+    python scripts/benchmark.py --skip-seed --url sync=http://localhost:5000 --url async=http://localhost:5001
+    python scripts/benchmark.py --skip-seed --output current.json --baseline main.json
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import threading
+import http.cookiejar
+import urllib.error
+import urllib.parse
+import urllib.request
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pymongo import monitoring
+from models.db import get_db
+from models import user as user_model
+from scripts import bulk_seed
+
+ROUTES = ['timeline', 'profile', 'follow', 'unfollow', 'create_post', 'search']
+DEFAULT_MIX = 'timeline=50,profile=25,follow=5,unfollow=5,create_post=10,search=5'
+SEARCH_PREFIXES = ['a', 'al', 'ali', 'bo', 'char', 'di', 'jo', 'sm', 'pat', 'zoe']
+
+def percentile(sorted_latencies, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_latencies:
+        return 0.0
+    rank = max(int(round(percent / 100 * len(sorted_latencies))) - 1, 0)
+    return sorted_latencies[rank]
+
+class RoundTripCounter(monitoring.CommandListener):
+    """Count database commands per thread.
+
+    Command events are published in the thread running the operation, so
+    the difference in a thread's count around a request is the number of
+    round-trips that request made.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def started(self, event):
+        self.local.count = getattr(self.local, 'count', 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def count(self):
+        return getattr(self.local, 'count', 0)
+
+class InProcessClient:
+    """Requests through the Flask test client, counting database round-trips."""
+
+    def __init__(self, app, round_trip_counter):
+        self.client = app.test_client()
+        self.round_trip_counter = round_trip_counter
+
+    def request(self, method, path, data=None):
+        start_count = self.round_trip_counter.count()
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, self.round_trip_counter.count() - start_count
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+class HttpClient:
+    """Requests to a running app over HTTP, round-trips are not visible from here."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect()
+        )
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as e:
+            return e.code, None
+        except (urllib.error.URLError, OSError):
+            return 0, None
+
+def parse_mix(mix):
+    """Parse route=weight pairs into (routes, cumulative weights)."""
+    routes = []
+    weights = []
+    for item in mix.split(','):
+        route, separator, weight = item.partition('=')
+        if route not in ROUTES or not separator:
+            raise ValueError(f"Invalid --mix entry {item}, routes are {', '.join(ROUTES)}")
+        routes.append(route)
+        weights.append(float(weight))
+
+    cum_weights = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cum_weights.append(total)
+    return routes, cum_weights
+
+def parse_targets(urls):
+    """Parse [name=]base_url values into (name, base_url) pairs."""
+    targets = []
+    for url in urls:
+        name, separator, base_url = url.partition('=')
+        if not separator:
+            name, base_url = url, url
+        targets.append((name, base_url.rstrip('/')))
+    return targets
+
+def get_following_usernames(db, username):
+    """Usernames the user already follows, the benchmark must not unfollow them."""
+    user = db.users.find_one({'username': username}, {'_id': 1})
+    if not user:
+        return set()
+    following_ids = user_model.get_following_ids(user['_id'])
+    return {user['username'] for user in db.users.find({'_id': {'$in': following_ids}}, {'username': 1})}
+
+def client_loop(client, client_num, username, already_following, targets, args, deadline, measure_after, results, lock):
+    rng = random.Random(args.seed * 7919 + client_num)
+    routes, cum_weights = args.parsed_mix
+
+    status, round_trips = client.request('POST', '/login', {'username': username, 'password': args.password})
+    if status != 302:
+        with lock:
+            results['login_failures'] += 1
+        return
+
+    followed = []
+    stats = {route: {'latencies': [], 'round_trips': [], 'errors': 0} for route in ROUTES}
+
+    while time.monotonic() < deadline:
+        route = rng.choices(routes, cum_weights=cum_weights)[0]
+        if route == 'unfollow' and not followed:
+            route = 'follow'
+
+        if route == 'timeline':
+            method, path, data = 'GET', '/timeline', None
+        elif route == 'profile':
+            method, path, data = 'GET', '/profile/' + rng.choice(targets), None
+        elif route == 'follow':
+            target = rng.choice(targets)
+            method, path, data = 'POST', '/follow/' + target, {}
+        elif route == 'unfollow':
+            target = followed.pop(rng.randrange(len(followed)))
+            method, path, data = 'POST', '/unfollow/' + target, {}
+        elif route == 'create_post':
+            method, path, data = 'POST', '/post', {'content': f'benchmark post {rng.random():.6f}'}
+        else:
+            method, path, data = 'GET', '/search?q=' + rng.choice(SEARCH_PREFIXES), None
+
+        start = time.monotonic()
+        status, round_trips = client.request(method, path, data)
+        elapsed_ms = (time.monotonic() - start) * 1000
+
+        # only edges made here are removed again, following an account twice changes nothing
+        if route == 'follow' and status == 302 and target != username and target not in already_following and target not in followed:
+            followed.append(target)
+
+        if start < measure_after:
+            continue
+        if 200 <= status < 400:
+            stats[route]['latencies'].append(elapsed_ms)
+            if round_trips is not None:
+                stats[route]['round_trips'].append(round_trips)
+        else:
+            stats[route]['errors'] += 1
+
+    # leave the follow graph as it was found
+    for target in followed:
+        client.request('POST', '/unfollow/' + target, {})
+
+    with lock:
+        for route, route_stats in stats.items():
+            for key in ['latencies', 'round_trips']:
+                results[route][key].extend(route_stats[key])
+            results[route]['errors'] += route_stats['errors']
+
+def run_target(name, make_client, usernames, following, targets, args):
+    """Load one target with a client per username and return the raw results."""
+    results = {route: {'latencies': [], 'round_trips': [], 'errors': 0} for route in ROUTES}
+    results['login_failures'] = 0
+    lock = threading.Lock()
+
+    print(f"\nBenchmarking {name} with {len(usernames)} clients for {args.warmup:g}s warmup + {args.duration:g}s...")
+    measure_after = time.monotonic() + args.warmup
+    deadline = measure_after + args.duration
+    threads = [
+        threading.Thread(target=client_loop, args=(make_client(), client_num, username, following[username], targets, args, deadline, measure_after, results, lock))
+        for client_num, username in enumerate(usernames)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if results['login_failures']:
+        print(f"{results['login_failures']} clients could not log in, check --password")
+    return results
+
+def summarize(results, duration):
+    summary = {}
+    for route in ROUTES:
+        latencies = sorted(results[route]['latencies'])
+        round_trips = results[route]['round_trips']
+        if not latencies and not results[route]['errors']:
+            continue
+        summary[route] = {
+            'requests': len(latencies),
+            'errors': results[route]['errors'],
+            'requests_per_second': len(latencies) / duration,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': latencies[-1] if latencies else 0.0,
+            'avg_round_trips': sum(round_trips) / len(round_trips) if round_trips else None
+        }
+    return summary
+
+def print_summary(summary):
+    print(f"{'route':12s} {'requests':>10s} {'req/s':>10s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s} {'db trips':>9s} {'errors':>7s}")
+    for route, stats in summary.items():
+        round_trips = f"{stats['avg_round_trips']:.1f}" if stats['avg_round_trips'] is not None else 'n/a'
+        print(f"{route:12s} {stats['requests']:10,d} {stats['requests_per_second']:10,.1f} {stats['p50_ms']:9.2f} "
+              f"{stats['p95_ms']:9.2f} {stats['p99_ms']:9.2f} {stats['max_ms']:9.2f} {round_trips:>9s} {stats['errors']:7,d}")
+
+def compare_to_baseline(summary, baseline, max_regression):
+    """Print changes against a baseline run, returns the regressed routes."""
+    regressions = []
+    print(f"\nAgainst baseline (p99 regression limit {max_regression:g}%):")
+    for route, stats in summary.items():
+        baseline_stats = baseline['routes'].get(route)
+        if not baseline_stats:
+            continue
+
+        p99_change = (stats['p99_ms'] / baseline_stats['p99_ms'] - 1) * 100 if baseline_stats['p99_ms'] else 0.0
+        line = f"  {route:12s} p99 {p99_change:+7.1f}%"
+        regressed = p99_change > max_regression
+
+        if stats['avg_round_trips'] is not None and baseline_stats.get('avg_round_trips') is not None:
+            round_trip_change = stats['avg_round_trips'] - baseline_stats['avg_round_trips']
+            line += f"  db trips {round_trip_change:+.1f}"
+            # round-trips are deterministic per request, any real increase is a model change
+            regressed = regressed or round_trip_change >= 0.5
+
+        if regressed:
+            regressions.append(route)
+            line += "  REGRESSION"
+        print(line)
+
+    return regressions
+
+def compare_targets(summaries):
+    """Print the p50 and p99 change of each target relative to the first."""
+    baseline_name, baseline_summary = summaries[0]
+    print()
+    for name, summary in summaries[1:]:
+        for route, stats in summary.items():
+            baseline_stats = baseline_summary.get(route)
+            if not baseline_stats:
+                continue
+            p50_change = (stats['p50_ms'] / baseline_stats['p50_ms'] - 1) * 100 if baseline_stats['p50_ms'] else 0.0
+            p99_change = (stats['p99_ms'] / baseline_stats['p99_ms'] - 1) * 100 if baseline_stats['p99_ms'] else 0.0
+            print(f"{name} vs {baseline_name} {route:12s} p50 {p50_change:+.1f}%  p99 {p99_change:+.1f}%")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark social_media routes')
+    parser.add_argument('--url', action='append', help='[name=]base URL of a running app, repeat to compare apps, benchmarks in-process with the Flask test client if not set')
+    parser.add_argument('--skip-seed', action='store_true', help='Use the data already in the database')
+    parser.add_argument('--users', type=int, default=10000, help='Users to generate')
+    parser.add_argument('--posts', type=int, default=100000, help='Posts to generate')
+    parser.add_argument('--avg-following', type=float, default=50, help='Average accounts followed per user')
+    parser.add_argument('--follow-alpha', type=float, default=1.0, help='Power-law exponent of account popularity')
+    parser.add_argument('--post-alpha', type=float, default=0.8, help='Power-law exponent of posting activity')
+    parser.add_argument('--seed-workers', type=int, default=os.cpu_count() or 1, help='Worker processes for generating data, 0 generates in this process')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients, each logged in as a different user')
+    parser.add_argument('--duration', type=float, default=30, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='Unmeasured seconds before measuring')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Weighted route mix as route=weight pairs')
+    parser.add_argument('--password', default='password123', help='Password of the generated users')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for data and request choices')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--max-regression', type=float, default=20, help='Percent p99 increase over the baseline that fails the run')
+    args = parser.parse_args()
+
+    try:
+        args.parsed_mix = parse_mix(args.mix)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    if args.url and len(args.url) > 1 and (args.output or args.baseline):
+        print("--output and --baseline compare a single target, give one --url")
+        sys.exit(1)
+
+    # must be registered before the first client is created
+    round_trip_counter = RoundTripCounter()
+    monitoring.register(round_trip_counter)
+
+    if not args.skip_seed:
+        seed_args = bulk_seed.build_parser().parse_args([])
+        seed_args.users = args.users
+        seed_args.posts = args.posts
+        seed_args.avg_following = args.avg_following
+        seed_args.follow_alpha = args.follow_alpha
+        seed_args.post_alpha = args.post_alpha
+        seed_args.workers = args.seed_workers
+        seed_args.password = args.password
+        seed_args.seed = args.seed
+        bulk_seed.run(seed_args)
+
+    db = get_db()
+    rng = random.Random(args.seed)
+
+    # clients log in as random users, profiles and follows target a mix of popular and random users
+    usernames = [user['username'] for user in db.users.aggregate([{'$sample': {'size': args.clients}}, {'$project': {'username': 1}}])]
+    popular = [user['username'] for user in db.users.find({}, {'username': 1}).sort('follower_count', -1).limit(50)]
+    sampled = [user['username'] for user in db.users.aggregate([{'$sample': {'size': 200}}, {'$project': {'username': 1}}])]
+    targets = popular + sampled
+    if not usernames:
+        print("No users found, run without --skip-seed or seed the database first")
+        sys.exit(1)
+
+    following = {username: get_following_usernames(db, username) for username in usernames}
+
+    if args.url:
+        mode = 'http'
+        runs = [(name, lambda base_url=base_url: HttpClient(base_url)) for name, base_url in parse_targets(args.url)]
+    else:
+        mode = 'in-process'
+        from app import app
+        runs = [(mode, lambda: InProcessClient(app, round_trip_counter))]
+
+    summaries = []
+    for name, make_client in runs:
+        results = run_target(name, make_client, usernames, following, targets, args)
+        summary = summarize(results, args.duration)
+        print()
+        print_summary(summary)
+        summaries.append((name, summary))
+
+    if len(summaries) > 1:
+        compare_targets(summaries)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'mode': mode,
+                'clients': len(usernames),
+                'duration': args.duration,
+                'mix': args.mix,
+                'num_users': db.users.estimated_document_count(),
+                'num_posts': db.posts.estimated_document_count(),
+                'routes': summary
+            }, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare_to_baseline(summary, baseline, args.max_regression):
+            sys.exit(1)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Add search_tokens to users created before prefix search, or rebuild them all.
+
+Safe to run more than once.
+"""
+
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pymongo import UpdateOne
+from models.db import get_db
+from models.search import search_tokens
+
+def build_search_tokens(batch_size, rebuild):
+    """Set search_tokens on every user missing them, or on every user if rebuild is set."""
+    db = get_db()
+
+    query = {} if rebuild else {'search_tokens': {'$exists': False}}
+    num_updated = 0
+    requests = []
+
+    for user in db.users.find(query, {'username': 1, 'display_name': 1}):
+        requests.append(UpdateOne(
+            {'_id': user['_id']},
+            {'$set': {'search_tokens': search_tokens(user['username'], user.get('display_name'))}}
+        ))
+        if len(requests) >= batch_size:
+            num_updated += db.users.bulk_write(requests, ordered=False).modified_count
+            requests = []
+
+    if requests:
+        num_updated += db.users.bulk_write(requests, ordered=False).modified_count
+
+    return num_updated
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the search_tokens field used by user search')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Number of users per bulk write')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute tokens for every user, not only those without tokens')
+    args = parser.parse_args()
+
+    print("Creating search index...")
+    get_db().users.create_index([('search_tokens', 1), ('follower_count', -1)])
+
+    print("Building search tokens...")
+    print(f"Updated {build_search_tokens(args.batch_size, args.rebuild)} users")
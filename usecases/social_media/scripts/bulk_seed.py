@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""Generate a large social graph for load testing.
+
+Users follow each other along a power-law popularity curve (a few accounts
+have most of the followers), post authors are skewed the same way, and post
+times follow a daily cycle with more activity in recent days. Users and
+posts are generated in ranges by worker processes and written with
+unordered insert_many, and every user shares one precomputed password hash.
+
+    python scripts/bulk_seed.py --users 1000000 --posts 10000000
+"""
+
+import sys
+import os
+import math
+import calendar
+import time
+import struct
+import random
+import argparse
+import itertools
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from werkzeug.security import generate_password_hash
+import models.db
+from models.db import get_db
+from models.search import search_tokens
+from models.timeline import CELEBRITY_FOLLOWER_THRESHOLD, rebuild_timeline
+from scripts.seed import create_indexes
+from utils import passwords
+
+FIRST_NAMES = ['Alice', 'Bob', 'Charlie', 'Diana', 'Ethan', 'Fiona', 'George', 'Hannah', 'Ivan', 'Julia',
+               'Kevin', 'Laura', 'Miguel', 'Nina', 'Oscar', 'Priya', 'Quinn', 'Rosa', 'Sam', 'Tara',
+               'Umar', 'Vera', 'Wei', 'Ximena', 'Yusuf', 'Zoe']
+LAST_NAMES = ['Johnson', 'Smith', 'Brown', 'Prince', 'Garcia', 'Nguyen', 'Patel', 'Kim', 'Silva', 'Muller',
+              'Rossi', 'Tanaka', 'Okafor', 'Novak', 'Cohen', 'Larsen', 'Dubois', 'Ivanova', 'Haddad', 'Lopez']
+WORDS = ['just', 'shipped', 'coffee', 'deploy', 'weekend', 'reading', 'new', 'release', 'database', 'python',
+         'design', 'team', 'meeting', 'idea', 'launch', 'music', 'travel', 'photo', 'today', 'finally',
+         'great', 'learning', 'bug', 'fixed', 'project', 'morning', 'run', 'lunch', 'review', 'thoughts']
+
+# relative posting activity by hour of day (UTC)
+HOURLY_ACTIVITY = [2, 1, 1, 1, 1, 2, 4, 6, 8, 8, 7, 7, 8, 7, 7, 7, 8, 9, 10, 11, 11, 9, 6, 4]
+
+# set in each worker process by _init_worker
+_state = {}
+
+def _object_id(created_at, sequence):
+    """Build a unique ObjectId whose embedded time matches the document's created_at."""
+    return ObjectId(struct.pack('>IQ', calendar.timegm(created_at.utctimetuple()), sequence))
+
+def _power_law_cum_weights(num_items, alpha):
+    return list(itertools.accumulate(1.0 / (rank + 1) ** alpha for rank in range(num_items)))
+
+def _user_created_at(user_num, args):
+    # accounts are spread evenly over the year before the posting window
+    seconds = (args.days + 365) * 86400 * user_num / args.users
+    return args.start_time - timedelta(seconds=(args.days + 365) * 86400 - seconds)
+
+def _user_id(user_num, args):
+    created_at = _user_created_at(user_num, args)
+    return _object_id(created_at, user_num)
+
+def _init_worker(args, password_hash, new_client=True):
+    # each process needs its own client, never one inherited through fork
+    if new_client:
+        models.db._client = None
+        models.db._db = None
+
+    permutation_rng = random.Random(args.seed)
+
+    # popularity rank -> user number, so popular accounts are spread over the id range
+    popularity = list(range(args.users))
+    permutation_rng.shuffle(popularity)
+    activity = list(range(args.users))
+    permutation_rng.shuffle(activity)
+
+    _state['args'] = args
+    _state['password_hash'] = password_hash
+    _state['popularity'] = popularity
+    _state['follow_cum_weights'] = _power_law_cum_weights(args.users, args.follow_alpha)
+    _state['activity'] = activity
+    _state['post_cum_weights'] = _power_law_cum_weights(args.users, args.post_alpha)
+    _state['hour_cum_weights'] = list(itertools.accumulate(HOURLY_ACTIVITY))
+
+def _insert(collection, documents):
+    try:
+        collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        # unique indexes are built after loading, so this only matters for a partial rerun
+        other_errors = [error for error in e.details['writeErrors'] if error['code'] != 11000]
+        if other_errors:
+            raise
+
+def _choose_followees(rng, user_num, num_following):
+    args = _state['args']
+    popularity = _state['popularity']
+    cum_weights = _state['follow_cum_weights']
+
+    followees = set()
+    attempts = 0
+    while len(followees) < num_following and attempts < num_following * 10:
+        for rank in rng.choices(range(args.users), cum_weights=cum_weights, k=num_following - len(followees)):
+            followee_num = popularity[rank]
+            if followee_num != user_num:
+                followees.add(followee_num)
+        attempts += num_following
+
+    return followees
+
+def generate_users(start, end):
+    """Insert users start..end-1 and the accounts they follow."""
+    args = _state['args']
+    db = get_db()
+    rng = random.Random(args.seed * 1000003 + start)
+
+    # log-normal following counts averaging args.avg_following
+    sigma = args.following_sigma
+    mu = math.log(args.avg_following) - sigma ** 2 / 2
+
+    users = []
+    edges = []
+    num_edges = 0
+
+    for user_num in range(start, end):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        username = f'{first_name}{last_name}{user_num}'.lower()
+        display_name = f'{first_name} {last_name}'
+        user_id = _user_id(user_num, args)
+        created_at = _user_created_at(user_num, args)
+
+        num_following = min(int(rng.lognormvariate(mu, sigma)), args.max_following, args.users - 1)
+        followees = _choose_followees(rng, user_num, num_following)
+        for followee_num in followees:
+            edges.append({
+                'follower_id': user_id,
+                'followee_id': _user_id(followee_num, args),
+                'created_at': created_at
+            })
+
+        users.append({
+            '_id': user_id,
+            'username': username,
+            'email': f'{username}@example.com',
+            'password_hash': _state['password_hash'],
+            'display_name': display_name,
+            'bio': '',
+            'follower_count': 0,
+            'following_count': len(followees),
+            'search_tokens': search_tokens(username, display_name),
+            'created_at': created_at
+        })
+
+        if len(users) >= args.batch_size:
+            _insert(db.users, users)
+            users = []
+        if len(edges) >= args.batch_size:
+            _insert(db.follows, edges)
+            num_edges += len(edges)
+            edges = []
+
+    if users:
+        _insert(db.users, users)
+    if edges:
+        _insert(db.follows, edges)
+        num_edges += len(edges)
+
+    return end - start, num_edges
+
+def _post_time(rng):
+    args = _state['args']
+
+    # truncated exponential over days ago, recent days are busier
+    scale = args.days / 2
+    today = args.start_time.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    while True:
+        days_ago = -scale * math.log(1 - rng.random() * (1 - math.exp(-args.days / scale)))
+        hour = rng.choices(range(24), cum_weights=_state['hour_cum_weights'])[0]
+        created_at = today - timedelta(days=int(days_ago)) + timedelta(hours=hour, seconds=rng.randrange(3600), milliseconds=rng.randrange(1000))
+        # later today has not happened yet
+        if created_at <= args.start_time:
+            return created_at
+
+def generate_posts(start, end):
+    """Insert posts start..end-1."""
+    args = _state['args']
+    db = get_db()
+    rng = random.Random(args.seed * 1000033 + start)
+
+    posts = []
+    for post_num in range(start, end):
+        rank = rng.choices(range(args.users), cum_weights=_state['post_cum_weights'])[0]
+        author_num = _state['activity'][rank]
+        created_at = max(_post_time(rng), _user_created_at(author_num, args))
+
+        posts.append({
+            '_id': _object_id(created_at, post_num),
+            'author_id': _user_id(author_num, args),
+            'content': ' '.join(rng.choices(WORDS, k=rng.randint(4, 20))).capitalize() + '.',
+            'created_at': created_at
+        })
+
+        if len(posts) >= args.batch_size:
+            _insert(db.posts, posts)
+            posts = []
+
+    if posts:
+        _insert(db.posts, posts)
+
+    return end - start
+
+def build_timelines(start, end):
+    """Materialize timelines for users start..end-1."""
+    args = _state['args']
+    db = get_db()
+
+    celebrity_ids = set(user['_id'] for user in db.users.find({'celebrity': True}, {'_id': 1}))
+
+    for user_num in range(start, end):
+        user_id = _user_id(user_num, args)
+        following_ids = [edge['followee_id'] for edge in db.follows.find({'follower_id': user_id}, {'_id': 0, 'followee_id': 1})]
+        author_ids = [following_id for following_id in following_ids if following_id not in celebrity_ids]
+        rebuild_timeline(user_id, author_ids + [user_id])
+
+    return end - start
+
+def _call(task):
+    function, start, end = task
+    return function(start, end)
+
+def _run_ranges(pool, function, total, chunk_size, label):
+    """Run function over ranges of total in the pool, or in this process if pool is None.
+
+    Returns the summed second result if any.
+    """
+    start_time = time.time()
+    done = 0
+    extra = 0
+
+    tasks = [(function, start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+    results = pool.imap_unordered(_call, tasks) if pool is not None else map(_call, tasks)
+    for result in results:
+        if isinstance(result, tuple):
+            done += result[0]
+            extra += result[1]
+        else:
+            done += result
+        elapsed = time.time() - start_time
+        print(f"  {label}: {done:,} / {total:,} ({done / elapsed if elapsed > 0 else 0:,.0f}/s)")
+
+    return extra
+
+def set_follower_counts(batch_size):
+    """Set follower_count from the follows collection, following_count is set at insert."""
+    db = get_db()
+
+    requests = []
+    counts = db.follows.aggregate([
+        {'$group': {'_id': '$followee_id', 'count': {'$sum': 1}}}
+    ], allowDiskUse=True)
+
+    for count in counts:
+        requests.append(UpdateOne({'_id': count['_id']}, {'$set': {'follower_count': count['count']}}))
+        if len(requests) >= batch_size:
+            db.users.bulk_write(requests, ordered=False)
+            requests = []
+
+    if requests:
+        db.users.bulk_write(requests, ordered=False)
+
+def set_followed_celebrities(batch_size):
+    """Record the followed celebrities of every user that follows one.
+
+    Users without a record get theirs computed on their first timeline view.
+    """
+    db = get_db()
+
+    celebrity_ids = [user['_id'] for user in db.users.find({'celebrity': True}, {'_id': 1})]
+    if not celebrity_ids:
+        return
+
+    requests = []
+    followed = db.follows.aggregate([
+        {'$match': {'followee_id': {'$in': celebrity_ids}}},
+        {'$group': {'_id': '$follower_id', 'celebrity_ids': {'$push': '$followee_id'}}}
+    ], allowDiskUse=True)
+
+    for follower in followed:
+        requests.append(UpdateOne({'_id': follower['_id']}, {'$set': {'celebrity_ids': follower['celebrity_ids']}}, upsert=True))
+        if len(requests) >= batch_size:
+            db.timeline_celebrities.bulk_write(requests, ordered=False)
+            requests = []
+
+    if requests:
+        db.timeline_celebrities.bulk_write(requests, ordered=False)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Bulk generate users, follows and posts for load testing')
+    parser.add_argument('--users', type=int, default=100000, help='Number of users')
+    parser.add_argument('--posts', type=int, default=1000000, help='Number of posts')
+    parser.add_argument('--avg-following', type=float, default=50, help='Average number of accounts each user follows')
+    parser.add_argument('--following-sigma', type=float, default=1.0, help='Spread of the log-normal following count distribution')
+    parser.add_argument('--max-following', type=int, default=5000, help='Most accounts a single user follows')
+    parser.add_argument('--follow-alpha', type=float, default=1.0, help='Power-law exponent of account popularity, higher concentrates followers on fewer accounts')
+    parser.add_argument('--post-alpha', type=float, default=0.8, help='Power-law exponent of posting activity')
+    parser.add_argument('--days', type=int, default=90, help='Posts are spread over this many days before now')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes, 0 generates in this process')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Documents per insert_many')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Users or posts per worker task')
+    parser.add_argument('--password', default='password123', help='Password of every generated user')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed, the same seed generates the same data')
+    parser.add_argument('--build-timelines', action='store_true', help='Materialize every timeline now instead of on first view')
+    return parser
+
+def run(args):
+    """Drop the existing data and generate a new dataset, returns the number of follow edges."""
+    if not hasattr(args, 'start_time'):
+        args.start_time = datetime.utcnow().replace(microsecond=0)
+
+    db = get_db()
+
+    print("Dropping existing data...")
+    for collection_name in ['users', 'posts', 'follows', 'timelines', 'timeline_celebrities']:
+        db[collection_name].drop()
+
+    # one hash shared by every generated user, hashing per user would dominate the run
+    password_hash = generate_password_hash(args.password, passwords.PASSWORD_HASH_METHOD)
+
+    run_start = time.time()
+    if args.workers > 0:
+        # the parent's client must not be shared with forked workers
+        models.db.close_db()
+        pool = Pool(args.workers, initializer=_init_worker, initargs=(args, password_hash))
+    else:
+        _init_worker(args, password_hash, new_client=False)
+        pool = None
+
+    try:
+        print(f"Generating {args.users:,} users with {args.workers} workers...")
+        num_edges = _run_ranges(pool, generate_users, args.users, args.chunk_size, 'users')
+        print(f"Created {num_edges:,} follow edges")
+
+        print(f"Generating {args.posts:,} posts...")
+        _run_ranges(pool, generate_posts, args.posts, args.chunk_size * 10, 'posts')
+
+        # building indexes once after loading is faster than maintaining them per insert
+        create_indexes()
+
+        print("Computing follower counts...")
+        set_follower_counts(args.batch_size)
+        result = get_db().users.update_many(
+            {'follower_count': {'$gte': CELEBRITY_FOLLOWER_THRESHOLD}},
+            {'$set': {'celebrity': True}}
+        )
+        print(f"Marked {result.modified_count:,} celebrity accounts")
+        set_followed_celebrities(args.batch_size)
+        if pool is not None:
+            models.db.close_db()
+
+        if args.build_timelines:
+            print("Building timelines...")
+            _run_ranges(pool, build_timelines, args.users, max(args.chunk_size // 10, 1), 'timelines')
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    print(f"\nGenerated {args.users:,} users, {num_edges:,} follows and {args.posts:,} posts in {time.time() - run_start:,.1f}s")
+    return num_edges
+
+def print_sample_users(args):
+    """Print the most followed users to log in as."""
+    most_followed = get_db().users.find({}, {'username': 1, 'follower_count': 1}).sort('follower_count', -1).limit(4)
+    print(f"\nEvery user has the password '{args.password}'. Most followed users:")
+    for user in most_followed:
+        print(f"  - @{user['username']} ({user['follower_count']:,} followers)")
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    run(args)
+    print_sample_users(args)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Move followers/following arrays out of user documents into the follows collection.
+
+Safe to run more than once: edges are inserted with a unique index so existing
+edges are skipped, and the counters are recomputed from the follows collection.
+"""
+
+import sys
+import os
+import argparse
+from datetime import datetime
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from models.db import get_db
+
+def create_indexes():
+    """Create the follows collection indexes."""
+    db = get_db()
+
+    db.follows.create_index([('follower_id', 1), ('followee_id', 1)], unique=True)
+    db.follows.create_index([('followee_id', 1), ('follower_id', 1)])
+
+def insert_edges(edges):
+    """Insert a batch of edges, ignoring the ones that already exist."""
+    db = get_db()
+
+    if not edges:
+        return 0
+
+    try:
+        result = db.follows.insert_many(edges, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        other_errors = [error for error in e.details['writeErrors'] if error['code'] != 11000]
+        if other_errors:
+            raise
+        return e.details['nInserted']
+
+def copy_edges(batch_size):
+    """Create an edge for every entry in the following and followers arrays."""
+    db = get_db()
+
+    now = datetime.utcnow()
+    num_users = 0
+    num_inserted = 0
+    edges = []
+
+    users = db.users.find(
+        {'$or': [{'following': {'$exists': True}}, {'followers': {'$exists': True}}]},
+        {'following': 1, 'followers': 1}
+    )
+
+    for user in users:
+        num_users += 1
+
+        # an edge may appear on one side only if an earlier follow was interrupted
+        for followee_id in user.get('following', []):
+            edges.append({'follower_id': user['_id'], 'followee_id': followee_id, 'created_at': now})
+        for follower_id in user.get('followers', []):
+            edges.append({'follower_id': follower_id, 'followee_id': user['_id'], 'created_at': now})
+
+        if len(edges) >= batch_size:
+            num_inserted += insert_edges(edges)
+            edges = []
+
+    num_inserted += insert_edges(edges)
+
+    return num_users, num_inserted
+
+def recompute_counters(batch_size):
+    """Set follower_count and following_count on every user from the follows collection."""
+    db = get_db()
+
+    db.users.update_many({}, {'$set': {'follower_count': 0, 'following_count': 0}})
+
+    for group_field, counter_field in [('$followee_id', 'follower_count'), ('$follower_id', 'following_count')]:
+        requests = []
+        counts = db.follows.aggregate([
+            {'$group': {'_id': group_field, 'count': {'$sum': 1}}}
+        ], allowDiskUse=True)
+
+        for count in counts:
+            requests.append(UpdateOne({'_id': count['_id']}, {'$set': {counter_field: count['count']}}))
+            if len(requests) >= batch_size:
+                db.users.bulk_write(requests, ordered=False)
+                requests = []
+
+        if requests:
+            db.users.bulk_write(requests, ordered=False)
+
+def remove_arrays():
+    """Remove the followers and following arrays from user documents."""
+    db = get_db()
+
+    result = db.users.update_many(
+        {'$or': [{'following': {'$exists': True}}, {'followers': {'$exists': True}}]},
+        {'$unset': {'following': '', 'followers': ''}}
+    )
+    return result.modified_count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migrate follow arrays to the follows edge collection')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Number of edges or counter updates per bulk write')
+    parser.add_argument('--keep-arrays', action='store_true', help='Leave the followers/following arrays on user documents')
+    args = parser.parse_args()
+
+    print("Creating indexes...")
+    create_indexes()
+
+    print("Copying follow arrays to the follows collection...")
+    num_users, num_inserted = copy_edges(args.batch_size)
+    print(f"Read {num_users} users, inserted {num_inserted} edges")
+
+    print("Recomputing follower and following counters...")
+    recompute_counters(args.batch_size)
+
+    if args.keep_arrays:
+        print("Keeping followers/following arrays (--keep-arrays)")
+    else:
+        print("Removing followers/following arrays...")
+        print(f"Updated {remove_arrays()} users")
+
+    print("\nMigration completed successfully!")
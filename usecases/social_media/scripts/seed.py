@@ -17,8 +17,15 @@ def create_indexes():
 
     db.users.create_index('username', unique=True)
     db.users.create_index('email', unique=True)
+    db.users.create_index([('search_tokens', 1), ('follower_count', -1)])
 
-    db.posts.create_index([('author_id', 1), ('created_at', -1)])
+    db.posts.create_index([('author_id', 1), ('created_at', -1), ('_id', -1)])
+
+    db.follows.create_index([('follower_id', 1), ('followee_id', 1)], unique=True)
+    db.follows.create_index([('followee_id', 1), ('follower_id', 1)])
+
+    db.timelines.create_index([('owner_id', 1), ('_id', -1)])
+    db.timelines.create_index([('owner_id', 1), ('count', 1)])
 
     print("Indexes created successfully")
 
@@ -28,6 +35,9 @@ def seed_data():
 
     db.users.delete_many({})
     db.posts.delete_many({})
+    db.follows.delete_many({})
+    db.timelines.delete_many({})
+    db.timeline_celebrities.delete_many({})
     print("Cleared existing data")
 
     print("Creating users...")
@@ -0,0 +1,69 @@
+"""Check that the display pages read user documents with narrow projections.
+
+Runs against mongomock, no database is needed:
+
+    pip install -r requirements-test.txt
+    python -m pytest tests
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DOCDB_URI', 'mongodb://unused')
+
+import mongomock
+import pytest
+import models.db
+from models import user_cache
+from models import search as search_model
+from scripts import seed
+
+# fields that no display path may read, credentials and the old follow arrays
+FORBIDDEN_FIELDS = {'password_hash', 'email', 'following', 'followers'}
+
+DISPLAY_PAGES = ['/timeline', '/profile/bob', '/search?q=ali', '/search/suggest?q=ali']
+
+@pytest.fixture
+def client(monkeypatch):
+    """Flask test client logged in as alice, against a seeded mongomock database."""
+    monkeypatch.setattr(models.db, '_db', mongomock.MongoClient().social)
+    seed.create_indexes()
+    seed.seed_data()
+
+    from app import app
+    app.config['TESTING'] = True
+    client = app.test_client()
+    response = client.post('/login', data={'username': 'alice', 'password': 'password123'})
+    assert response.status_code == 302
+    return client
+
+@pytest.fixture
+def user_projections(monkeypatch):
+    """Record the projection of every read of the users collection."""
+    projections = []
+    find = mongomock.collection.Collection.find
+
+    def recording_find(self, filter=None, projection=None, *args, **kwargs):
+        if self.name == 'users':
+            projections.append(projection)
+        return find(self, filter, projection, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, 'find', recording_find)
+    return projections
+
+@pytest.mark.parametrize('path', DISPLAY_PAGES)
+def test_display_pages_use_narrow_user_projections(client, user_projections, path):
+    # start cold so the page reads its users from the database
+    user_cache.clear()
+    search_model.prefix_cache.clear()
+    user_projections.clear()
+
+    response = client.get(path)
+
+    assert response.status_code == 200
+    assert user_projections, f'{path} did not read any users'
+    for projection in user_projections:
+        assert projection, f'{path} read a whole user document'
+        # an exclusion projection would return every field it does not name
+        assert all(value for field, value in projection.items() if field != '_id'), projection
+        assert not set(projection) & FORBIDDEN_FIELDS, projection
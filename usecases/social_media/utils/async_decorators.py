@@ -0,0 +1,12 @@
+from functools import wraps
+from quart import session, flash, redirect, url_for
+
+def login_required(f):
+    """Decorator to require login for an async route."""
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            await flash('Please login to access this page', 'error')
+            return redirect(url_for('auth.login'))
+        return await f(*args, **kwargs)
+    return decorated_function
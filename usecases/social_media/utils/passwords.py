@@ -0,0 +1,101 @@
+"""Password hashing on a bounded process pool.
+
+Hashing is deliberately CPU heavy, so it runs in worker processes instead
+of the thread serving the request, and at most PASSWORD_HASH_MAX_PENDING
+hashes are queued or running at once. Requests that cannot get a slot
+within PASSWORD_HASH_QUEUE_TIMEOUT seconds fail instead of piling up.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Any werkzeug method string, for example scrypt:32768:8:1 or pbkdf2:sha256:1000000.
+# Stored hashes made with a different method are rehashed on the next login.
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
+# 0 hashes in the calling thread instead of a process pool.
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', max(PASSWORD_HASH_WORKERS, 1) * 4))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', 5))
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    'pending': 0,
+    'max_pending': 0,
+    'completed': 0,
+    'rejected': 0,
+    'total_wait_ms': 0.0
+}
+
+_method_prefix = None
+
+def _get_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        return _executor
+
+def _run(function, *args):
+    """Run a hashing function in the pool, waiting for a free slot first."""
+    if PASSWORD_HASH_WORKERS == 0:
+        return function(*args)
+
+    if not _slots.acquire(timeout=PASSWORD_HASH_QUEUE_TIMEOUT):
+        with _metrics_lock:
+            _metrics['rejected'] += 1
+        raise ValueError('The server is busy, please try again')
+
+    start = time.monotonic()
+    with _metrics_lock:
+        _metrics['pending'] += 1
+        _metrics['max_pending'] = max(_metrics['max_pending'], _metrics['pending'])
+
+    try:
+        return _get_executor().submit(function, *args).result()
+    finally:
+        _slots.release()
+        with _metrics_lock:
+            _metrics['pending'] -= 1
+            _metrics['completed'] += 1
+            _metrics['total_wait_ms'] += (time.monotonic() - start) * 1000
+
+def hash_password(password):
+    """Hash a password with the configured method."""
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+def check_password(password_hash, password):
+    """Check a password against a stored hash."""
+    return _run(check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash):
+    """Return True if a stored hash was made with a different method or cost."""
+    global _method_prefix
+
+    # werkzeug expands short method names, so hash once to learn the stored form
+    if _method_prefix is None:
+        _method_prefix = hash_password('').split('$', 1)[0]
+
+    return password_hash.split('$', 1)[0] != _method_prefix
+
+def get_metrics():
+    """Return hashing queue metrics."""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+
+    metrics['workers'] = PASSWORD_HASH_WORKERS
+    metrics['max_allowed_pending'] = PASSWORD_HASH_MAX_PENDING
+    # hashes waiting for a worker, the rest of pending are being computed
+    metrics['queue_depth'] = max(metrics['pending'] - PASSWORD_HASH_WORKERS, 0)
+    metrics['avg_ms'] = metrics['total_wait_ms'] / metrics['completed'] if metrics['completed'] else 0.0
+    del metrics['total_wait_ms']
+
+    return metrics